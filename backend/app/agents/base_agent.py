@@ -1,19 +1,47 @@
-from typing import Dict, Any, Optional, List
-from ..core.openai_client import get_chat_completion
-from .personas import AgentPersona
+from typing import AsyncIterator, Dict, Any, Optional, List, Union
+from ..core.openai_client import get_chat_completion, stream_chat_completion
+from ..core.usage import usage_scope
+from .personas import AgentPersona, PersonaSpec
+
+
+def render_context_block(context_data: Optional[Dict[str, Any]]) -> str:
+    """Formats context data into the block injected into the user message (empty string if there is nothing to show)."""
+    if not context_data:
+        return ""
+    parts = []
+    for k, v in context_data.items():
+        if v is not None: # Ensure value is not None before formatting
+            parts.append(f"{k.replace('_', ' ').capitalize()}: {v}")
+    if not parts:
+        return ""
+    return "\n" + "\n".join(parts) # Add leading newline only if there are parts
+
+
+class RenderedAgentContext(dict):
+    """
+    Agent context data that also carries its pre-rendered prompt block.
+    Built once per profile version by the orchestrator, so agents can skip re-formatting on every request.
+    Instances are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, data: Dict[str, Any], version: Any = None):
+        super().__init__(data)
+        self.version = version
+        self.rendered = render_context_block(self)
+
 
 class BaseAgent:
-    def __init__(self, persona: AgentPersona):
+    def __init__(self, persona: Union[AgentPersona, PersonaSpec]):
         self.persona = persona
 
-    async def generate_response(
+    def build_messages(
         self,
         user_prompt: str,
         conversation_history: Optional[List[Dict[str, str]]] = None,
         context_data: Optional[Dict[str, Any]] = None
-    ) -> str | None:
+    ) -> List[Dict[str, str]]:
         """
-        Generates a response using the assigned persona, user prompt, history, and context.
+        Builds the message list for the LLM: persona system prompt, history, and the user query with its context.
         """
         system_message = {"role": "system", "content": self.persona.get_system_prompt()}
         
@@ -22,14 +50,10 @@ class BaseAgent:
         if conversation_history:
             messages_for_llm.extend(conversation_history)
 
-        formatted_context_data_str = ""
-        if context_data: # context_data is not None and not empty
-            parts = []
-            for k, v in context_data.items():
-                if v is not None: # Ensure value is not None before formatting
-                    parts.append(f"{k.replace('_', ' ').capitalize()}: {v}")
-            if parts:
-                 formatted_context_data_str = "\n" + "\n".join(parts) # Add leading newline only if there are parts
+        if isinstance(context_data, RenderedAgentContext):
+            formatted_context_data_str = context_data.rendered # Pre-rendered by the orchestrator
+        else:
+            formatted_context_data_str = render_context_block(context_data)
 
         # Consistent preamble for the user message, context_data_str might be empty
         user_message_with_context = f"Relevant context for this interaction:{formatted_context_data_str}\n\nUser query: {user_prompt}"
@@ -38,13 +62,41 @@ class BaseAgent:
             "role": "user", 
             "content": user_message_with_context
         })
+        return messages_for_llm
+
+    async def generate_response(
+        self,
+        user_prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        context_data: Optional[Dict[str, Any]] = None
+    ) -> str | None:
+        """
+        Generates a response using the assigned persona, user prompt, history, and context.
+        """
+        messages_for_llm = self.build_messages(user_prompt, conversation_history, context_data)
 
         # Call the (potentially mocked) get_chat_completion
         # The get_chat_completion function expects the full list of messages as its first argument (prompt)
-        response_content = await get_chat_completion(
-            prompt=messages_for_llm, 
-            model=self.persona.get_llm_model_name() # Assuming persona has this method
-        )
+        with usage_scope(persona=self.persona.name): # Token usage is billed to this persona
+            response_content = await get_chat_completion(
+                prompt=messages_for_llm, 
+                model=self.persona.get_llm_model_name() # Assuming persona has this method
+            )
         
         return response_content
 
+    def stream_response(
+        self,
+        user_prompt: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        context_data: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Streams the response as content deltas. Closing the returned generator cancels the generation.
+        """
+        return stream_chat_completion(
+            prompt=self.build_messages(user_prompt, conversation_history, context_data),
+            model=self.persona.get_llm_model_name(),
+            max_tokens=max_tokens
+        )
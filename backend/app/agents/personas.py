@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Any, Dict, List, Optional
 
 class AgentPersona(Enum):
     STRATEGY_CONSULTANT = {
@@ -39,6 +40,65 @@ class AgentPersona(Enum):
     def get_llm_model_name(self) -> str:
         return self.value.get("llm_model_name", "gpt-4-turbo") # Default if not specified
 
+class PersonaSpec:
+    """
+    A persona defined at runtime (e.g. loaded from a config file) instead of in the AgentPersona enum.
+    Exposes the same getters as AgentPersona, so agents can use either interchangeably.
+    The system prompt can be read from a file, which is only loaded the first time it is needed.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        description: str = "",
+        system_prompt: Optional[str] = None,
+        system_prompt_file: Optional[str] = None,
+        llm_model_name: str = "gpt-4-turbo",
+        module_keywords: Optional[List[str]] = None,
+    ):
+        if system_prompt is None and system_prompt_file is None:
+            raise ValueError(f"Persona '{key}' needs a system_prompt or a system_prompt_file")
+        self.name = key # Mirrors Enum.name so personas of both kinds share one registry key
+        self.value: Dict[str, Any] = {
+            "name": name,
+            "description": description,
+            "llm_model_name": llm_model_name,
+        }
+        self._system_prompt = system_prompt
+        self.system_prompt_file = system_prompt_file
+        self.module_keywords = [k.lower() for k in (module_keywords or [])]
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "PersonaSpec":
+        return cls(
+            key=config["key"],
+            name=config.get("name", config["key"]),
+            description=config.get("description", ""),
+            system_prompt=config.get("system_prompt"),
+            system_prompt_file=config.get("system_prompt_file"),
+            llm_model_name=config.get("llm_model_name", "gpt-4-turbo"),
+            module_keywords=config.get("module_keywords"),
+        )
+
+    def get_system_prompt(self) -> str:
+        if self._system_prompt is None:
+            with open(self.system_prompt_file, encoding="utf-8") as f: # type: ignore[arg-type]
+                self._system_prompt = f.read().strip()
+        return self._system_prompt
+
+    def get_description(self) -> str:
+        return self.value["description"]
+
+    def get_name(self) -> str:
+        return self.value["name"]
+
+    def get_llm_model_name(self) -> str:
+        return self.value.get("llm_model_name", "gpt-4-turbo")
+
+    def __repr__(self) -> str:
+        return f"<PersonaSpec.{self.name}>"
+
 # Example usage:
 # strategy_consultant_prompt = AgentPersona.STRATEGY_CONSULTANT.get_system_prompt()
 # print(strategy_consultant_prompt)
@@ -0,0 +1,120 @@
+# Registry of personas and the agents that serve them
+import importlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Type, Union
+
+from .base_agent import BaseAgent
+from .personas import AgentPersona, PersonaSpec
+
+Persona = Union[AgentPersona, PersonaSpec]
+
+
+def import_agent_class(path: str) -> Type[BaseAgent]:
+    """Imports an agent class given as 'package.module:ClassName'."""
+    module_name, _, class_name = path.partition(":")
+    agent_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(agent_class, type) and issubclass(agent_class, BaseAgent)):
+        raise TypeError(f"{path} is not a BaseAgent subclass")
+    return agent_class
+
+
+class AgentRegistry:
+    """
+    Knows every persona (built-in AgentPersona members and PersonaSpec entries from config)
+    and hands out one shared agent instance per persona.
+    Agents are stateless, so the same instance can serve concurrent requests.
+    Specialized agents (e.g. a LegalAgent subclass of BaseAgent) are registered per persona.
+    """
+
+    def __init__(self, load_builtin: bool = True):
+        self._personas: Dict[str, Persona] = {}
+        self._agent_classes: Dict[str, Union[Type[BaseAgent], str]] = {} # str = import path, resolved on first use
+        self._agents: Dict[str, BaseAgent] = {}
+        if load_builtin:
+            for persona in AgentPersona:
+                self.register_persona(persona)
+
+    # --- Registration --- #
+    def register_persona(self, persona: Persona, agent_class: Union[Type[BaseAgent], str, None] = None):
+        """Adds (or replaces) a persona, optionally with the agent class that should serve it."""
+        self._personas[persona.name] = persona
+        self._agents.pop(persona.name, None) # Rebuilt on next use
+        if agent_class is not None:
+            self.register_agent_class(persona.name, agent_class)
+
+    def register_agent_class(self, persona_key: str, agent_class: Union[Type[BaseAgent], str]):
+        """Makes the given BaseAgent subclass (or 'module:Class' import path) serve a persona."""
+        if not isinstance(agent_class, str) and not issubclass(agent_class, BaseAgent):
+            raise TypeError(f"{agent_class!r} is not a BaseAgent subclass")
+        self._agent_classes[persona_key] = agent_class
+        self._agents.pop(persona_key, None)
+
+    def load_config(self, config: Dict[str, Any]):
+        """
+        Registers personas and agent classes from a config dictionary:
+            {"personas": [{"key": "HR_ADVISOR", "name": "HR Advisor", "system_prompt": "...",
+                           "module_keywords": ["hr"], "agent_class": "my_pkg.agents:HrAgent"}],
+             "agent_classes": {"LEGAL_EXPERT": "my_pkg.agents:LegalAgent"}}
+        """
+        for persona_config in config.get("personas", []):
+            self.register_persona(PersonaSpec.from_config(persona_config), persona_config.get("agent_class"))
+        for persona_key, agent_class in config.get("agent_classes", {}).items():
+            self.register_agent_class(persona_key, agent_class)
+
+    def load_config_file(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            self.load_config(json.load(f))
+
+    # --- Lookup --- #
+    def get_persona(self, key: str) -> Optional[Persona]:
+        return self._personas.get(key)
+
+    def list_personas(self) -> List[Persona]:
+        return list(self._personas.values())
+
+    def match_module(self, module: str) -> Optional[PersonaSpec]:
+        """Returns the first config-defined persona whose module keywords appear in the module name."""
+        for persona in self._personas.values():
+            if isinstance(persona, PersonaSpec) and any(k in module for k in persona.module_keywords):
+                return persona
+        return None
+
+    def get_agent(self, persona: Persona) -> BaseAgent:
+        """
+        Returns the shared agent for a persona, building it on first use.
+        The persona registered under the same key wins, so a config persona that replaces a built-in one
+        also serves callers that still hold the AgentPersona member (and its agent is built once, not per call).
+        """
+        persona = self._personas.get(persona.name, persona)
+        agent = self._agents.get(persona.name)
+        if agent is None or agent.persona is not persona:
+            agent = self._build_agent(persona)
+        return agent
+
+    def build_agents(self) -> int:
+        """Builds every registered agent up front (called at startup). Returns the number of agents."""
+        for persona in self._personas.values():
+            self.get_agent(persona)
+        return len(self._agents)
+
+    def _build_agent(self, persona: Persona) -> BaseAgent:
+        agent_class = self._agent_classes.get(persona.name, BaseAgent)
+        if isinstance(agent_class, str):
+            agent_class = import_agent_class(agent_class)
+            self._agent_classes[persona.name] = agent_class
+        agent = agent_class(persona=persona)
+        self._agents[persona.name] = agent
+        return agent
+
+
+def build_agent_registry_from_env() -> AgentRegistry:
+    """Creates the registry with built-in personas plus those from NOWGO_PERSONA_CONFIG (a JSON file), if set."""
+    registry = AgentRegistry()
+    config_path = os.getenv("NOWGO_PERSONA_CONFIG")
+    if config_path:
+        registry.load_config_file(config_path)
+    return registry
+
+# Global instance shared by the orchestrator
+agent_registry = build_agent_registry_from_env()
@@ -0,0 +1,216 @@
+# Record and replay of LLM calls ("cassettes"), for offline tests and benchmarks with realistic answers and timings
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+CASSETTE_FORMAT = "nowgo-llm-cassette"
+CASSETTE_VERSION = 1
+
+
+class CassetteMissError(Exception):
+    """Raised when replaying a request that the cassette has no recording for."""
+
+
+def request_key(model: str, messages: List[Dict[str, str]], stream: bool = False, max_tokens: Optional[int] = None) -> str:
+    """Identifies a request in a cassette. Timeouts and other transport arguments don't change the answer, so they are left out."""
+    payload = json.dumps([model, messages, stream, max_tokens], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class Cassette:
+    """
+    Recorded LLM calls, kept as a gzip-compressed JSON lines file: a header line, then one line per call:
+    {"key": ..., "model": ..., "latency": seconds until the response (or the stream) was returned,
+     "content": ..., "usage": [prompt_tokens, completion_tokens] or null}
+    Streamed calls store "chunks": [[seconds since the stream started, delta], ...] instead of "content".
+    Requests are only stored as a hash (request_key), which keeps the file small.
+    The same request recorded several times is replayed in recorded order, then from the start again.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency_scale: float = 1.0):
+        if mode not in ("replay", "record"):
+            raise ValueError(f"Cassette mode must be 'replay' or 'record', not '{mode}'")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._replayed: Dict[str, int] = {}
+        self._loaded = False
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return sum(len(entries) for entries in self._entries.values())
+
+    def _ensure_loaded(self):
+        # Loaded on first use rather than at import, so configuring a cassette doesn't slow startup
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("format") != CASSETTE_FORMAT or header.get("version") != CASSETTE_VERSION:
+                raise ValueError(f"{self.path} is not a version {CASSETTE_VERSION} LLM cassette")
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry)
+
+    def add(self, entry: Dict[str, Any]):
+        self._ensure_loaded()
+        self._entries.setdefault(entry["key"], []).append(entry)
+        self.recorded += 1
+
+    def next_entry(self, key: str) -> Dict[str, Any]:
+        self._ensure_loaded()
+        entries = self._entries.get(key)
+        if not entries:
+            self.misses += 1
+            raise CassetteMissError(f"No recording for request {key} in {self.path}")
+        index = self._replayed.get(key, 0)
+        self._replayed[key] = index + 1
+        self.replayed += 1
+        return entries[index % len(entries)]
+
+    def save(self):
+        """Writes every recording (previously saved ones included) to the cassette file, replacing it atomically."""
+        self._ensure_loaded()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"format": CASSETTE_FORMAT, "version": CASSETTE_VERSION}) + "\n")
+            for entries in self._entries.values():
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(temp_path, self.path)
+
+    async def wait(self, seconds: float):
+        if self.latency_scale > 0 and seconds > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "mode": self.mode, "recorded": self.recorded, "replayed": self.replayed, "misses": self.misses}
+
+
+class RecordingClient:
+    """Wraps an OpenAI client: calls go to the real API and each successful one is added to the cassette."""
+
+    def __init__(self, client: Any, cassette: Cassette):
+        self.client = client
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name) # models.list() etc. go straight to the real client
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        key = request_key(model, messages, stream, kwargs.get("max_tokens"))
+        started = time.monotonic()
+        if stream:
+            kwargs["stream"] = True
+        response = await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+        latency = round(time.monotonic() - started, 4)
+        if stream:
+            return _RecordingStream(response, self.cassette, {"key": key, "model": model, "latency": latency, "usage": None})
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        self.cassette.add({
+            "key": key,
+            "model": model,
+            "latency": latency,
+            "content": response.choices[0].message.content,
+            "usage": [prompt_tokens, completion_tokens] if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int) else None,
+        })
+        return response
+
+
+class _RecordingStream:
+    """Passes the chunks of a real stream through, noting each content delta and when it arrived."""
+
+    def __init__(self, stream: Any, cassette: Cassette, entry: Dict[str, Any]):
+        self._stream = stream
+        self._cassette = cassette
+        self._entry = entry
+        self._chunks: List[List[Any]] = []
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        started = time.monotonic()
+        async for chunk in self._stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                self._chunks.append([round(time.monotonic() - started, 4), chunk.choices[0].delta.content])
+            yield chunk
+        # Only complete streams are recorded: a stream closed early would replay as a truncated answer
+        self._cassette.add({**self._entry, "chunks": self._chunks})
+
+    async def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            await close()
+
+
+class ReplayClient:
+    """Stands in for the OpenAI client and answers from the cassette, waiting the recorded latencies times latency_scale."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        entry = self.cassette.next_entry(request_key(model, messages, stream, kwargs.get("max_tokens")))
+        await self.cassette.wait(entry["latency"])
+        if stream:
+            return _ReplayStream(entry["chunks"], self.cassette)
+        usage = entry.get("usage")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=entry["content"]))],
+            usage=SimpleNamespace(prompt_tokens=usage[0], completion_tokens=usage[1]) if usage else None,
+        )
+
+
+class _ReplayStream:
+    def __init__(self, chunks: List[List[Any]], cassette: Cassette):
+        self._chunks = chunks
+        self._cassette = cassette
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        elapsed = 0.0
+        for offset, delta in self._chunks:
+            await self._cassette.wait(offset - elapsed)
+            elapsed = offset
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    async def close(self):
+        pass
+
+
+def cassette_from_env() -> Optional[Cassette]:
+    """
+    Cassette configured from LLM_CASSETTE (file path), LLM_CASSETTE_MODE (replay or record, default replay)
+    and LLM_CASSETTE_LATENCY_SCALE (1 = recorded latencies, 0 = no waiting). None when LLM_CASSETTE is not set.
+    """
+    path = os.getenv("LLM_CASSETTE")
+    if not path:
+        return None
+    return Cassette(
+        path,
+        mode=os.getenv("LLM_CASSETTE_MODE", "replay").lower(),
+        latency_scale=float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", 1.0)),
+    )
@@ -0,0 +1,146 @@
+# Circuit breaker for calls to an unreliable backend (the LLM API)
+import os
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed" # Calls flow normally
+    OPEN = "open" # Calls fail fast until the cool-down has passed
+    HALF_OPEN = "half_open" # A few probe calls decide whether to close again
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the last `window` calls. The circuit opens when, over at least `min_calls` calls,
+    the error rate or the rate of calls slower than `slow_call_seconds` crosses its threshold.
+    After `open_seconds` it lets `half_open_max_calls` probes through: a successful probe closes it,
+    a failed one opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 10,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window) # (failed, slow)
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self.rejected_calls = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_in_flight = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """
+        Returns True if a call may go through now. Every allowed call must be followed by record_success/record_failure,
+        or by release() if it ended without an outcome (cancelled).
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+            self._half_open_in_flight += 1
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def release(self):
+        """Gives back the probe slot of a half-open call that was cancelled: it says nothing about the backend."""
+        if self._state == CircuitState.HALF_OPEN and self._half_open_in_flight > 0:
+            self._half_open_in_flight -= 1
+
+    def record_success(self, latency: Optional[float] = None):
+        slow = self.slow_call_seconds is not None and latency is not None and latency >= self.slow_call_seconds
+        if self._state == CircuitState.HALF_OPEN:
+            if slow:
+                self._open()
+            else:
+                self._close()
+            return
+        self._record(failed=False, slow=slow)
+
+    def record_failure(self):
+        if self._state == CircuitState.HALF_OPEN:
+            self._open()
+            return
+        self._record(failed=True, slow=False)
+
+    def reset(self):
+        self._close()
+        self.rejected_calls = 0
+        self.times_opened = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        calls = len(self._outcomes)
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "recent_calls": calls,
+            "error_rate": round(self._rate(0), 3) if calls else 0.0,
+            "slow_call_rate": round(self._rate(1), 3) if calls else 0.0,
+            "rejected_calls": self.rejected_calls,
+            "times_opened": self.times_opened,
+        }
+
+    def _record(self, failed: bool, slow: bool):
+        self._outcomes.append((failed, slow))
+        if self._state != CircuitState.CLOSED or len(self._outcomes) < self.min_calls:
+            return
+        if self._rate(0) >= self.error_rate_threshold:
+            self._open()
+        elif self.slow_call_seconds is not None and self._rate(1) >= self.slow_call_rate_threshold:
+            self._open()
+
+    def _rate(self, index: int) -> float:
+        return sum(1 for outcome in self._outcomes if outcome[index]) / len(self._outcomes)
+
+    def _open(self):
+        print(f"Circuit breaker '{self.name}' opened.")
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self._half_open_in_flight = 0
+        self.times_opened += 1
+
+    def _close(self):
+        if self._state != CircuitState.CLOSED:
+            print(f"Circuit breaker '{self.name}' closed.")
+        self._state = CircuitState.CLOSED
+        self._outcomes.clear()
+        self._half_open_in_flight = 0
+
+
+def circuit_breaker_from_env(name: str, prefix: str = "LLM_CIRCUIT") -> CircuitBreaker:
+    """Builds a breaker configured from <prefix>_ERROR_RATE, _SLOW_CALL_SECONDS, _OPEN_SECONDS, _MIN_CALLS and _WINDOW."""
+    slow_call_seconds = os.getenv(f"{prefix}_SLOW_CALL_SECONDS")
+    return CircuitBreaker(
+        name=name,
+        window=int(os.getenv(f"{prefix}_WINDOW", 20)),
+        min_calls=int(os.getenv(f"{prefix}_MIN_CALLS", 10)),
+        error_rate_threshold=float(os.getenv(f"{prefix}_ERROR_RATE", 0.5)),
+        slow_call_seconds=float(slow_call_seconds) if slow_call_seconds else None,
+        open_seconds=float(os.getenv(f"{prefix}_OPEN_SECONDS", 30)),
+    )
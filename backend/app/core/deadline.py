@@ -0,0 +1,57 @@
+# Request deadlines, propagated implicitly through contextvars
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+DEFAULT_REQUEST_TIMEOUT = 60.0 # Seconds, end-to-end budget for one API request
+
+# Absolute deadline (time.monotonic() based) of the request being handled, if any.
+# asyncio tasks copy the context when created, so work spawned for a request inherits its deadline.
+_current_deadline: ContextVar[Optional[float]] = ContextVar("nowgo_request_deadline", default=None)
+
+
+def default_request_timeout() -> float:
+    return float(os.getenv("REQUEST_TIMEOUT", DEFAULT_REQUEST_TIMEOUT))
+
+
+@contextmanager
+def deadline_scope(timeout_seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Sets a deadline `timeout_seconds` from now for the code inside the block.
+    A nested scope can only tighten the deadline, never extend the outer one.
+    """
+    current = _current_deadline.get()
+    deadline = current
+    if timeout_seconds is not None:
+        candidate = time.monotonic() + timeout_seconds
+        deadline = candidate if current is None else min(current, candidate)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline (may be negative), or None if there is no deadline."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def deadline_exceeded() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def budget_for_call(max_timeout: Optional[float]) -> Optional[float]:
+    """Timeout for a single downstream call: the configured per-call limit, capped by the remaining budget."""
+    remaining = remaining_time()
+    if remaining is None:
+        return max_timeout
+    if max_timeout is None:
+        return remaining
+    return min(max_timeout, remaining)
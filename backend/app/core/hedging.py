@@ -0,0 +1,82 @@
+# Hedged requests: send a backup request when the first one is slower than usual
+import asyncio
+import math
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+DEFAULT_WINDOW = 200 # Latency samples kept
+DEFAULT_MIN_SAMPLES = 20 # Below this, percentiles are not trusted and no hedge is sent
+
+
+class LatencyTracker:
+    """Rolling window of call latencies, used to derive the hedge delay (p95 by default)."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW, min_samples: int = DEFAULT_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgingStats:
+    def __init__(self):
+        self.calls = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0 # Calls answered by the backup request
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "hedges_sent": self.hedges_sent, "hedge_wins": self.hedge_wins}
+
+
+async def hedged_call(
+    make_call: Callable[[], Awaitable[Any]],
+    hedge_delay: Optional[float],
+    stats: Optional[HedgingStats] = None,
+) -> Any:
+    """
+    Runs make_call(); if it hasn't finished after `hedge_delay` seconds, runs it a second time and
+    returns whichever finishes first, cancelling the other. If the first to finish fails, the other
+    one's result is used. With hedge_delay None the call is not hedged.
+    """
+    if stats is not None:
+        stats.calls += 1
+    if hedge_delay is None:
+        return await make_call()
+
+    primary = asyncio.ensure_future(make_call())
+
+    backup: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        if stats is not None:
+            stats.hedges_sent += 1
+        backup = asyncio.ensure_future(make_call())
+        pending = {primary, backup}
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup and stats is not None:
+                        stats.hedge_wins += 1
+                    return task.result()
+                last_error = task.exception()
+        raise last_error # type: ignore[misc]
+    finally:
+        for task in (primary, backup):
+            if task is not None and not task.done():
+                task.cancel()
@@ -0,0 +1,58 @@
+# Lazy loading of heavy dependencies and settings, so importing the app stays fast
+import importlib
+import os
+import time
+from types import ModuleType
+from typing import Dict, List
+
+# Heavy optional modules (LLM SDK, tokenizers, retrieval/embedding libraries) that are imported on first use.
+# warm_up_imports() imports them ahead of the first request.
+WARM_UP_MODULES: List[str] = ["openai"]
+
+_env_loaded = False
+
+
+def project_env_path() -> str:
+    """Path of the .env file loaded by load_env() (same location the OpenAI client has always used)."""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env")
+
+
+def load_env():
+    """
+    Loads the project .env file into the environment, once.
+    Entry points call this before reading settings; importing library modules no longer does.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        print("Warning: python-dotenv is not installed, .env file not loaded.")
+        return
+    load_dotenv(dotenv_path=project_env_path())
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Imports a module on first use (later calls are a sys.modules lookup)."""
+    return importlib.import_module(name)
+
+
+def register_warm_up_module(name: str):
+    if name not in WARM_UP_MODULES:
+        WARM_UP_MODULES.append(name)
+
+
+def warm_up_imports() -> Dict[str, float]:
+    """Imports every registered heavy module and returns the seconds each took. Missing optional modules are skipped."""
+    timings: Dict[str, float] = {}
+    for name in WARM_UP_MODULES:
+        started = time.perf_counter()
+        try:
+            lazy_import(name)
+        except ImportError as e:
+            print(f"Warm-up: optional module '{name}' not available ({e}).")
+            continue
+        timings[name] = time.perf_counter() - started
+    return timings
@@ -1,23 +1,180 @@
+import asyncio
+import hashlib
+import json
 import os
-from openai import OpenAI, OpenAIError # Import OpenAIError for explicit error handling
-from dotenv import load_dotenv
-from typing import List, Dict, Union, Any # For message typing
-
-# Load environment variables from .env file in the project root
-# This path needs to be correct relative to where the application is run from,
-# or an absolute path should be used if discoverability is an issue.
-# For tests, this might be mocked or the .env file placed appropriately.
-# Assuming the .env is at /home/ubuntu/NowGo-LLM/.env
-dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env")
-load_dotenv(dotenv_path=dotenv_path)
-
-def get_openai_client() -> OpenAI | None:
-    """Creates and returns an OpenAI client instance if API key is available."""
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional, Tuple, Union, Any # For message typing
+
+from .cassette import Cassette, RecordingClient, ReplayClient, cassette_from_env
+from .circuit_breaker import CircuitState, circuit_breaker_from_env
+from .deadline import budget_for_call
+from .hedging import HedgingStats, LatencyTracker, hedged_call
+from .lazy import lazy_import, load_env
+from .usage import current_usage_attribution, estimate_tokens, usage_accountant
+
+# The OpenAI SDK takes about half a second to import, so it is imported on first use
+# (or by the warm-up hook, see core/lazy.py) instead of when this module is imported.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Environment variables from the .env file are loaded by the app entry point (app/main.py) through load_env().
+# get_openai_client() calls it too, for scripts and notebooks that use this module directly.
+
+DEFAULT_OPENAI_TIMEOUT = 30.0 # Seconds per API call, overridden by OPENAI_TIMEOUT
+HEDGE_PERCENTILE = 95.0
+
+# Latency of successful completion calls, used to decide when a hedge request is worth sending
+completion_latency = LatencyTracker()
+hedging_stats = HedgingStats()
+
+# Fails fast while the OpenAI API is erroring or slow, see core/circuit_breaker.py for the settings
+llm_circuit_breaker = circuit_breaker_from_env("openai")
+fallback_circuit_breaker = circuit_breaker_from_env("fallback", prefix="LLM_FALLBACK_CIRCUIT")
+
+class ResponseCache:
+    """Small LRU of recent successful answers, served when the LLM backend is unavailable."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]]) -> str:
+        return hashlib.sha256(json.dumps([model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        answer = self._entries.get(key)
+        if answer is not None:
+            self._entries.move_to_end(key)
+        return answer
+
+    def put(self, key: str, answer: str):
+        self._entries[key] = answer
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+response_cache = ResponseCache(int(os.getenv("LLM_RESPONSE_CACHE_SIZE", 1000)))
+
+# Records calls to a cassette file or answers from one instead of the API, see core/cassette.py (LLM_CASSETTE)
+llm_cassette: Optional[Cassette] = cassette_from_env()
+
+def set_cassette(cassette: Optional[Cassette]) -> Optional[Cassette]:
+    """Records to or replays from `cassette` (None goes back to plain API calls) and returns the previous one."""
+    global llm_cassette
+    previous, llm_cassette = llm_cassette, cassette
+    return previous
+
+def save_cassette():
+    """Writes the calls recorded so far to the cassette file. Nothing to do unless recording."""
+    if llm_cassette is not None and llm_cassette.mode == "record":
+        llm_cassette.save()
+        print(f"Saved {len(llm_cassette)} recorded LLM calls to {llm_cassette.path}")
+
+def llm_backend_status() -> Dict[str, Any]:
+    """State of the LLM circuit breakers, reported by /health."""
+    return {
+        "circuit": llm_circuit_breaker.snapshot(),
+        "fallback_configured": get_fallback_client()[0] is not None,
+        "fallback_circuit": fallback_circuit_breaker.snapshot(),
+        "cassette": llm_cassette.stats() if llm_cassette is not None else None,
+    }
+
+def llm_backend_available() -> bool:
+    """False while the primary circuit is open and there is no usable fallback backend."""
+    if llm_circuit_breaker.state != CircuitState.OPEN:
+        return True
+    return get_fallback_client()[0] is not None and fallback_circuit_breaker.state != CircuitState.OPEN
+
+def openai_call_timeout() -> Optional[float]:
+    """Per-call timeout: OPENAI_TIMEOUT, capped by what is left of the current request deadline."""
+    return budget_for_call(float(os.getenv("OPENAI_TIMEOUT", DEFAULT_OPENAI_TIMEOUT)))
+
+def hedge_delay() -> Optional[float]:
+    """Delay after which a backup request is sent, or None when hedging is disabled (OPENAI_HEDGING=1 enables it)."""
+    if os.getenv("OPENAI_HEDGING", "").lower() not in ("1", "true", "yes"):
+        return None
+    fixed_delay = os.getenv("OPENAI_HEDGE_DELAY")
+    if fixed_delay:
+        return float(fixed_delay)
+    return completion_latency.percentile(HEDGE_PERCENTILE)
+
+# One client (and so one HTTP connection pool) per API key, shared by all calls including hedges
+_clients: Dict[str, "AsyncOpenAI"] = {}
+
+# Stand-in for the OpenAI client (same chat.completions.create interface), e.g. a fake or replaying LLM
+# used by the golden-set harness and offline benchmarks. Takes precedence over the API key.
+_client_override: Optional[Any] = None
+
+def set_client_override(client: Optional[Any]) -> Optional[Any]:
+    """Routes every completion through `client` (None restores the real client) and returns the previous override."""
+    global _client_override
+    previous, _client_override = _client_override, client
+    return previous
+
+def get_openai_client() -> Optional["AsyncOpenAI"]:
+    """Returns the shared async OpenAI client instance if API key is available."""
+    if _client_override is not None:
+        return _client_override
+    if llm_cassette is not None and llm_cassette.mode == "replay":
+        return ReplayClient(llm_cassette) # Offline: no API key needed, no network
+    load_env()
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         print("Warning: OPENAI_API_KEY not found in environment variables. Please set it in .env file in the project root.")
         return None
-    return OpenAI(api_key=api_key)
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = lazy_import("openai").AsyncOpenAI(api_key=api_key)
+    if llm_cassette is not None:
+        return RecordingClient(client, llm_cassette)
+    return client
+
+def get_fallback_client() -> Tuple[Optional["AsyncOpenAI"], str | None]:
+    """
+    Client and model of the fallback backend, used while the primary circuit is open.
+    Configured with LLM_FALLBACK_BASE_URL (any OpenAI-compatible endpoint), LLM_FALLBACK_API_KEY and LLM_FALLBACK_MODEL.
+    """
+    base_url = os.getenv("LLM_FALLBACK_BASE_URL")
+    model = os.getenv("LLM_FALLBACK_MODEL")
+    if llm_cassette is not None and llm_cassette.mode == "replay":
+        return None, None # Replays stay offline; a request missing from the cassette fails like an API error
+    if not base_url and not model:
+        return None, None
+    api_key = os.getenv("LLM_FALLBACK_API_KEY") or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None, None
+    cache_key = f"fallback:{base_url}:{api_key}"
+    client = _clients.get(cache_key)
+    if client is None:
+        client = _clients[cache_key] = lazy_import("openai").AsyncOpenAI(api_key=api_key, base_url=base_url or None)
+    return client, model
+
+def _build_messages(prompt: Union[str, List[Dict[str, str]]]) -> List[Dict[str, str]] | None:
+    """Turns a prompt (plain string or list of message dicts) into the message list sent to the API."""
+    if isinstance(prompt, str):
+        return [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ]
+    elif isinstance(prompt, list):
+        return prompt # Assume it's already a list of message dicts
+    print("Error: Invalid prompt type. Must be a string or a list of message dictionaries.")
+    return None
+
+def _record_usage(model: str, response: Any, messages: List[Dict[str, str]], content: str | None, latency_seconds: float):
+    """Bills a completion to the current company/user/persona, using the token counts reported by the API when present."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if not isinstance(prompt_tokens, int) or not isinstance(completion_tokens, int):
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(content or "")
+    usage_accountant.record(model, prompt_tokens, completion_tokens, latency_seconds)
 
 async def get_chat_completion(prompt: Union[str, List[Dict[str, str]]], model: str = "gpt-4-turbo") -> str | None:
     """Get a chat completion from OpenAI API."""
@@ -26,31 +183,165 @@ async def get_chat_completion(prompt: Union[str, List[Dict[str, str]]], model: s
         print("Error: OpenAI client could not be initialized. API key missing or invalid.")
         return None
 
-    messages: List[Dict[str, str]]
-    if isinstance(prompt, str):
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ]
-    elif isinstance(prompt, list):
-        messages = prompt # Assume it's already a list of message dicts
-    else:
-        print("Error: Invalid prompt type. Must be a string or a list of message dictionaries.")
+    messages = _build_messages(prompt)
+    if messages is None:
         return None
 
-    try:
-        response = await client.chat.completions.create(
+    timeout = openai_call_timeout()
+    if timeout is not None and timeout <= 0:
+        print("Error: Request deadline exceeded before calling OpenAI API.")
+        return None
+
+    cache_key = ResponseCache.key(model, messages)
+    if not llm_circuit_breaker.allow_request():
+        print("OpenAI API circuit is open, failing fast to the fallback.")
+        return await _fallback_completion(messages, model, cache_key, timeout)
+
+    async def create_completion():
+        started = time.monotonic()
+        result = await client.chat.completions.create(
             model=model,
             messages=messages # type: ignore <- OpenAI SDK expects List[ChatCompletionMessageParam]
         )
-        return response.choices[0].message.content
-    except OpenAIError as e: # Catch specific OpenAI errors
+        completion_latency.record(time.monotonic() - started)
+        return result
+
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(hedged_call(create_completion, hedge_delay(), hedging_stats), timeout)
+        content = response.choices[0].message.content
+    except asyncio.TimeoutError:
+        print(f"OpenAI API Error: call timed out after {timeout:.2f}s")
+        llm_circuit_breaker.record_failure()
+        return await _fallback_completion(messages, model, cache_key, openai_call_timeout())
+    except lazy_import("openai").OpenAIError as e: # Catch specific OpenAI errors (evaluated only when an exception is raised)
         print(f"OpenAI API Error: {e}")
-        return None
+        llm_circuit_breaker.record_failure()
+        return await _fallback_completion(messages, model, cache_key, openai_call_timeout())
     except Exception as e:
         print(f"An unexpected error occurred while calling OpenAI API: {e}")
+        llm_circuit_breaker.record_failure()
+        return await _fallback_completion(messages, model, cache_key, openai_call_timeout())
+    except BaseException:
+        # Cancelled (job timeout, client gone, losing hedge or probe): no outcome, but a half-open slot must not leak
+        llm_circuit_breaker.release()
+        raise
+
+    latency = time.monotonic() - started
+    llm_circuit_breaker.record_success(latency)
+    _record_usage(model, response, messages, content, latency)
+    if content:
+        response_cache.put(cache_key, content)
+    return content
+
+async def _fallback_completion(messages: List[Dict[str, str]], model: str, cache_key: str, timeout: Optional[float]) -> str | None:
+    """Answers from the response cache, or else from the fallback backend. Returns None if neither can."""
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        print("Serving cached answer while the OpenAI API is unavailable.")
+        return cached
+
+    fallback_client, fallback_model = get_fallback_client()
+    if fallback_client is None or (timeout is not None and timeout <= 0):
+        return None
+    if not fallback_circuit_breaker.allow_request():
+        print("Fallback LLM circuit is open as well.")
         return None
 
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            fallback_client.chat.completions.create(model=fallback_model or model, messages=messages), # type: ignore
+            timeout
+        )
+    except Exception as e:
+        print(f"Fallback LLM backend error: {e}")
+        fallback_circuit_breaker.record_failure()
+        return None
+    except BaseException:
+        fallback_circuit_breaker.release()
+        raise
+    latency = time.monotonic() - started
+    fallback_circuit_breaker.record_success(latency)
+    content = response.choices[0].message.content
+    _record_usage(fallback_model or model, response, messages, content, latency)
+    return content
+
+async def stream_chat_completion(
+    prompt: Union[str, List[Dict[str, str]]],
+    model: str = "gpt-4-turbo",
+    max_tokens: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Streams a chat completion from OpenAI API, yielding content deltas as they arrive.
+    Closing the generator early (aclose()) closes the HTTP stream, so the server stops generating.
+    Errors are logged and end the stream, mirroring get_chat_completion returning None.
+    """
+    client = get_openai_client()
+    if not client:
+        print("Error: OpenAI client could not be initialized. API key missing or invalid.")
+        return
+
+    messages = _build_messages(prompt)
+    if messages is None:
+        return
+
+    timeout = openai_call_timeout()
+    if timeout is not None and timeout <= 0:
+        print("Error: Request deadline exceeded before calling OpenAI API.")
+        return
+
+    if not llm_circuit_breaker.allow_request():
+        print("OpenAI API circuit is open, not starting the stream.")
+        return
+
+    # Captured now: the stream may be finished or closed from another task (speculative probes)
+    attribution = current_usage_attribution()
+    extra_args: Dict[str, Any] = {"timeout": timeout}
+    if max_tokens is not None:
+        extra_args["max_tokens"] = max_tokens
+
+    started = time.monotonic()
+    try:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages, # type: ignore
+            stream=True,
+            **extra_args
+        )
+    except Exception as e:
+        print(f"An unexpected error occurred while calling OpenAI API: {e}")
+        llm_circuit_breaker.record_failure()
+        return
+    except BaseException:
+        llm_circuit_breaker.release() # Cancelled before the stream started
+        raise
+    llm_circuit_breaker.record_success(time.monotonic() - started) # Time to first byte
+
+    streamed_chunks = 0
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                streamed_chunks += 1
+                yield delta
+    except lazy_import("openai").OpenAIError as e:
+        print(f"OpenAI API Error while streaming: {e}")
+    finally:
+        # Streamed responses carry no usage: the prompt is estimated and each content chunk is about one token
+        usage_accountant.record(
+            model,
+            sum(estimate_tokens(m.get("content") or "") for m in messages),
+            streamed_chunks,
+            time.monotonic() - started,
+            attribution=attribution,
+        )
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+
 async def test_openai_connection() -> bool:
     """Test the connection to OpenAI API with a simple prompt."""
     print("Testing OpenAI API connection...")
@@ -0,0 +1,51 @@
+# Lightweight per-request tracing of stage latencies, used by the golden-set replay harness
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+
+class RequestTrace:
+    """Milliseconds spent in each stage of a request, plus free-form annotations (persona chosen, ...)."""
+
+    def __init__(self):
+        self.stages_ms: Dict[str, float] = {}
+        self.annotations: Dict[str, Any] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"stages_ms": dict(self.stages_ms), **self.annotations}
+
+
+# Trace of the request being handled, if tracing was requested. Nothing is recorded otherwise.
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("nowgo_request_trace", default=None)
+
+
+@contextmanager
+def trace_scope() -> Iterator[RequestTrace]:
+    """Records the stages and annotations of the code inside the block into a new RequestTrace."""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def trace_stage(name: str) -> Iterator[None]:
+    """Times the block as stage `name` of the current trace (time adds up if a stage runs more than once)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages_ms[name] = trace.stages_ms.get(name, 0.0) + (time.perf_counter() - started) * 1000.0
+
+
+def annotate(key: str, value: Any):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.annotations[key] = value
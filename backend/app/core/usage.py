@@ -0,0 +1,302 @@
+# Per-tenant usage accounting (tokens, requests, latency) and token quotas
+import asyncio
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_USAGE_DB = os.path.join(BACKEND_DIR, "data", "usage.sqlite3")
+DEFAULT_FLUSH_INTERVAL = 10.0 # Seconds between flushes of the in-memory counters to the store
+UNATTRIBUTED = "-" # Company/user/persona of LLM calls made outside a request (connection tests, warm-up)
+QUOTA_PERIODS = ("day", "month")
+
+# (company_id, user_id, persona) the LLM calls of the current request are billed to.
+# Like the request deadline, asyncio tasks spawned for a request inherit it.
+_current_attribution: ContextVar[Tuple[str, str, str]] = ContextVar("nowgo_usage_attribution", default=(UNATTRIBUTED, UNATTRIBUTED, UNATTRIBUTED))
+
+
+@contextmanager
+def usage_scope(company_id: Optional[str] = None, user_id: Optional[str] = None, persona: Optional[str] = None) -> Iterator[Tuple[str, str, str]]:
+    """Attributes LLM usage inside the block. Arguments left as None keep the value of the enclosing scope."""
+    current = _current_attribution.get()
+    attribution = (company_id or current[0], user_id or current[1], persona or current[2])
+    token = _current_attribution.set(attribution)
+    try:
+        yield attribution
+    finally:
+        _current_attribution.reset(token)
+
+
+def current_usage_attribution() -> Tuple[str, str, str]:
+    return _current_attribution.get()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token), for calls whose API response carries no usage."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def parse_quotas(value: str) -> Dict[str, int]:
+    """Parses NOWGO_TOKEN_QUOTAS, e.g. "comp456=200000,*=1000000" ("*" applies to every other company)."""
+    quotas: Dict[str, int] = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        company_id, _, limit = item.partition("=")
+        quotas[company_id.strip()] = int(limit)
+    return quotas
+
+
+class QuotaExceededError(Exception):
+    """Raised before an LLM call when a company has used up its token quota for the current period."""
+
+    def __init__(self, company_id: str, used: int, limit: int, period: str, retry_after: int):
+        super().__init__(f"Token quota exceeded for company '{company_id}': {used}/{limit} tokens this {period}")
+        self.company_id = company_id
+        self.used = used
+        self.limit = limit
+        self.period = period
+        self.retry_after = retry_after # Seconds until the quota period resets
+
+
+# Counters kept per (day, company_id, user_id, persona, model)
+_COUNTERS = ("requests", "prompt_tokens", "completion_tokens", "latency_seconds")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    company_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    persona TEXT NOT NULL,
+    model TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_seconds REAL NOT NULL,
+    PRIMARY KEY (day, company_id, user_id, persona, model)
+)
+"""
+
+_UPSERT = """
+INSERT INTO usage (day, company_id, user_id, persona, model, requests, prompt_tokens, completion_tokens, latency_seconds)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (day, company_id, user_id, persona, model) DO UPDATE SET
+    requests = requests + excluded.requests,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    latency_seconds = latency_seconds + excluded.latency_seconds
+"""
+
+
+class UsageAccountant:
+    """
+    Aggregates LLM usage in memory and periodically flushes it to a local SQLite store.
+    Recording is a dict update on the request path; the store is written by flush() only.
+    Quotas are checked against this process's view of the current period (the store plus unflushed usage),
+    so with several worker processes each enforces the quota from what it has seen, loaded once per period.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_USAGE_DB, quotas: Optional[Dict[str, int]] = None, quota_period: str = "day"):
+        if quota_period not in QUOTA_PERIODS:
+            raise ValueError(f"quota_period must be one of {QUOTA_PERIODS}, got '{quota_period}'")
+        self.db_path = db_path
+        self.quotas = dict(quotas or {})
+        self.quota_period = quota_period
+        self._pending: Dict[Tuple[str, str, str, str, str], List[float]] = {}
+        self._period_tokens: Dict[Tuple[str, str], int] = {} # (company_id, period key) -> tokens used
+        self._lock = threading.Lock() # Guards the counters; record() runs on the event loop, flush() in a worker thread
+        self._flush_lock = threading.Lock() # Held while a batch is being written, never taken by record()
+
+    # --- Recording --- #
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, latency_seconds: float,
+               attribution: Optional[Tuple[str, str, str]] = None, now: Optional[datetime] = None):
+        """Adds one LLM call to the counters of `attribution`, by default the current one (see usage_scope)."""
+        now = now or datetime.now(timezone.utc)
+        company_id, user_id, persona = attribution or current_usage_attribution()
+        key = (now.strftime("%Y-%m-%d"), company_id, user_id, persona, model)
+        with self._lock:
+            counters = self._pending.get(key)
+            if counters is None:
+                counters = self._pending[key] = [0, 0, 0, 0.0]
+            counters[0] += 1
+            counters[1] += prompt_tokens
+            counters[2] += completion_tokens
+            counters[3] += latency_seconds
+            period_key = (company_id, self._period_key(now))
+            if period_key in self._period_tokens:
+                self._period_tokens[period_key] += prompt_tokens + completion_tokens
+
+    # --- Quotas --- #
+
+    def quota_for(self, company_id: str) -> Optional[int]:
+        return self.quotas.get(company_id, self.quotas.get("*"))
+
+    def tokens_used(self, company_id: str, now: Optional[datetime] = None) -> int:
+        """Tokens used by the company in the current quota period."""
+        now = now or datetime.now(timezone.utc)
+        period_key = (company_id, self._period_key(now))
+        with self._lock:
+            if period_key in self._period_tokens:
+                return self._period_tokens[period_key]
+        # First check of the period: with no batch being written, every call is either in the store or in the counters
+        with self._flush_lock:
+            stored = self._stored_tokens(company_id, period_key[1])
+            with self._lock:
+                if period_key not in self._period_tokens:
+                    pending = sum(c[1] + c[2] for k, c in self._pending.items() if k[1] == company_id and k[0].startswith(period_key[1]))
+                    self._period_tokens = {k: v for k, v in self._period_tokens.items() if k[1] == period_key[1]} # Drop past periods
+                    self._period_tokens[period_key] = stored + pending
+                return self._period_tokens[period_key]
+
+    def check_quota(self, company_id: str, now: Optional[datetime] = None):
+        """Raises QuotaExceededError if the company has no tokens left this period. No quota configured means unlimited."""
+        limit = self.quota_for(company_id)
+        if limit is None:
+            return
+        now = now or datetime.now(timezone.utc)
+        used = self.tokens_used(company_id, now)
+        if used >= limit:
+            raise QuotaExceededError(company_id, used, limit, self.quota_period, self._seconds_until_reset(now))
+
+    async def check_quota_async(self, company_id: str, now: Optional[datetime] = None):
+        """
+        check_quota for the event loop. The first check of a period reads the store and may wait for a flush,
+        so it runs in a worker thread; later checks only read the in-memory counters.
+        """
+        if self.quota_for(company_id) is None:
+            return
+        now = now or datetime.now(timezone.utc)
+        with self._lock:
+            loaded = (company_id, self._period_key(now)) in self._period_tokens
+        if not loaded:
+            await asyncio.to_thread(self.tokens_used, company_id, now)
+        self.check_quota(company_id, now)
+
+    def _period_key(self, now: datetime) -> str:
+        return now.strftime("%Y-%m-%d" if self.quota_period == "day" else "%Y-%m")
+
+    def _seconds_until_reset(self, now: datetime) -> int:
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if self.quota_period == "day":
+            reset = start_of_day + timedelta(days=1)
+        else:
+            reset = (start_of_day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        return max(1, int((reset - now).total_seconds()))
+
+    # --- Store --- #
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(_SCHEMA)
+        return connection
+
+    def _stored_tokens(self, company_id: str, period_key: str) -> int:
+        if not os.path.exists(self.db_path):
+            return 0
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) FROM usage WHERE company_id = ? AND day LIKE ?",
+                (company_id, f"{period_key}%"),
+            ).fetchone()
+        return int(row[0])
+
+    def flush(self) -> int:
+        """Writes the pending counters to the store and returns how many rows were written. Blocking, see run_periodic_flush."""
+        with self._flush_lock:
+            # Only the swap holds the counters lock, so record() on the event loop never waits for the write
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            try:
+                with closing(self._connect()) as connection, connection: # Commits, then closes
+                    connection.executemany(_UPSERT, [(*key, *counters) for key, counters in batch.items()])
+            except sqlite3.Error as e:
+                print(f"Usage accounting: flush failed, keeping counters for the next attempt ({e}).")
+                with self._lock:
+                    for key, counters in batch.items():
+                        pending = self._pending.setdefault(key, [0, 0, 0, 0.0])
+                        for i, value in enumerate(counters):
+                            pending[i] += value
+                return 0
+            return len(batch)
+
+    async def run_periodic_flush(self, interval: Optional[float] = None):
+        """Flushes every `interval` seconds (NOWGO_USAGE_FLUSH_INTERVAL) until cancelled, then flushes once more."""
+        interval = float(os.getenv("NOWGO_USAGE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)) if interval is None else interval
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.flush)
+        finally:
+            self.flush()
+
+    # --- Reporting --- #
+
+    def report(self, company_id: str, period: Optional[str] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Usage of a company in the current day or month, in total and broken down by user, persona and model."""
+        period = period or self.quota_period
+        if period not in QUOTA_PERIODS:
+            raise ValueError(f"period must be one of {QUOTA_PERIODS}, got '{period}'")
+        now = now or datetime.now(timezone.utc)
+        period_key = now.strftime("%Y-%m-%d" if period == "day" else "%Y-%m")
+        self.flush()
+        with closing(self._connect()) as connection, connection:
+            rows = connection.execute(
+                "SELECT user_id, persona, model, " + ", ".join(f"SUM({c})" for c in _COUNTERS) +
+                " FROM usage WHERE company_id = ? AND day LIKE ? GROUP BY user_id, persona, model",
+                (company_id, f"{period_key}%"),
+            ).fetchall()
+
+        totals = _empty_totals()
+        breakdown: Dict[str, Dict[str, Dict[str, Any]]] = {"by_user": {}, "by_persona": {}, "by_model": {}}
+        for user_id, persona, model, *counters in rows:
+            _add(totals, counters)
+            for group, name in (("by_user", user_id), ("by_persona", persona), ("by_model", model)):
+                _add(breakdown[group].setdefault(name, _empty_totals()), counters)
+
+        limit = self.quota_for(company_id)
+        quota = None
+        if limit is not None:
+            used = self.tokens_used(company_id, now)
+            quota = {"limit": limit, "used": used, "remaining": max(limit - used, 0), "period": self.quota_period}
+        return {"company_id": company_id, "period": period, "period_start": period_key, **_finish(totals),
+                **{group: {name: _finish(t) for name, t in items.items()} for group, items in breakdown.items()},
+                "quota": quota}
+
+
+def _empty_totals() -> Dict[str, float]:
+    return {counter: 0 for counter in _COUNTERS}
+
+def _add(totals: Dict[str, float], counters: List[float]):
+    for counter, value in zip(_COUNTERS, counters):
+        totals[counter] += value
+
+def _finish(totals: Dict[str, float]) -> Dict[str, Any]:
+    requests = int(totals["requests"])
+    return {
+        "requests": requests,
+        "prompt_tokens": int(totals["prompt_tokens"]),
+        "completion_tokens": int(totals["completion_tokens"]),
+        "total_tokens": int(totals["prompt_tokens"] + totals["completion_tokens"]),
+        "avg_latency_seconds": round(totals["latency_seconds"] / requests, 4) if requests else None,
+    }
+
+
+def usage_accountant_from_env() -> UsageAccountant:
+    """Builds the accountant from NOWGO_USAGE_DB, NOWGO_TOKEN_QUOTAS and NOWGO_QUOTA_PERIOD."""
+    return UsageAccountant(
+        db_path=os.getenv("NOWGO_USAGE_DB", DEFAULT_USAGE_DB),
+        quotas=parse_quotas(os.getenv("NOWGO_TOKEN_QUOTAS", "")),
+        quota_period=os.getenv("NOWGO_QUOTA_PERIOD", "day"),
+    )
+
+usage_accountant = usage_accountant_from_env()
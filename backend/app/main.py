@@ -1,10 +1,23 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import json
+from fastapi import FastAPI, HTTPException, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
 
+# Settings from .env must be in the environment before the modules below read them
+from .core.lazy import load_env
+load_env()
+
 # Core and Orchestration imports
-from .core.openai_client import test_openai_connection # get_chat_completion is now used by BaseAgent
+from .core.openai_client import test_openai_connection, llm_backend_available, llm_backend_status, llm_circuit_breaker, save_cassette # get_chat_completion is now used by BaseAgent
 from .orchestration.orchestrator import handle_user_request
+from .core.deadline import deadline_scope, deadline_exceeded, default_request_timeout
+from .orchestration.speculative import speculation_metrics
+from .orchestration.warmup import run_warm_up, warm_up_state
+from .core.usage import QuotaExceededError, QUOTA_PERIODS, usage_accountant
+from .orchestration.jobs import MAX_ATTEMPTS_LIMIT, JobStatus, job_queue
+from .orchestration.sessions import session_store
 
 app = FastAPI(
     title="NowGo-LLM Backend",
@@ -20,31 +33,78 @@ class InteractiveChatRequest(BaseModel):
     prompt: str
     module_accessed: Optional[str] = None
     current_interaction_data: Optional[Dict[str, Any]] = None
+    timeout_seconds: Optional[float] = None # End-to-end budget; defaults to REQUEST_TIMEOUT
+    session_id: Optional[str] = None # Resumes a conversation session; any unknown value (e.g. "new") starts one. None: no session
 
 class InteractiveChatResponse(BaseModel):
     user_prompt: str
     assistant_response: str
+    session_id: Optional[str] = None # Send it back with the next turn (only set when the request used a session)
     # We can add more fields like persona_used, context_summary, etc.
 
+class JobRequest(BaseModel):
+    user_id: str
+    company_id: str
+    prompt: str
+    module_accessed: Optional[str] = None
+    current_interaction_data: Optional[Dict[str, Any]] = None
+    max_attempts: int = 3
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: JobStatus
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+    expires_at: Optional[float] = None # Finished jobs and their results are deleted after NOWGO_JOB_RESULT_TTL
+
 # --- Event Handlers --- #
 @app.on_event("startup")
 async def startup_event():
     print("Starting up NowGo-LLM API...")
-    # Initialize any necessary resources, e.g., DB connections, ML models.
-    # Test OpenAI connection on startup (optional, ensure .env is configured)
-    # print("Performing startup OpenAI connection test...")
-    # await test_openai_connection()
+    # Warm-up (imports, LLM connection pool, agents, hot company profiles) runs in the background:
+    # /health answers right away, /ready only once warm-up has finished.
+    app.state.warm_up_task = asyncio.create_task(run_warm_up())
+    # Token usage is counted in memory and written to the local usage store every NOWGO_USAGE_FLUSH_INTERVAL seconds
+    app.state.usage_flush_task = asyncio.create_task(usage_accountant.run_periodic_flush())
+    # Offline jobs run on a small local worker pool (NOWGO_JOB_WORKERS) next to the interactive requests
+    await job_queue.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     print("Shutting down NowGo-LLM API...")
-    # Clean up resources here if necessary
+    warm_up_task = getattr(app.state, "warm_up_task", None)
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    usage_flush_task = getattr(app.state, "usage_flush_task", None)
+    if usage_flush_task is not None:
+        usage_flush_task.cancel() # Flushes the remaining usage on its way out
+        await asyncio.gather(usage_flush_task, return_exceptions=True)
+    await job_queue.stop()
+    save_cassette() # When recording LLM calls (LLM_CASSETTE_MODE=record)
 
 # --- API Endpoints --- #
 @app.get("/health", tags=["Health Check"])
-async def health_check():
-    """Check the health of the API. Returns a simple status message."""
-    return {"status": "ok", "message": "NowGo-LLM API is healthy"}
+async def health_check(response: Response):
+    """
+    Check the health of the API, including the LLM circuit breaker.
+    Returns 503 while the LLM circuit is open and no fallback can serve, so load balancers can shed traffic early.
+    """
+    llm_status = llm_backend_status()
+    if not llm_backend_available():
+        response.status_code = 503
+        return {"status": "degraded", "message": "LLM backend unavailable (circuit open)", "llm": llm_status}
+    return {"status": "ok", "message": "NowGo-LLM API is healthy", "llm": llm_status}
+
+@app.get("/ready", tags=["Health Check"])
+async def readiness_check(response: Response):
+    """Readiness probe: 503 until the warm-up phase has completed, then 200. Includes the timing of each warm-up step."""
+    if not warm_up_state.ready:
+        response.status_code = 503
+        return {"status": "warming_up", **warm_up_state.as_dict()}
+    return {"status": "ready", **warm_up_state.as_dict()}
 
 @app.post("/v1/chat/interactive", response_model=InteractiveChatResponse, tags=["Interactive Chat"])
 async def interactive_chat_endpoint(request: InteractiveChatRequest):
@@ -57,26 +117,163 @@ async def interactive_chat_endpoint(request: InteractiveChatRequest):
     if not request.user_id or not request.company_id:
         raise HTTPException(status_code=400, detail="user_id and company_id are required")
 
+    if request.timeout_seconds is not None and request.timeout_seconds <= 0:
+        raise HTTPException(status_code=400, detail="timeout_seconds must be positive")
+
     try:
-        assistant_response = await handle_user_request(
-            user_id=request.user_id,
-            company_id=request.company_id,
-            user_prompt=request.prompt,
-            module_accessed=request.module_accessed,
-            current_interaction_data=request.current_interaction_data
-        )
+        # Opt-in: the session keeps the conversation history between turns, so it isn't fetched and rebuilt on every request
+        session = None
+        if request.session_id:
+            session = await session_store.get_or_create(request.user_id, request.company_id, request.session_id)
+        # The deadline propagates (via contextvars) down to the LLM client, which sizes its call timeouts from it
+        with deadline_scope(request.timeout_seconds or default_request_timeout()):
+            assistant_response = await handle_user_request(
+                user_id=request.user_id,
+                company_id=request.company_id,
+                user_prompt=request.prompt,
+                module_accessed=request.module_accessed,
+                current_interaction_data=request.current_interaction_data,
+                session=session
+            )
+            timed_out = deadline_exceeded()
 
+        if assistant_response is None and timed_out:
+            raise HTTPException(status_code=504, detail="The request deadline was exceeded before the assistant could respond.")
+        if assistant_response is None and not llm_backend_available():
+            raise HTTPException(status_code=503, detail="The LLM backend is temporarily unavailable. Please retry later.", headers={"Retry-After": str(int(llm_circuit_breaker.open_seconds))})
         if assistant_response is None:
             raise HTTPException(status_code=500, detail="Failed to get a response from the assistant. The LLM or orchestrator might have encountered an issue.")
         
-        return InteractiveChatResponse(user_prompt=request.prompt, assistant_response=assistant_response)
+        return InteractiveChatResponse(user_prompt=request.prompt, assistant_response=assistant_response, session_id=session.session_id if session is not None else None)
     
+    except HTTPException:
+        raise
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         # Log the exception for debugging
         print(f"Error during interactive chat: {e}")
         # You might want to have more specific error handling here
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@app.post("/v1/chat/documents", tags=["Interactive Chat"])
+async def document_chat_endpoint(request: InteractiveChatRequest):
+    """
+    Same as /v1/chat/interactive, for requests with large documents attached in current_interaction_data
+    ("document" or "documents"). Streams newline-delimited JSON: progress events of the map-reduce
+    ({"stage": "map", "event": "chunk_done", "completed": 3, "total": 12, ...}), then a final
+    {"event": "done", "assistant_response": ...} or {"event": "error", "status": ..., "detail": ...}.
+    """
+    if not request.prompt:
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    if not request.user_id or not request.company_id:
+        raise HTTPException(status_code=400, detail="user_id and company_id are required")
+    if request.timeout_seconds is not None and request.timeout_seconds <= 0:
+        raise HTTPException(status_code=400, detail="timeout_seconds must be positive")
+    try:
+        await usage_accountant.check_quota_async(request.company_id) # Refused with a real 429 before the stream starts
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    events: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def run() -> Dict[str, Any]:
+        try:
+            with deadline_scope(request.timeout_seconds or default_request_timeout()):
+                assistant_response = await handle_user_request(
+                    user_id=request.user_id,
+                    company_id=request.company_id,
+                    user_prompt=request.prompt,
+                    module_accessed=request.module_accessed,
+                    current_interaction_data=request.current_interaction_data,
+                    on_progress=events.put_nowait
+                )
+                timed_out = deadline_exceeded()
+            if assistant_response is not None:
+                return {"event": "done", "user_prompt": request.prompt, "assistant_response": assistant_response}
+            if timed_out:
+                return {"event": "error", "status": 504, "detail": "The request deadline was exceeded before the assistant could respond."}
+            return {"event": "error", "status": 500, "detail": "Failed to get a response from the assistant."}
+        except QuotaExceededError as e:
+            return {"event": "error", "status": 429, "detail": str(e)}
+        except Exception as e:
+            print(f"Error during document chat: {e}")
+            return {"event": "error", "status": 500, "detail": f"An unexpected error occurred: {str(e)}"}
+        finally:
+            events.put_nowait(finished)
+
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is finished:
+                    break
+                yield json.dumps(event) + "\n"
+            yield json.dumps(await task) + "\n"
+        finally:
+            if not task.done(): # Client went away: stop the remaining chunk calls
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/v1/jobs", response_model=JobStatusResponse, status_code=202, tags=["Jobs"])
+async def submit_job_endpoint(request: JobRequest):
+    """
+    Queues a long-running request (document analysis, reports) instead of holding the connection open.
+    Poll GET /v1/jobs/{job_id} and fetch the answer from GET /v1/jobs/{job_id}/result once it has succeeded.
+    """
+    if not request.prompt:
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    if not request.user_id or not request.company_id:
+        raise HTTPException(status_code=400, detail="user_id and company_id are required")
+    if not 1 <= request.max_attempts <= MAX_ATTEMPTS_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_attempts must be between 1 and {MAX_ATTEMPTS_LIMIT}")
+
+    payload = {
+        "user_id": request.user_id,
+        "company_id": request.company_id,
+        "prompt": request.prompt,
+        "module_accessed": request.module_accessed,
+        "current_interaction_data": request.current_interaction_data,
+    }
+    job = await job_queue.submit(payload, max_attempts=request.max_attempts)
+    return JobStatusResponse(**job)
+
+@app.get("/v1/jobs/{job_id}", response_model=JobStatusResponse, tags=["Jobs"])
+async def job_status_endpoint(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return JobStatusResponse(**job)
+
+@app.get("/v1/jobs/{job_id}/result", response_model=InteractiveChatResponse, tags=["Jobs"])
+async def job_result_endpoint(job_id: str):
+    """The answer of a succeeded job. 409 while the job is queued or running, or if it failed."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    if job["status"] != JobStatus.SUCCEEDED.value:
+        detail = f"Job is {job['status']}" + (f": {job['error']}" if job["status"] == JobStatus.FAILED.value else "")
+        raise HTTPException(status_code=409, detail=detail)
+    return InteractiveChatResponse(user_prompt=job["payload"]["prompt"], assistant_response=job["result"])
+
+@app.get("/v1/metrics/speculation", tags=["Metrics"])
+async def speculation_metrics_endpoint():
+    """Counters for speculative persona execution (probes started/cancelled and estimated tokens saved)."""
+    return speculation_metrics.as_dict()
+
+@app.get("/v1/usage/{company_id}", tags=["Usage"])
+async def company_usage_endpoint(company_id: str, period: Optional[str] = None):
+    """
+    Token usage of a company in the current day or month (`period`, defaults to the quota period),
+    in total and by user, persona and model, with the remaining quota if one is configured.
+    """
+    if period is not None and period not in QUOTA_PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of: {', '.join(QUOTA_PERIODS)}")
+    return await asyncio.to_thread(usage_accountant.report, company_id, period)
+
 @app.get("/test_openai/", tags=["Testing"])
 async def test_openai_direct_endpoint():
     """A simple endpoint to test the OpenAI connection directly with a predefined prompt."""
@@ -1,72 +1,7 @@
 # Placeholder for Context Management logic
-from typing import Dict, Any, List
-
-# This would interact with a database or session storage in a real application
-class ContextManager:
-    def __init__(self):
-        # In-memory storage for simplicity. Replace with DB interaction.
-        self.user_interaction_history: Dict[str, List[Dict[str, str]]] = {}
-        self.user_profiles: Dict[str, Dict[str, Any]] = {}
-        self.company_profiles: Dict[str, Dict[str, Any]] = {}
-
-    async def get_user_profile(self, user_id: str) -> Dict[str, Any] | None:
-        """Simulates fetching user profile data."""
-        # Pre-populate with some data for testing, or allow dynamic addition
-        if not self.user_profiles:
-            self.user_profiles["user123"] = {"user_id": "user123", "role": "Manager", "department": "Sales"}
-            self.user_profiles["user789"] = {"user_id": "user789", "role": "Legal Counsel", "department": "Legal"}
-        return self.user_profiles.get(user_id)
-
-    async def get_company_profile(self, company_id: str) -> Dict[str, Any] | None:
-        """Simulates fetching company profile data."""
-        if not self.company_profiles:
-            self.company_profiles["comp456"] = {"company_id": "comp456", "sector": "Technology", "stage": "Growth", "strategic_goals": ["Expand market share", "Improve customer retention"]}
-            self.company_profiles["comp001"] = {"company_id": "comp001", "sector": "Manufacturing", "stage": "Mature", "strategic_goals": ["Optimize production costs", "Explore new product lines"]}
-        return self.company_profiles.get(company_id)
-
-    async def get_interaction_history(self, user_id: str, company_id: str, limit: int = 3) -> List[Dict[str, str]]:
-        """Simulates fetching recent interaction history for a user within a company context."""
-        # Key could be a composite of user_id and company_id
-        history_key = f"{user_id}_{company_id}"
-        return self.user_interaction_history.get(history_key, [])[-limit:]
-
-    async def add_interaction_to_history(self, user_id: str, company_id: str, user_message: str, assistant_message: str):
-        """Simulates adding a new interaction to the history."""
-        history_key = f"{user_id}_{company_id}"
-        if history_key not in self.user_interaction_history:
-            self.user_interaction_history[history_key] = []
-        self.user_interaction_history[history_key].append({"role": "user", "content": user_message})
-        self.user_interaction_history[history_key].append({"role": "assistant", "content": assistant_message})
-        # Prune history if it gets too long (optional)
-        # self.user_interaction_history[history_key] = self.user_interaction_history[history_key][-MAX_HISTORY_LENGTH:]
-
-    async def collect_full_context(
-        self, 
-        user_id: str, 
-        company_id: str, 
-        module_accessed: str | None = None, 
-        current_interaction_data: Dict[str, Any] | None = None
-    ) -> Dict[str, Any]:
-        """Collects and aggregates context using other methods of this class."""
-        user_profile_data = await self.get_user_profile(user_id)
-        company_profile_data = await self.get_company_profile(company_id)
-        interaction_history_data = await self.get_interaction_history(user_id, company_id)
-
-        if not user_profile_data:
-            # Handle case where user profile is not found, maybe use defaults or raise error
-            user_profile_data = {"user_id": user_id, "role": "Unknown", "department": "Unknown"}
-        if not company_profile_data:
-            # Handle case where company profile is not found
-            company_profile_data = {"company_id": company_id, "sector": "Unknown", "stage": "Unknown", "strategic_goals": []}
-
-        return {
-            "user_profile": user_profile_data,
-            "company_profile": company_profile_data,
-            "module_accessed": module_accessed,
-            "current_interaction_data": current_interaction_data or {},
-            "interaction_history": interaction_history_data
-        }
+from .context_store import ContextManager
+from .sharding import build_context_manager_from_env
 
 # Global instance (or use dependency injection in FastAPI)
-context_manager = ContextManager()
-
+# With CONTEXT_SHARD_SOCKETS set this is a ShardedContextManager shared by all worker processes.
+context_manager = build_context_manager_from_env()
@@ -0,0 +1,106 @@
+# In-process store of profiles and interaction history (the ContextManager class)
+# Kept apart from context_manager.py so sharding.py can build on it without an import cycle.
+from typing import Dict, Any, List
+
+from .records import CompanyProfile, Message, Role, UserProfile, decode_messages, encode_messages
+
+# This would interact with a database or session storage in a real application
+class ContextManager:
+    def __init__(self):
+        # In-memory storage for simplicity. Replace with DB interaction.
+        # Compact records (see records.py): readers still get plain dicts / read-only mappings
+        self.user_interaction_history: Dict[str, List[Message]] = {}
+        self.user_profiles: Dict[str, UserProfile] = {}
+        self.company_profiles: Dict[str, CompanyProfile] = {}
+
+    async def get_user_profile(self, user_id: str) -> Dict[str, Any] | None:
+        """Simulates fetching user profile data."""
+        # Pre-populate with some data for testing, or allow dynamic addition
+        if not self.user_profiles:
+            self.user_profiles["user123"] = UserProfile(user_id="user123", role="Manager", department="Sales")
+            self.user_profiles["user789"] = UserProfile(user_id="user789", role="Legal Counsel", department="Legal")
+        return self.user_profiles.get(user_id)
+
+    async def get_company_profile(self, company_id: str) -> Dict[str, Any] | None:
+        """Simulates fetching company profile data."""
+        if not self.company_profiles:
+            self.company_profiles["comp456"] = CompanyProfile(company_id="comp456", sector="Technology", stage="Growth", strategic_goals=["Expand market share", "Improve customer retention"])
+            self.company_profiles["comp001"] = CompanyProfile(company_id="comp001", sector="Manufacturing", stage="Mature", strategic_goals=["Optimize production costs", "Explore new product lines"])
+        return self.company_profiles.get(company_id)
+
+    async def update_user_profile(self, user_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Stores a user profile and bumps its version so precomputed agent context is rebuilt."""
+        previous = await self.get_user_profile(user_id) or {}
+        updated = UserProfile(**{**profile, "user_id": user_id, "version": previous.get("version", 0) + 1})
+        self.user_profiles[user_id] = updated
+        return updated
+
+    async def update_company_profile(self, company_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Stores a company profile and bumps its version so precomputed agent context is rebuilt."""
+        previous = await self.get_company_profile(company_id) or {}
+        updated = CompanyProfile(**{**profile, "company_id": company_id, "version": previous.get("version", 0) + 1})
+        self.company_profiles[company_id] = updated
+        return updated
+
+    async def get_interaction_history(self, user_id: str, company_id: str, limit: int = 3) -> List[Dict[str, str]]:
+        """Simulates fetching recent interaction history for a user within a company context."""
+        # Key could be a composite of user_id and company_id
+        history_key = f"{user_id}_{company_id}"
+        return [message.to_dict() for message in self.user_interaction_history.get(history_key, [])[-limit:]]
+
+    async def get_history_records(self, user_id: str, company_id: str, limit: int = 3) -> List[Message]:
+        """Same as get_interaction_history, as Message records (sent as is over the shard transport)."""
+        return self.user_interaction_history.get(f"{user_id}_{company_id}", [])[-limit:]
+
+    async def add_interaction_to_history(self, user_id: str, company_id: str, user_message: str, assistant_message: str):
+        """Simulates adding a new interaction to the history."""
+        history_key = f"{user_id}_{company_id}"
+        if history_key not in self.user_interaction_history:
+            self.user_interaction_history[history_key] = []
+        self.user_interaction_history[history_key].append(Message(Role.USER, user_message))
+        self.user_interaction_history[history_key].append(Message(Role.ASSISTANT, assistant_message))
+        # Prune history if it gets too long (optional)
+        # self.user_interaction_history[history_key] = self.user_interaction_history[history_key][-MAX_HISTORY_LENGTH:]
+
+    async def export_history(self, user_id: str, company_id: str) -> bytes:
+        """Full history of a conversation in the compact binary format (for persistence or moving it elsewhere)."""
+        return encode_messages(self.user_interaction_history.get(f"{user_id}_{company_id}", []))
+
+    async def import_history(self, user_id: str, company_id: str, data: bytes):
+        """Replaces the history of a conversation with one produced by export_history."""
+        self.user_interaction_history[f"{user_id}_{company_id}"] = decode_messages(data)
+
+    async def clear_history(self, user_id: str, company_id: str):
+        """Forgets the history of a conversation. Goes through import_history, so it reaches the right shard when sharded."""
+        await self.import_history(user_id, company_id, encode_messages([]))
+
+    async def collect_full_context(
+        self, 
+        user_id: str, 
+        company_id: str, 
+        module_accessed: str | None = None, 
+        current_interaction_data: Dict[str, Any] | None = None,
+        include_history: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Collects and aggregates context using other methods of this class.
+        include_history=False skips the history fetch, for callers that already hold it (conversation sessions).
+        """
+        user_profile_data = await self.get_user_profile(user_id)
+        company_profile_data = await self.get_company_profile(company_id)
+        interaction_history_data = await self.get_interaction_history(user_id, company_id) if include_history else []
+
+        if not user_profile_data:
+            # Handle case where user profile is not found, maybe use defaults or raise error
+            user_profile_data = {"user_id": user_id, "role": "Unknown", "department": "Unknown"}
+        if not company_profile_data:
+            # Handle case where company profile is not found
+            company_profile_data = {"company_id": company_id, "sector": "Unknown", "stage": "Unknown", "strategic_goals": []}
+
+        return {
+            "user_profile": user_profile_data,
+            "company_profile": company_profile_data,
+            "module_accessed": module_accessed,
+            "current_interaction_data": current_interaction_data or {},
+            "interaction_history": interaction_history_data
+        }
@@ -0,0 +1,196 @@
+# Map-reduce over documents attached to a request, so documents larger than the model context can be used
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..agents.base_agent import BaseAgent
+
+DEFAULT_CHUNK_CHARS = 12000 # About 3k tokens per chunk, leaves room for the prompt and the answer
+DEFAULT_CHUNK_OVERLAP = 200 # Characters repeated between chunks so sentences cut at a boundary keep their context
+DEFAULT_CONCURRENCY = 4 # Chunk calls in flight at once for one request
+NOTHING_RELEVANT = "NOTHING RELEVANT"
+
+# Progress events are plain dicts, e.g. {"stage": "map", "event": "chunk_done", "completed": 3, "total": 10}
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+
+def chunk_settings() -> Tuple[int, int, int]:
+    """(chunk size, overlap, concurrency) from NOWGO_DOCUMENT_CHUNK_CHARS, NOWGO_DOCUMENT_CHUNK_OVERLAP and NOWGO_DOCUMENT_CONCURRENCY."""
+    return (
+        int(os.getenv("NOWGO_DOCUMENT_CHUNK_CHARS", DEFAULT_CHUNK_CHARS)),
+        int(os.getenv("NOWGO_DOCUMENT_CHUNK_OVERLAP", DEFAULT_CHUNK_OVERLAP)),
+        int(os.getenv("NOWGO_DOCUMENT_CONCURRENCY", DEFAULT_CONCURRENCY)),
+    )
+
+
+def extract_documents(current_interaction_data: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """
+    Documents attached to a request, as (name, text) pairs. Accepted shapes:
+    {"document": "text", "document_name": "contract.pdf"} or {"documents": [{"name": ..., "content": ...}, "plain text", ...]}.
+    """
+    if not current_interaction_data:
+        return []
+    documents = []
+    if isinstance(current_interaction_data.get("document"), str):
+        documents.append((current_interaction_data.get("document_name") or "document", current_interaction_data["document"]))
+    for i, item in enumerate(current_interaction_data.get("documents") or [], start=1):
+        if isinstance(item, str):
+            documents.append((f"document {i}", item))
+        elif isinstance(item, dict) and isinstance(item.get("content"), str):
+            documents.append((item.get("name") or f"document {i}", item["content"]))
+    return [(name, text) for name, text in documents if text.strip()]
+
+
+def chunk_text(text: str, chunk_chars: int = DEFAULT_CHUNK_CHARS, overlap: int = DEFAULT_CHUNK_OVERLAP) -> List[str]:
+    """Splits text into chunks of at most chunk_chars, preferably at a paragraph, line or sentence boundary."""
+    if chunk_chars <= 0:
+        raise ValueError("chunk_chars must be positive")
+    overlap = min(overlap, chunk_chars // 4)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            # Cut at the last natural boundary in the final fifth of the window, if there is one
+            window_start = start + (chunk_chars * 4) // 5
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, window_start, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunks.append(text[start:end])
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def _map_prompt(user_prompt: str, name: str, chunk: str, part: int, parts: int) -> str:
+    return (
+        f"You are reading part {part} of {parts} of the document '{name}'.\n\n"
+        f"--- Document part ---\n{chunk}\n--- End of document part ---\n\n"
+        "Using only this part, write concise notes on everything relevant to the request below, "
+        f"quoting key figures and clauses. If nothing in this part is relevant, answer exactly '{NOTHING_RELEVANT}'.\n\n"
+        f"Request: {user_prompt}"
+    )
+
+
+def _reduce_prompt(user_prompt: str, notes: List[str], final: bool) -> str:
+    if notes:
+        body = "\n\n".join(f"Notes {i}:\n{note}" for i, note in enumerate(notes, start=1))
+    else:
+        body = "(No part of the documents was relevant to the request.)"
+    task = (
+        "Combine these notes into a single answer to the request below. Resolve overlaps and contradictions between notes."
+        if final else
+        "Merge these notes into one set of concise notes for the request below, keeping every relevant fact."
+    )
+    return f"The attached documents were analysed in parts. Notes taken on each part:\n\n{body}\n\n{task}\n\nRequest: {user_prompt}"
+
+
+def _direct_prompt(user_prompt: str, documents: List[Tuple[str, str]]) -> str:
+    attached = "\n\n".join(f"--- Attached document '{name}' ---\n{text}\n--- End of '{name}' ---" for name, text in documents)
+    return f"{attached}\n\n{user_prompt}"
+
+
+async def _run_all(calls: List[Awaitable[Any]]) -> List[Any]:
+    """
+    Like asyncio.gather, but if one call raises (quota exceeded, deadline passed) the calls still in flight are
+    cancelled instead of spending tokens on an answer that will be thrown away. The first error is raised as is.
+    """
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(call) for call in calls]
+    except BaseExceptionGroup as errors:
+        raise errors.exceptions[0] from None
+    return [task.result() for task in tasks]
+
+
+def _group_notes(notes: List[str], budget: int) -> List[List[str]]:
+    """Groups consecutive notes so each group fits in one reduce call."""
+    groups: List[List[str]] = [[]]
+    size = 0
+    for note in notes:
+        if groups[-1] and size + len(note) > budget:
+            groups.append([])
+            size = 0
+        groups[-1].append(note)
+        size += len(note)
+    return groups
+
+
+async def answer_with_documents(
+    agent: BaseAgent,
+    user_prompt: str,
+    documents: List[Tuple[str, str]],
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    context_data: Optional[Dict[str, Any]] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    chunk_chars: Optional[int] = None,
+    overlap: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> str | None:
+    """
+    Answers user_prompt about the attached documents.
+    Documents that fit in one chunk are sent inline in a single call. Larger ones are split into chunks,
+    each chunk is summarised for the request (map, at most `concurrency` calls at once), and the notes are
+    merged (reduce, in several rounds if they don't fit in one call). Returns None if every chunk call failed.
+    """
+    default_chunk_chars, default_overlap, default_concurrency = chunk_settings()
+    chunk_chars = chunk_chars or default_chunk_chars
+    overlap = default_overlap if overlap is None else overlap
+    concurrency = concurrency or default_concurrency
+
+    def report(event: Dict[str, Any]):
+        if on_progress is not None:
+            on_progress(event)
+
+    chunks = []
+    for name, text in documents:
+        parts = chunk_text(text, chunk_chars, overlap)
+        chunks.extend((name, chunk, part, len(parts)) for part, chunk in enumerate(parts, start=1))
+    report({"stage": "map", "event": "started", "documents": len(documents), "chunks": len(chunks)})
+
+    if len(chunks) <= 1:
+        response = await agent.generate_response(_direct_prompt(user_prompt, documents), conversation_history, context_data)
+        report({"stage": "map", "event": "chunk_done", "completed": 1, "total": 1, "ok": response is not None})
+        return response
+
+    semaphore = asyncio.Semaphore(concurrency)
+    completed = 0
+
+    async def map_chunk(name: str, chunk: str, part: int, parts: int) -> str | None:
+        nonlocal completed
+        async with semaphore:
+            notes = await agent.generate_response(_map_prompt(user_prompt, name, chunk, part, parts), None, context_data)
+        completed += 1
+        report({"stage": "map", "event": "chunk_done", "completed": completed, "total": len(chunks), "ok": notes is not None})
+        return notes
+
+    results = await _run_all([map_chunk(*chunk) for chunk in chunks])
+    if all(notes is None for notes in results):
+        return None
+    notes = [n for n in results if n is not None and n.strip().upper() != NOTHING_RELEVANT]
+
+    # Reduce until the notes fit in one call; the last call also sees the conversation history
+    round_number = 0
+    while True:
+        round_number += 1
+        groups = _group_notes(notes, chunk_chars)
+        report({"stage": "reduce", "event": "started", "round": round_number, "notes": len(notes), "calls": len(groups)})
+        if len(groups) == 1 or len(groups) == len(notes):
+            # Everything fits, or notes are too long to pair up and merging would not shrink them
+            return await agent.generate_response(_reduce_prompt(user_prompt, notes, final=True), conversation_history, context_data)
+
+        async def reduce_group(group: List[str]) -> str | None:
+            async with semaphore:
+                return await agent.generate_response(_reduce_prompt(user_prompt, group, final=False), None, context_data)
+
+        merged = await _run_all([reduce_group(group) for group in groups])
+        # A failed merge keeps its input notes, so nothing is lost; the loop still shrinks because the other groups merged
+        next_notes: List[str] = []
+        for group, result in zip(groups, merged):
+            next_notes.extend([result] if result is not None else group)
+        if len(next_notes) >= len(notes):
+            return None # No merge succeeded, the backend is failing
+        notes = next_notes
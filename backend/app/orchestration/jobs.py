@@ -0,0 +1,345 @@
+# Offline job queue: long-running requests (document analysis, reports) run by a local worker pool
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..core.deadline import deadline_scope
+from ..core.usage import QuotaExceededError
+from .orchestrator import handle_user_request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_JOB_DB = os.path.join(BACKEND_DIR, "data", "jobs.sqlite3")
+DEFAULT_WORKERS = 2 # Jobs run at the same time; kept low so they don't compete with interactive requests
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 5.0 # Seconds before the first retry, doubled after each failed attempt
+DEFAULT_JOB_TIMEOUT = 300.0 # Seconds per attempt
+DEFAULT_RESULT_TTL = 24 * 3600.0 # Seconds a finished job and its result are kept
+DEFAULT_POLL_INTERVAL = 1.0 # Seconds between queue checks when idle (submissions wake the workers right away)
+MAINTENANCE_INTERVAL = 60.0 # Seconds between purges of expired jobs and requeues of abandoned ones
+DEFAULT_ERROR_BACKOFF = 1.0 # Seconds a worker waits after a job store error, doubled up to MAINTENANCE_INTERVAL
+MAX_ATTEMPTS_LIMIT = 10 # Highest max_attempts a submitted job may ask for
+MAX_RETRY_DELAY = MAINTENANCE_INTERVAL * 10 # Cap on the doubled retry delay, so retries stay well within the result TTL
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler for failures that retrying cannot fix."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_after REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, run_after, created_at);
+"""
+
+
+class JobStore:
+    """
+    Persistent job queue in a local SQLite file, so queued jobs survive restarts.
+    Claiming a job is a single write transaction, so several worker processes can share the same file.
+    Methods are blocking; JobQueue calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_JOB_DB, result_ttl: float = DEFAULT_RESULT_TTL):
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self._schema_ready = False # The file is created on first use, not when the app is imported
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None) # Transactions are explicit
+        connection.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            connection.executescript(_SCHEMA)
+            self._schema_ready = True
+        return connection
+
+    def enqueue(self, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, status, payload, max_attempts, created_at, updated_at, run_after) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, JobStatus.QUEUED.value, json.dumps(payload), max_attempts, now, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job with its payload and result, or None if unknown or expired."""
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or (row["expires_at"] is not None and row["expires_at"] <= time.time()):
+            return None
+        return _row_to_job(row)
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Marks the oldest due job as running and returns it, or returns None if nothing is due."""
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE") # Takes the write lock, so two workers never claim the same job
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE status = ? AND run_after <= ? ORDER BY created_at LIMIT 1",
+                (JobStatus.QUEUED.value, now),
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (JobStatus.RUNNING.value, now, row["id"]),
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return self.get(row["id"])
+
+    def complete(self, job_id: str, result: str):
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ?, expires_at = ? WHERE id = ?",
+                (JobStatus.SUCCEEDED.value, result, now, now + self.result_ttl, job_id),
+            )
+
+    def fail(self, job_id: str, error: str, retry_delay: Optional[float] = None) -> JobStatus:
+        """
+        Records a failed attempt. The job is queued again after `retry_delay` seconds if it has attempts left,
+        otherwise (or when retry_delay is None) it is marked failed. Returns the new status.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return JobStatus.FAILED
+            if retry_delay is not None and row["attempts"] < row["max_attempts"]:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?, run_after = ? WHERE id = ?",
+                    (JobStatus.QUEUED.value, error, now, now + retry_delay, job_id),
+                )
+                return JobStatus.QUEUED
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, expires_at = ? WHERE id = ?",
+                (JobStatus.FAILED.value, error, now, now + self.result_ttl, job_id),
+            )
+            return JobStatus.FAILED
+
+    def requeue_stale(self, older_than: float) -> Tuple[int, int]:
+        """
+        Puts jobs that have been running for more than `older_than` seconds back in the queue, or marks them failed
+        if they have no attempts left (a job that crashes the process must not be retried forever).
+        Any live attempt ends within the job timeout, so these were left behind by a process that stopped or crashed.
+        Returns (requeued, failed).
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            failed = connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, expires_at = ? "
+                "WHERE status = ? AND updated_at <= ? AND attempts >= max_attempts",
+                (JobStatus.FAILED.value, "The job was abandoned by a stopped worker on its last attempt.",
+                 now, now + self.result_ttl, JobStatus.RUNNING.value, now - older_than),
+            ).rowcount
+            requeued = connection.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at <= ?",
+                (JobStatus.QUEUED.value, now, JobStatus.RUNNING.value, now - older_than),
+            ).rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+        return requeued, failed
+
+    def purge_expired(self) -> int:
+        with closing(self._connect()) as connection:
+            cursor = connection.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status.value: 0 for status in JobStatus} | {row[0]: row[1] for row in rows}
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "job_id": row["id"],
+        "status": row["status"],
+        "payload": json.loads(row["payload"]),
+        "result": row["result"],
+        "error": row["error"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "expires_at": row["expires_at"],
+    }
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[str | None]]
+
+
+async def run_chat_job(payload: Dict[str, Any]) -> str | None:
+    """Default job handler: runs the payload through the regular handle_user_request pipeline."""
+    try:
+        return await handle_user_request(
+            user_id=payload["user_id"],
+            company_id=payload["company_id"],
+            user_prompt=payload["prompt"],
+            module_accessed=payload.get("module_accessed"),
+            current_interaction_data=payload.get("current_interaction_data"),
+        )
+    except QuotaExceededError as e:
+        raise PermanentJobError(str(e)) from e
+
+
+class JobQueue:
+    """
+    Worker pool over a JobStore. At most `workers` jobs run at the same time in this process,
+    each attempt under its own deadline. Failed attempts are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: JobHandler = run_chat_job,
+        workers: int = DEFAULT_WORKERS,
+        job_timeout: float = DEFAULT_JOB_TIMEOUT,
+        retry_delay: float = DEFAULT_RETRY_DELAY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        error_backoff: float = DEFAULT_ERROR_BACKOFF,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.error_backoff = error_backoff
+        self._tasks: List[asyncio.Task] = []
+        self._wake_up: Optional[asyncio.Event] = None
+
+    async def submit(self, payload: Dict[str, Any], max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict[str, Any]:
+        job = await asyncio.to_thread(self.store.enqueue, payload, max_attempts)
+        if self._wake_up is not None:
+            self._wake_up.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wake_up = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs interrupted here stay "running" until maintenance() requeues them
+
+    async def maintenance(self):
+        """Deletes expired jobs and requeues jobs abandoned by a stopped process."""
+        await asyncio.to_thread(self.store.purge_expired)
+        requeued, failed = await asyncio.to_thread(self.store.requeue_stale, self.job_timeout + MAINTENANCE_INTERVAL)
+        if requeued or failed:
+            print(f"Job queue: requeued {requeued} abandoned jobs, failed {failed} with no attempts left.")
+
+    async def _worker(self, index: int):
+        last_maintenance = None
+        backoff = self.error_backoff
+        while True:
+            if index == 0 and (last_maintenance is None or time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL):
+                last_maintenance = time.monotonic() # A failed pass waits for the next interval rather than blocking claims
+                try:
+                    await self.maintenance()
+                except Exception as e:
+                    print(f"Job queue: maintenance failed ({e}).")
+            try:
+                job = await asyncio.to_thread(self.store.claim_next)
+                if job is not None:
+                    await self.run_job(job)
+            except Exception as e:
+                # A locked or full database must not kill the worker, or queued jobs would never run
+                print(f"Job queue worker {index}: job store error ({e}), retrying in {backoff:.1f}s.")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAINTENANCE_INTERVAL)
+                continue
+            backoff = self.error_backoff
+            if job is None:
+                self._wake_up.clear()
+                try:
+                    await asyncio.wait_for(self._wake_up.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_job(self, job: Dict[str, Any]):
+        """Runs one attempt of a claimed job and records its outcome."""
+        error: str
+        retry_delay: Optional[float] = min(self.retry_delay * 2 ** (job["attempts"] - 1), MAX_RETRY_DELAY)
+        try:
+            with deadline_scope(self.job_timeout):
+                result = await asyncio.wait_for(self.handler(job["payload"]), self.job_timeout)
+            if result is not None:
+                await asyncio.to_thread(self.store.complete, job["job_id"], result)
+                return
+            error = "The assistant returned no response."
+        except asyncio.TimeoutError:
+            error = f"Attempt timed out after {self.job_timeout:.0f}s."
+        except PermanentJobError as e:
+            error, retry_delay = str(e), None
+        except Exception as e:
+            error = f"Unexpected error: {e}"
+        status = await asyncio.to_thread(self.store.fail, job["job_id"], error, retry_delay)
+        print(f"Job {job['job_id']} attempt {job['attempts']} failed ({error}), job is now {status.value}.")
+
+
+def build_job_queue_from_env() -> JobQueue:
+    """Job queue configured from NOWGO_JOB_DB, NOWGO_JOB_WORKERS, NOWGO_JOB_TIMEOUT, NOWGO_JOB_RETRY_DELAY and NOWGO_JOB_RESULT_TTL."""
+    store = JobStore(
+        db_path=os.getenv("NOWGO_JOB_DB", DEFAULT_JOB_DB),
+        result_ttl=float(os.getenv("NOWGO_JOB_RESULT_TTL", DEFAULT_RESULT_TTL)),
+    )
+    return JobQueue(
+        store,
+        workers=int(os.getenv("NOWGO_JOB_WORKERS", DEFAULT_WORKERS)),
+        job_timeout=float(os.getenv("NOWGO_JOB_TIMEOUT", DEFAULT_JOB_TIMEOUT)),
+        retry_delay=float(os.getenv("NOWGO_JOB_RETRY_DELAY", DEFAULT_RETRY_DELAY)),
+    )
+
+job_queue = build_job_queue_from_env()
@@ -1,9 +1,17 @@
 # Placeholder for orchestration logic
-from typing import Dict, Any, Optional
+import os
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, Union
 
-from ..agents.personas import AgentPersona
-from ..agents.base_agent import BaseAgent # Import BaseAgent
+from ..agents.personas import AgentPersona, PersonaSpec
+from ..agents.base_agent import RenderedAgentContext
+from ..agents.registry import agent_registry # Shared agents, one per persona
+from ..core.tracing import annotate, trace_stage
+from ..core.usage import usage_accountant, usage_scope
+from .documents import ProgressCallback, answer_with_documents, extract_documents
+from .speculative import rank_candidate_personas, run_speculative_personas, speculative_personas_enabled, DEFAULT_TOP_K
 from .context_manager import context_manager # Import the global context_manager instance
+from .sessions import ConversationSession
 
 # Placeholder for user/company data models - these would likely come from a database or another service
 # These are already defined in the previous version, assuming they are sufficient for now.
@@ -13,13 +21,18 @@ from .context_manager import context_manager # Import the global context_manager
 # are assumed to be part of this module or context_manager as appropriate.
 # For simplicity, let's assume context_manager.collect_full_context is the primary way to get all context.
 
-async def select_persona_from_context(context: Dict[str, Any]) -> AgentPersona:
+DEFAULT_PERSONA = AgentPersona.STRATEGY_CONSULTANT
+
+async def select_persona_from_context(context: Dict[str, Any]) -> Union[AgentPersona, PersonaSpec]:
     """
     Selects an appropriate AgentPersona based on the collected context.
     This is a placeholder for a more sophisticated selection logic.
     """
     print(f"Orchestrator: Selecting persona based on context: {context.get('module_accessed')}, user role: {context.get('user_profile', {}).get('role')}")
-    
+    return match_persona_from_context(context) or DEFAULT_PERSONA # Fallback default
+
+def match_persona_from_context(context: Dict[str, Any]) -> Union[AgentPersona, PersonaSpec, None]:
+    """Returns the persona matched by module or user role, or None when selection has to fall back to the default."""
     module = str(context.get("module_accessed", "")).lower()
     user_role = str(context.get("user_profile", {}).get("role", "")).lower()
 
@@ -31,18 +44,65 @@ async def select_persona_from_context(context: Dict[str, Any]) -> AgentPersona:
         return AgentPersona.DATA_ANALYST
     elif "content" in module or "marketing" in module or "redacao" in module:
         return AgentPersona.GROWTH_WRITER
+
+    # Personas registered from config declare the modules they serve
+    configured_persona = agent_registry.match_module(module)
+    if configured_persona is not None:
+        return configured_persona
     
     if "manager" in user_role or "director" in user_role:
         return AgentPersona.STRATEGY_CONSULTANT
         
-    return AgentPersona.STRATEGY_CONSULTANT # Fallback default
+    return None
 
-async def prepare_context_for_agent(full_context: Dict[str, Any]) -> Dict[str, Any]:
+class AgentContextCache:
     """
-    Formats the collected context into a dictionary suitable for the BaseAgent.
+    Keeps the prepared and pre-rendered agent context per (user, company, module).
+    An entry is rebuilt only when the user or company profile version changes, so the
+    string work in building and formatting the context is not repeated on every request.
+    Profiles without a version (never updated through ContextManager.update_*_profile)
+    are only reused while the very same profile objects are returned.
     """
-    print("Orchestrator: Preparing context data for agent.")
-    
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Any, Any, Any], Tuple[Any, RenderedAgentContext]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, full_context: Dict[str, Any]) -> RenderedAgentContext:
+        user_profile = full_context.get("user_profile", {})
+        company_profile = full_context.get("company_profile", {})
+        key = (user_profile.get("user_id"), company_profile.get("company_id"), full_context.get("module_accessed"))
+        version = (user_profile.get("version", 0), company_profile.get("version", 0))
+
+        cached = self._entries.get(key)
+        if cached is not None:
+            sources, entry = cached
+            if entry.version == version and (all(version) or (sources[0] is user_profile and sources[1] is company_profile)):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+
+        self.misses += 1
+        entry = RenderedAgentContext(build_agent_context(full_context), version=version)
+        if key[0] is None or key[1] is None:
+            return entry # Can't be identified reliably, don't cache
+        self._entries[key] = ((user_profile, company_profile), entry)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False) # Evict least recently used
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+agent_context_cache = AgentContextCache()
+
+def build_agent_context(full_context: Dict[str, Any]) -> Dict[str, Any]:
+    """Builds the agent context dictionary from the collected context, without caching."""
     agent_context = {
         "user_role": full_context.get("user_profile", {}).get("role"),
         "user_department": full_context.get("user_profile", {}).get("department"),
@@ -53,51 +113,108 @@ async def prepare_context_for_agent(full_context: Dict[str, Any]) -> Dict[str, A
     }
     return {k: v for k, v in agent_context.items() if v is not None}
 
+async def prepare_context_for_agent(full_context: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Formats the collected context into a dictionary suitable for the BaseAgent.
+    The result is cached per profile version and carries its pre-rendered prompt block.
+    """
+    print("Orchestrator: Preparing context data for agent.")
+    return agent_context_cache.get_or_build(full_context)
+
 # --- Main Orchestration Flow --- # 
 async def handle_user_request(
     user_id: str, 
     company_id: str, 
     user_prompt: str, 
     module_accessed: str | None = None, 
-    current_interaction_data: Dict[str, Any] | None = None
+    current_interaction_data: Dict[str, Any] | None = None,
+    on_progress: Optional[ProgressCallback] = None,
+    session: Optional[ConversationSession] = None
 ) -> str | None:
-    """Orchestrates an agent response based on user request and context."""
+    """
+    Orchestrates an agent response based on user request and context.
+    Documents attached in current_interaction_data are processed with map-reduce (see documents.py),
+    reporting progress events to `on_progress`.
+    With a conversation session (see sessions.py) the history comes from the session instead of
+    being fetched from the ContextManager, and the new turn is appended to it.
+    Raises QuotaExceededError (core/usage.py) when the company has used up its token quota.
+    """
+
+    # 0. Refuse before doing any work if the company is over its token quota
+    await usage_accountant.check_quota_async(company_id)
     
     # 1. Collect full context using ContextManager
-    full_context = await context_manager.collect_full_context(
-        user_id=user_id, 
-        company_id=company_id, 
-        module_accessed=module_accessed, 
-        current_interaction_data=current_interaction_data
-    )
+    with trace_stage("collect_context"):
+        if session is None:
+            full_context = await context_manager.collect_full_context(
+                user_id=user_id, 
+                company_id=company_id, 
+                module_accessed=module_accessed, 
+                current_interaction_data=current_interaction_data
+            )
+        else:
+            full_context = await context_manager.collect_full_context(
+                user_id=user_id,
+                company_id=company_id,
+                module_accessed=module_accessed,
+                current_interaction_data=current_interaction_data,
+                include_history=False
+            )
+            full_context["interaction_history"] = session.history
     
     # 2. Select Persona
-    selected_persona_enum = await select_persona_from_context(full_context)
+    with trace_stage("select_persona"):
+        selected_persona_enum = await select_persona_from_context(full_context)
     
     # 3. Prepare context specifically for the agent
-    agent_specific_context = await prepare_context_for_agent(full_context)
+    with trace_stage("prepare_context"):
+        agent_specific_context = await prepare_context_for_agent(full_context)
     
-    # 4. Instantiate the agent
-    # Here you could have a factory or registry if you have specialized agent classes
-    # e.g., StrategicAgent(BaseAgent), LegalAgent(BaseAgent)
-    # For now, BaseAgent is used directly with the selected persona.
-    agent = BaseAgent(persona=selected_persona_enum)
+    # 4./5. Get response from the shared agent for the persona
+    # The registry builds one agent per persona (BaseAgent or a registered specialized subclass)
+    # LLM usage inside is billed to this company and user (and to the persona, by the agent)
+    documents = extract_documents(current_interaction_data)
+    with usage_scope(company_id=company_id, user_id=user_id), trace_stage("llm"):
+        if documents:
+            # Attached documents can exceed the model context: chunk them, analyse the chunks concurrently, merge the notes
+            response = await answer_with_documents(
+                agent_registry.get_agent(selected_persona_enum),
+                user_prompt=user_prompt,
+                documents=documents,
+                conversation_history=full_context.get("interaction_history"),
+                context_data=agent_specific_context,
+                on_progress=on_progress
+            )
+        elif speculative_personas_enabled() and match_persona_from_context(full_context) is None:
+            # Routing had no signal: race the most plausible personas and keep the best opening
+            candidates = rank_candidate_personas(user_prompt, agent_registry.list_personas(), k=int(os.getenv("NOWGO_SPECULATIVE_TOP_K", DEFAULT_TOP_K)))
+            selected_persona_enum, response = await run_speculative_personas(
+                candidates,
+                user_prompt=user_prompt,
+                conversation_history=full_context.get("interaction_history"),
+                context_data=agent_specific_context
+            )
+        else:
+            agent = agent_registry.get_agent(selected_persona_enum)
+            response = await agent.generate_response(
+                user_prompt=user_prompt,
+                conversation_history=full_context.get("interaction_history"),
+                context_data=agent_specific_context
+            )
     
-    # 5. Get response from agent
-    response = await agent.generate_response(
-        user_prompt=user_prompt,
-        conversation_history=full_context.get("interaction_history"),
-        context_data=agent_specific_context
-    )
+    annotate("persona", selected_persona_enum.name if selected_persona_enum is not None else None)
     
     # 6. Post-process response, log interaction, update history, etc.
-    if response:
-        await context_manager.add_interaction_to_history(
-            user_id=user_id, 
-            company_id=company_id, 
-            user_message=user_prompt, 
-            assistant_message=response
-        )
+    with trace_stage("post_process"):
+        if response and session is not None:
+            session.add_turn(user_prompt, response)
+        if response:
+            await context_manager.add_interaction_to_history(
+                user_id=user_id, 
+                company_id=company_id, 
+                user_message=user_prompt, 
+                assistant_message=response
+            )
     
     return response
 
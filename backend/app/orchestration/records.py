@@ -0,0 +1,165 @@
+# Compact in-memory types for conversation history and profiles, plus their binary serialization
+import struct
+import sys
+from collections.abc import Mapping
+from enum import IntEnum
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class Role(IntEnum):
+    SYSTEM = 0
+    USER = 1
+    ASSISTANT = 2
+
+# Interned role names, so every dict built from a Message shares the same string objects
+ROLE_NAMES: Tuple[str, ...] = tuple(sys.intern(role.name.lower()) for role in Role)
+_ROLES: Tuple[Role, ...] = tuple(Role)
+_ROLE_BY_NAME: Dict[str, Role] = dict(zip(ROLE_NAMES, _ROLES))
+_ROLE_KEY = sys.intern("role")
+_CONTENT_KEY = sys.intern("content")
+
+
+class Message:
+    """One history entry. Uses __slots__ and a small int role instead of a {"role": ..., "content": ...} dict."""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: Role, content: str):
+        self.role = role
+        self.content = content
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str]) -> "Message":
+        return cls(_ROLE_BY_NAME[data["role"]], data["content"])
+
+    def to_dict(self) -> Dict[str, str]:
+        """The {"role": ..., "content": ...} form expected by agents and the LLM API."""
+        return {_ROLE_KEY: ROLE_NAMES[self.role], _CONTENT_KEY: self.content}
+
+    def __getitem__(self, key: str) -> str:
+        # Lets code written for the dict form keep reading message["role"] / message["content"]
+        if key == "role":
+            return ROLE_NAMES[self.role]
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return self.role == other.role and self.content == other.content
+
+    def __repr__(self) -> str:
+        return f"Message({ROLE_NAMES[self.role]!r}, {self.content!r})"
+
+
+class _Profile(Mapping):
+    """
+    Base for compact profiles. Known fields live in slots, anything else in `extra`.
+    Behaves as a read-only mapping, so existing code using profile["sector"] / profile.get(...) keeps working.
+    """
+
+    __slots__ = ("version", "extra")
+    _fields: Tuple[str, ...] = ()
+    _interned_fields: Tuple[str, ...] = () # Low-cardinality values shared between profiles
+
+    def __init__(self, **values: Any):
+        extra = {}
+        for key, value in values.items():
+            if key in self._fields:
+                if key in self._interned_fields and isinstance(value, str):
+                    value = sys.intern(value)
+                object.__setattr__(self, key, value)
+            elif key != "version":
+                extra[key] = value
+        for key in self._fields:
+            if key not in values:
+                object.__setattr__(self, key, None)
+        self.version = values.get("version", 0)
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data: Mapping) -> "_Profile":
+        if isinstance(data, cls):
+            return data
+        return cls(**dict(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.items())
+
+    def _present_keys(self) -> List[str]:
+        keys = [key for key in self._fields if getattr(self, key) is not None]
+        if self.version:
+            keys.append("version")
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif key == "version" and self.version:
+            return self.version
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._present_keys())
+
+    def __len__(self) -> int:
+        return len(self._present_keys())
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class UserProfile(_Profile):
+    __slots__ = ("user_id", "role", "department")
+    _fields = ("user_id", "role", "department")
+    _interned_fields = ("role", "department")
+
+
+class CompanyProfile(_Profile):
+    __slots__ = ("company_id", "sector", "stage", "strategic_goals")
+    _fields = ("company_id", "sector", "stage", "strategic_goals")
+    _interned_fields = ("sector", "stage")
+
+
+# --- Binary serialization --- #
+# Magic, message count, then per message a 1-byte role, a 4-byte length and the UTF-8 content.
+
+_HISTORY_MAGIC = b"NGH1"
+_COUNT = struct.Struct("<I")
+_MESSAGE_HEADER = struct.Struct("<BI")
+
+
+def encode_messages(messages: Iterable[Message]) -> bytes:
+    parts = []
+    count = 0
+    for message in messages:
+        content = message.content.encode("utf-8")
+        parts.append(_MESSAGE_HEADER.pack(message.role, len(content)))
+        parts.append(content)
+        count += 1
+    return _HISTORY_MAGIC + _COUNT.pack(count) + b"".join(parts)
+
+
+def decode_messages(data: bytes) -> List[Message]:
+    if data[:4] != _HISTORY_MAGIC:
+        raise ValueError("Not an encoded message history")
+    (count,) = _COUNT.unpack_from(data, 4)
+    offset = 4 + _COUNT.size
+    unpack_header, header_size = _MESSAGE_HEADER.unpack_from, _MESSAGE_HEADER.size
+    messages = []
+    for _ in range(count):
+        role, length = unpack_header(data, offset)
+        offset += header_size
+        messages.append(Message(_ROLES[role], data[offset:offset + length].decode("utf-8")))
+        offset += length
+    if offset != len(data):
+        raise ValueError("Trailing bytes after encoded message history")
+    return messages
+
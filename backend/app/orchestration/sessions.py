@@ -0,0 +1,204 @@
+# Conversation sessions: the prompt history of an ongoing conversation, kept ready between turns
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..core.usage import estimate_tokens
+from .context_manager import context_manager
+
+DEFAULT_SESSION_TTL = 1800.0 # Seconds of inactivity before a session expires
+DEFAULT_MAX_SESSIONS = 10000 # Least recently used sessions are dropped beyond this
+DEFAULT_HISTORY_MESSAGES = 3 # Messages of history sent with each turn, the same window as without a session
+DEFAULT_HISTORY_TOKENS: Optional[int] = None # Optional token budget of that history
+
+
+class ConversationSession:
+    """
+    History of one conversation in the form sent to the LLM, with its running token count.
+    Each turn appends two messages and drops the oldest ones beyond the message window or the token budget,
+    instead of fetching and rebuilding the history on every request.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        user_id: str,
+        company_id: str,
+        max_history_messages: int = DEFAULT_HISTORY_MESSAGES,
+        max_history_tokens: Optional[int] = DEFAULT_HISTORY_TOKENS,
+    ):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.company_id = company_id
+        self.max_history_messages = max_history_messages
+        self.max_history_tokens = max_history_tokens
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.turns = 0
+        self.token_count = 0
+        self._messages: List[Dict[str, str]] = []
+        self._message_tokens: List[int] = []
+
+    @property
+    def history(self) -> List[Dict[str, str]]:
+        """Messages of the conversation within the window, oldest first. Don't modify the returned list."""
+        return self._messages
+
+    def extend(self, messages: List[Dict[str, str]]):
+        for message in messages:
+            tokens = estimate_tokens(message["content"])
+            self._messages.append({"role": message["role"], "content": message["content"]})
+            self._message_tokens.append(tokens)
+            self.token_count += tokens
+        # Drop whole messages from the front, but always keep the latest one
+        drop = max(len(self._messages) - self.max_history_messages, 0)
+        self.token_count -= sum(self._message_tokens[:drop])
+        if self.max_history_tokens is not None:
+            while self.token_count > self.max_history_tokens and drop < len(self._messages) - 1:
+                self.token_count -= self._message_tokens[drop]
+                drop += 1
+        if drop:
+            del self._messages[:drop]
+            del self._message_tokens[:drop]
+
+    def replace_history(self, messages: List[Dict[str, str]]):
+        self._messages.clear()
+        self._message_tokens.clear()
+        self.token_count = 0
+        self.extend(messages)
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        self.extend([{"role": "user", "content": user_message}, {"role": "assistant", "content": assistant_message}])
+        self.turns += 1
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "company_id": self.company_id,
+            "turns": self.turns,
+            "messages": len(self._messages),
+            "history_tokens": self.token_count,
+        }
+
+
+class SessionStore:
+    """
+    Live sessions of this process, by session id and by (user_id, company_id).
+    Sessions are in memory only: a session id unknown to this process (expired, another worker, restart)
+    starts a new session seeded from the ContextManager history, which stays the durable record.
+    With `shared_history` (the ContextManager is sharded and shared by several workers), other workers may have
+    added turns, so a resumed session is re-seeded from the ContextManager instead of trusting its local copy.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_SESSION_TTL,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_history_messages: int = DEFAULT_HISTORY_MESSAGES,
+        max_history_tokens: Optional[int] = DEFAULT_HISTORY_TOKENS,
+        shared_history: bool = False,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_history_messages = max_history_messages
+        self.max_history_tokens = max_history_tokens
+        self.shared_history = shared_history
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict() # Least recently used first
+        self._by_conversation: Dict[Tuple[str, str], str] = {}
+        self.created = 0
+        self.resumed = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_used > self.ttl:
+            self._remove(session)
+            return None
+        return session
+
+    async def get_or_create(self, user_id: str, company_id: str, session_id: Optional[str] = None) -> ConversationSession:
+        """
+        Resumes `session_id` if it is live and belongs to this user and company, else the live session of the
+        conversation, else starts a new one.
+        """
+        self._expire()
+        session = self.get(session_id) if session_id else None
+        if session is not None and (session.user_id, session.company_id) != (user_id, company_id):
+            session = None # Never hand a session to another user or company
+        if session is None:
+            existing_id = self._by_conversation.get((user_id, company_id))
+            session = self.get(existing_id) if existing_id else None
+        if session is None:
+            session = await self._create(user_id, company_id)
+        else:
+            self.resumed += 1
+            if self.shared_history:
+                session.replace_history(await self._seed(user_id, company_id))
+        session.last_used = time.monotonic()
+        self._sessions.move_to_end(session.session_id)
+        return session
+
+    def end(self, session_id: str) -> bool:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return False
+        self._remove(session)
+        return True
+
+    async def _create(self, user_id: str, company_id: str) -> ConversationSession:
+        session = ConversationSession(uuid.uuid4().hex, user_id, company_id, self.max_history_messages, self.max_history_tokens)
+        # Unless history is shared between workers, the only history fetch of the conversation while the session lives
+        session.extend(await self._seed(user_id, company_id))
+        previous_id = self._by_conversation.get((user_id, company_id))
+        if previous_id in self._sessions:
+            self._remove(self._sessions[previous_id])
+        self._sessions[session.session_id] = session
+        self._by_conversation[(user_id, company_id)] = session.session_id
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._remove(next(iter(self._sessions.values())))
+        return session
+
+    async def _seed(self, user_id: str, company_id: str) -> List[Dict[str, str]]:
+        return await context_manager.get_interaction_history(user_id, company_id, limit=self.max_history_messages)
+
+    def _remove(self, session: ConversationSession):
+        self._sessions.pop(session.session_id, None)
+        if self._by_conversation.get((session.user_id, session.company_id)) == session.session_id:
+            del self._by_conversation[(session.user_id, session.company_id)]
+
+    def _expire(self):
+        """Drops idle sessions. The dict is in least recently used order, so this stops at the first live one."""
+        now = time.monotonic()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl:
+                break
+            self._remove(oldest)
+
+    def stats(self) -> Dict[str, int]:
+        return {"active": len(self._sessions), "created": self.created, "resumed": self.resumed}
+
+
+def build_session_store_from_env() -> SessionStore:
+    """
+    Session store configured from NOWGO_SESSION_TTL, NOWGO_SESSION_MAX, NOWGO_SESSION_HISTORY_MESSAGES and
+    NOWGO_SESSION_HISTORY_TOKENS. History is treated as shared when CONTEXT_SHARD_SOCKETS is set (see sharding.py).
+    """
+    max_history_tokens = os.getenv("NOWGO_SESSION_HISTORY_TOKENS")
+    return SessionStore(
+        ttl=float(os.getenv("NOWGO_SESSION_TTL", DEFAULT_SESSION_TTL)),
+        max_sessions=int(os.getenv("NOWGO_SESSION_MAX", DEFAULT_MAX_SESSIONS)),
+        max_history_messages=int(os.getenv("NOWGO_SESSION_HISTORY_MESSAGES", DEFAULT_HISTORY_MESSAGES)),
+        max_history_tokens=int(max_history_tokens) if max_history_tokens else DEFAULT_HISTORY_TOKENS,
+        shared_history=bool(os.getenv("CONTEXT_SHARD_SOCKETS", "").strip()),
+    )
+
+session_store = build_session_store_from_env()
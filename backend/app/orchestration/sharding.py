@@ -0,0 +1,333 @@
+# Sharding layer for the ContextManager
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import struct
+from collections.abc import Mapping
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+from .context_store import ContextManager
+from .records import Message, Role, decode_messages, encode_messages
+
+# Number of points each shard gets on the hash ring. More points give a more even spread of keys.
+DEFAULT_VIRTUAL_NODES = 64
+
+# Operations a shard server is allowed to execute on behalf of a remote client.
+SHARD_OPERATIONS = (
+    "get_user_profile",
+    "get_company_profile",
+    "update_user_profile",
+    "update_company_profile",
+    "get_interaction_history",
+    "add_interaction_to_history",
+    "export_history",
+    "import_history",
+)
+
+# Wire format between RemoteContextShard and ContextShardServer. Each frame is a header with the lengths of its two
+# parts, a small JSON object (operation and scalar arguments, or result / error) and a binary payload.
+# Conversation history travels in the payload in the records.py binary format instead of as JSON.
+_FRAME_HEADER = struct.Struct("<II")
+
+
+def _encode_frame(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    body = json.dumps(header).encode("utf-8")
+    return _FRAME_HEADER.pack(len(body), len(payload)) + body + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[Tuple[Dict[str, Any], bytes]]:
+    """Next frame from the stream, or None if the peer closed the connection between frames."""
+    try:
+        prefix = await reader.readexactly(_FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ConnectionError("Connection closed in the middle of a frame")
+    body_size, payload_size = _FRAME_HEADER.unpack(prefix)
+    try:
+        data = await reader.readexactly(body_size + payload_size)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed in the middle of a frame")
+    return json.loads(data[:body_size]), data[body_size:]
+
+
+def _hash_key(key: str) -> int:
+    """Stable 64-bit hash of a key. Python's built-in hash() is salted per process, so it can't be used here."""
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+def conversation_shard_key(user_id: str, company_id: str) -> str:
+    """Key used to route a (company_id, user_id) conversation to its shard."""
+    return f"{company_id}:{user_id}"
+
+
+class ConsistentHashRing:
+    """Maps keys to shard names using consistent hashing, so adding a shard only moves a fraction of the keys."""
+
+    def __init__(self, shard_names: Sequence[str], virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        if not shard_names:
+            raise ValueError("ConsistentHashRing requires at least one shard")
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for name in shard_names:
+            self.add_shard(name)
+
+    def add_shard(self, name: str):
+        for i in range(self.virtual_nodes):
+            point = _hash_key(f"{name}#{i}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, name)
+
+    def remove_shard(self, name: str):
+        kept = [(p, o) for p, o in zip(self._points, self._owners) if o != name]
+        if not kept:
+            raise ValueError("Cannot remove the last shard from the ring")
+        self._points = [p for p, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def get_shard(self, key: str) -> str:
+        """Returns the name of the shard that owns the given key."""
+        index = bisect.bisect(self._points, _hash_key(key)) % len(self._points)
+        return self._owners[index]
+
+
+class RemoteContextShard:
+    """
+    Client for a ContextManager shard served over a Unix socket by ContextShardServer.
+    Exposes the same async methods as ContextManager, so it can be used wherever a shard is expected.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()  # One request in flight per connection keeps replies in order
+
+    async def _call(self, op: str, payload: bytes = b"", **kwargs) -> Tuple[Any, bytes]:
+        """Runs `op` on the shard. Returns the JSON result and the binary payload of the reply."""
+        async with self._lock:
+            if self._writer is None or self._writer.is_closing():
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+            try:
+                self._writer.write(_encode_frame({"op": op, "args": kwargs}, payload))
+                await self._writer.drain()
+                frame = await _read_frame(self._reader)
+            except BaseException:
+                # A broken connection, or a caller cancelled between the request and the reply: the late reply
+                # would be read by the next call, so the connection is dropped and the next call reconnects
+                self._writer.close()
+                self._writer = None
+                raise
+            if frame is None:
+                self._writer = None
+                raise ConnectionError(f"Context shard at {self.socket_path} closed the connection")
+        reply, reply_payload = frame
+        if "error" in reply:
+            raise RuntimeError(f"Context shard error ({op}): {reply['error']}")
+        return reply.get("result"), reply_payload
+
+    async def get_user_profile(self, user_id: str) -> Dict[str, Any] | None:
+        return (await self._call("get_user_profile", user_id=user_id))[0]
+
+    async def get_company_profile(self, company_id: str) -> Dict[str, Any] | None:
+        return (await self._call("get_company_profile", company_id=company_id))[0]
+
+    async def update_user_profile(self, user_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self._call("update_user_profile", user_id=user_id, profile=profile))[0]
+
+    async def update_company_profile(self, company_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self._call("update_company_profile", company_id=company_id, profile=profile))[0]
+
+    async def get_interaction_history(self, user_id: str, company_id: str, limit: int = 3) -> List[Dict[str, str]]:
+        _, payload = await self._call("get_interaction_history", user_id=user_id, company_id=company_id, limit=limit)
+        return [message.to_dict() for message in decode_messages(payload)]
+
+    async def add_interaction_to_history(self, user_id: str, company_id: str, user_message: str, assistant_message: str):
+        turn = encode_messages([Message(Role.USER, user_message), Message(Role.ASSISTANT, assistant_message)])
+        await self._call("add_interaction_to_history", turn, user_id=user_id, company_id=company_id)
+
+    async def export_history(self, user_id: str, company_id: str) -> bytes:
+        return (await self._call("export_history", user_id=user_id, company_id=company_id))[1]
+
+    async def import_history(self, user_id: str, company_id: str, data: bytes):
+        await self._call("import_history", data, user_id=user_id, company_id=company_id)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+
+class ContextShardServer:
+    """
+    Serves a single ContextManager over a Unix socket (frames described at _FRAME_HEADER).
+    Run one server per shard (e.g. one process per core) as a local stand-in for a shared context store.
+    """
+
+    def __init__(self, socket_path: str, manager: Optional[ContextManager] = None):
+        self.socket_path = socket_path
+        self.manager = manager or ContextManager()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket left behind by a previous run
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        print(f"Context shard server listening on {self.socket_path}")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                if frame is None:
+                    break
+                reply, payload = await self._dispatch(*frame)
+                writer.write(_encode_frame(reply, payload))
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: Dict[str, Any], payload: bytes) -> Tuple[Dict[str, Any], bytes]:
+        try:
+            op = request.get("op")
+            args = request.get("args", {})
+            if op not in SHARD_OPERATIONS:
+                return {"error": f"Unknown operation: {op}"}, b""
+            # History goes over the wire in the binary record format
+            if op == "get_interaction_history":
+                return {"result": None}, encode_messages(await self.manager.get_history_records(**args))
+            if op == "add_interaction_to_history":
+                user_message, assistant_message = decode_messages(payload)
+                await self.manager.add_interaction_to_history(
+                    args["user_id"], args["company_id"], user_message.content, assistant_message.content
+                )
+                return {"result": None}, b""
+            if op == "export_history":
+                return {"result": None}, await self.manager.export_history(**args)
+            if op == "import_history":
+                await self.manager.import_history(args["user_id"], args["company_id"], payload)
+                return {"result": None}, b""
+            result = await getattr(self.manager, op)(**args)
+            if isinstance(result, Mapping):
+                result = dict(result) # Compact profile records are mappings, not JSON-serialisable dicts
+            return {"result": result}, b""
+        except Exception as e:
+            return {"error": str(e)}, b""
+
+
+ContextShard = Union[ContextManager, RemoteContextShard]
+
+
+class ShardedContextManager(ContextManager):
+    """
+    ContextManager that spreads state over several shards.
+    Conversation history is routed by (company_id, user_id), so every turn of a conversation
+    lands on the same shard no matter which worker process handles the request.
+    Profiles are routed by their own id.
+    """
+
+    def __init__(self, shards: Dict[str, ContextShard], virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        # State lives in the shards, so the in-memory stores of the base class are not initialised.
+        self.shards = shards
+        self.ring = ConsistentHashRing(list(shards.keys()), virtual_nodes=virtual_nodes)
+
+    def shard_for_conversation(self, user_id: str, company_id: str) -> ContextShard:
+        return self.shards[self.ring.get_shard(conversation_shard_key(user_id, company_id))]
+
+    def shard_for_user(self, user_id: str) -> ContextShard:
+        return self.shards[self.ring.get_shard(f"user:{user_id}")]
+
+    def shard_for_company(self, company_id: str) -> ContextShard:
+        return self.shards[self.ring.get_shard(f"company:{company_id}")]
+
+    async def get_user_profile(self, user_id: str) -> Dict[str, Any] | None:
+        return await self.shard_for_user(user_id).get_user_profile(user_id)
+
+    async def get_company_profile(self, company_id: str) -> Dict[str, Any] | None:
+        return await self.shard_for_company(company_id).get_company_profile(company_id)
+
+    async def update_user_profile(self, user_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.shard_for_user(user_id).update_user_profile(user_id, profile)
+
+    async def update_company_profile(self, company_id: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.shard_for_company(company_id).update_company_profile(company_id, profile)
+
+    async def get_interaction_history(self, user_id: str, company_id: str, limit: int = 3) -> List[Dict[str, str]]:
+        shard = self.shard_for_conversation(user_id, company_id)
+        return await shard.get_interaction_history(user_id, company_id, limit=limit)
+
+    async def add_interaction_to_history(self, user_id: str, company_id: str, user_message: str, assistant_message: str):
+        shard = self.shard_for_conversation(user_id, company_id)
+        await shard.add_interaction_to_history(user_id, company_id, user_message, assistant_message)
+
+    async def get_history_records(self, user_id: str, company_id: str, limit: int = 3) -> List[Message]:
+        return [Message.from_dict(m) for m in await self.get_interaction_history(user_id, company_id, limit=limit)]
+
+    async def export_history(self, user_id: str, company_id: str) -> bytes:
+        return await self.shard_for_conversation(user_id, company_id).export_history(user_id, company_id)
+
+    async def import_history(self, user_id: str, company_id: str, data: bytes):
+        await self.shard_for_conversation(user_id, company_id).import_history(user_id, company_id, data)
+
+    async def close(self):
+        for shard in self.shards.values():
+            if isinstance(shard, RemoteContextShard):
+                await shard.close()
+
+
+def build_context_manager_from_env() -> ContextManager:
+    """
+    Builds the process-wide context manager.
+    If CONTEXT_SHARD_SOCKETS is set (comma-separated Unix socket paths), a ShardedContextManager
+    talking to those shard servers is returned, so all uvicorn workers share the same history.
+    Otherwise a plain in-process ContextManager is used.
+    """
+    socket_paths = [p.strip() for p in os.getenv("CONTEXT_SHARD_SOCKETS", "").split(",") if p.strip()]
+    if not socket_paths:
+        return ContextManager()
+    shards: Dict[str, ContextShard] = {path: RemoteContextShard(path) for path in socket_paths}
+    return ShardedContextManager(shards)
+
+
+async def _serve_shards(socket_paths: List[str]):
+    servers = [ContextShardServer(path) for path in socket_paths]
+    for server in servers:
+        await server.start()
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            await server.close()
+
+
+# Local stand-in for a shard cluster. From the backend directory:
+#   python -m app.orchestration.sharding /tmp/nowgo-shard-0.sock /tmp/nowgo-shard-1.sock
+# then start uvicorn with CONTEXT_SHARD_SOCKETS=/tmp/nowgo-shard-0.sock,/tmp/nowgo-shard-1.sock --workers N
+if __name__ == "__main__":
+    import sys
+    paths = sys.argv[1:] or ["/tmp/nowgo-shard-0.sock"]
+    asyncio.run(_serve_shards(paths))
@@ -0,0 +1,179 @@
+# Speculative persona execution: used when persona routing has no real signal and falls back to its default
+import asyncio
+import os
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from ..agents.base_agent import BaseAgent
+from ..core.deadline import budget_for_call
+from ..core.usage import usage_scope
+from ..agents.registry import Persona, agent_registry
+
+DEFAULT_TOP_K = 3
+DEFAULT_PROBE_TOKENS = 32 # Stream chunks collected per candidate before choosing the winner
+DEFAULT_PROBE_TIMEOUT = 10.0 # Seconds allowed for the probe phase
+
+_WORD_RE = re.compile(r"[a-zA-ZÀ-ſ]{3,}")
+_REFUSAL_MARKERS = ("i'm not able", "i am not able", "i cannot", "i can't", "outside my expertise", "not qualified")
+
+
+def speculative_personas_enabled() -> bool:
+    """Opt-in switch (NOWGO_SPECULATIVE_PERSONAS=1)."""
+    return os.getenv("NOWGO_SPECULATIVE_PERSONAS", "").lower() in ("1", "true", "yes")
+
+
+def _words(text: str) -> set:
+    return {w.lower() for w in _WORD_RE.findall(text)}
+
+
+def _persona_words(persona: Persona) -> set:
+    return _words(f"{persona.get_name()} {persona.get_description()}")
+
+
+def rank_candidate_personas(user_prompt: str, personas: List[Persona], k: int = DEFAULT_TOP_K) -> List[Persona]:
+    """Orders personas by word overlap between the prompt and the persona description and keeps the top k."""
+    prompt_words = _words(user_prompt)
+    # sorted() is stable, so ties keep registry order and the default persona stays first
+    ranked = sorted(personas, key=lambda p: len(prompt_words & _persona_words(p)), reverse=True)
+    return ranked[:k]
+
+
+def score_probe(persona: Persona, user_prompt: str, draft: str) -> float:
+    """
+    Cheap local score for the opening of a candidate answer.
+    Rewards drafts that stay on the user's topic and within the persona's domain, penalizes refusals.
+    """
+    if not draft.strip():
+        return float("-inf")
+    draft_words = _words(draft)
+    score = 2.0 * len(draft_words & _words(user_prompt)) + len(draft_words & _persona_words(persona))
+    lowered = draft.lower()
+    if any(marker in lowered for marker in _REFUSAL_MARKERS):
+        score -= 5.0
+    return score
+
+
+class SpeculationMetrics:
+    """Counters for speculative runs, including how much generation was cut short by cancelling losers."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.runs = 0
+        self.probes_started = 0
+        self.probes_cancelled = 0
+        self.probe_tokens_discarded = 0 # Chunks generated by losing probes before they were cancelled
+        self.estimated_tokens_saved = 0 # Chunks losers would have produced if run to completion
+        self.wins_by_persona: Dict[str, int] = {}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "probes_started": self.probes_started,
+            "probes_cancelled": self.probes_cancelled,
+            "probe_tokens_discarded": self.probe_tokens_discarded,
+            "estimated_tokens_saved": self.estimated_tokens_saved,
+            "wins_by_persona": dict(self.wins_by_persona),
+        }
+
+speculation_metrics = SpeculationMetrics()
+
+
+class _Probe:
+    def __init__(self, agent: BaseAgent, stream: AsyncIterator[str]):
+        self.agent = agent
+        self.stream = stream
+        self.chunks: List[str] = []
+        self.finished = False
+
+    async def collect(self, max_chunks: int):
+        # The stream starts here, so its token usage is attributed to this probe's persona
+        with usage_scope(persona=self.agent.persona.name):
+            await self._collect(max_chunks)
+
+    async def _collect(self, max_chunks: int):
+        while len(self.chunks) < max_chunks:
+            try:
+                self.chunks.append(await self.stream.__anext__())
+            except StopAsyncIteration:
+                self.finished = True
+                return
+
+    async def cancel(self):
+        await self.stream.aclose()
+
+
+async def run_speculative_personas(
+    candidates: List[Persona],
+    user_prompt: str,
+    conversation_history: Optional[List[Dict[str, str]]] = None,
+    context_data: Optional[Dict[str, Any]] = None,
+    probe_tokens: int = DEFAULT_PROBE_TOKENS,
+    probe_timeout: float = DEFAULT_PROBE_TIMEOUT,
+    metrics: SpeculationMetrics = speculation_metrics,
+) -> Tuple[Optional[Persona], str | None]:
+    """
+    Streams the prompt to every candidate persona in parallel, reads the first `probe_tokens` chunks of each,
+    picks the best opening with score_probe, cancels the other streams and finishes generation for the winner only.
+    Returns (winning persona, full response), or (None, None) if no candidate produced anything.
+    """
+    probes = [
+        _Probe(agent, agent.stream_response(user_prompt, conversation_history, context_data))
+        for agent in (agent_registry.get_agent(p) for p in candidates)
+    ]
+    metrics.runs += 1
+    metrics.probes_started += len(probes)
+
+    # Each probe stops by itself after probe_tokens chunks. On timeout, pending probes are not cancelled before the
+    # winner is known: cancelling a read in flight ends the stream, which would leave the winner with a partial answer.
+    tasks = [asyncio.create_task(p.collect(probe_tokens)) for p in probes]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=budget_for_call(probe_timeout))
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    if pending:
+        print("Speculative personas: probe phase timed out, choosing among partial drafts.")
+
+    scored = [(score_probe(p.agent.persona, user_prompt, "".join(p.chunks)), i) for i, p in enumerate(probes)]
+    best_score, best_index = max(scored, key=lambda s: (s[0], -s[1])) # Ties go to the higher-ranked candidate
+    winner = probes[best_index]
+    winner_task = tasks[best_index]
+
+    losers = [(probe, task) for probe, task in zip(probes, tasks) if probe is not winner]
+    for probe, task in losers:
+        metrics.probes_cancelled += 1
+        metrics.probe_tokens_discarded += len(probe.chunks)
+        task.cancel()
+    await asyncio.gather(*(task for _, task in losers), return_exceptions=True)
+    for probe, _ in losers:
+        await probe.cancel()
+
+    if best_score == float("-inf"):
+        winner_task.cancel()
+        await asyncio.gather(winner_task, return_exceptions=True)
+        await winner.cancel()
+        return None, None
+
+    try:
+        await winner_task # Still running only if the probe phase timed out; its stream is intact
+    except BaseException:
+        await winner.cancel()
+        raise
+
+    if not winner.finished:
+        try:
+            async for chunk in winner.stream:
+                winner.chunks.append(chunk)
+        finally:
+            await winner.cancel()
+
+    # Assume a cancelled loser would have produced an answer about as long as the winner's
+    metrics.estimated_tokens_saved += sum(
+        max(len(winner.chunks) - len(p.chunks), 0) for p in probes if p is not winner
+    )
+    persona = winner.agent.persona
+    metrics.wins_by_persona[persona.name] = metrics.wins_by_persona.get(persona.name, 0) + 1
+    return persona, "".join(winner.chunks)
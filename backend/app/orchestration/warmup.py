@@ -0,0 +1,117 @@
+# Warm-up phase run at startup: primes imports, connections and caches before the API reports ready
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from ..agents.registry import agent_registry
+from ..core.lazy import warm_up_imports
+from ..core.openai_client import get_openai_client
+from .context_manager import context_manager
+
+DEFAULT_STEPS = ("imports", "llm_connection", "agents", "company_profiles")
+DEFAULT_STEP_TIMEOUT = 10.0 # Seconds per step
+
+
+class WarmUpState:
+    """Progress of the warm-up phase, reported by /ready."""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: List[Dict[str, Any]] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = None
+        if self.started_at is not None and self.finished_at is not None:
+            total = round(self.finished_at - self.started_at, 4)
+        return {"ready": self.ready, "total_seconds": total, "steps": list(self.steps)}
+
+warm_up_state = WarmUpState()
+
+
+def configured_steps() -> List[str]:
+    """Steps to run, from NOWGO_WARMUP_STEPS (comma-separated, empty string disables warm-up)."""
+    value = os.getenv("NOWGO_WARMUP_STEPS")
+    if value is None:
+        return list(DEFAULT_STEPS)
+    return [step.strip() for step in value.split(",") if step.strip()]
+
+
+# --- Steps --- #
+# Each step returns a short description of what it did, which is reported by /ready.
+
+async def _warm_imports() -> str:
+    timings = await asyncio.to_thread(warm_up_imports)
+    return ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in timings.items()) or "nothing to import"
+
+
+async def _warm_llm_connection() -> str:
+    client = get_openai_client() # Builds the shared client and its connection pool
+    if client is None:
+        return "skipped, no API key"
+    if not hasattr(client, "models"):
+        return "skipped, offline client" # Cassette replay or a fake LLM, nothing to connect to
+    # A cheap authenticated request opens the pooled connection (DNS, TCP, TLS) ahead of the first chat request
+    await client.models.list()
+    return "connection pool opened"
+
+
+async def _warm_agents() -> str:
+    count = agent_registry.build_agents()
+    for persona in agent_registry.list_personas():
+        persona.get_system_prompt() # Loads prompt files of config personas
+    return f"{count} agents, persona prompts loaded"
+
+
+async def _warm_company_profiles() -> str:
+    company_ids = [c.strip() for c in os.getenv("NOWGO_WARMUP_COMPANIES", "").split(",") if c.strip()]
+    found = 0
+    for company_id in company_ids:
+        if await context_manager.get_company_profile(company_id) is not None:
+            found += 1
+    return f"{found}/{len(company_ids)} company profiles loaded"
+
+
+WARM_UP_STEPS: Dict[str, Callable[[], Awaitable[str]]] = {
+    "imports": _warm_imports,
+    "llm_connection": _warm_llm_connection,
+    "agents": _warm_agents,
+    "company_profiles": _warm_company_profiles,
+}
+
+
+async def run_warm_up(steps: Optional[List[str]] = None, state: WarmUpState = warm_up_state, step_timeout: Optional[float] = None) -> WarmUpState:
+    """
+    Runs the warm-up steps in order and records the time each took.
+    A failing step is recorded but doesn't block readiness: the service can still answer, only more slowly.
+    """
+    steps = configured_steps() if steps is None else steps
+    step_timeout = float(os.getenv("NOWGO_WARMUP_STEP_TIMEOUT", DEFAULT_STEP_TIMEOUT)) if step_timeout is None else step_timeout
+    state.started_at = time.monotonic()
+    state.finished_at = None
+    state.steps = []
+
+    for name in steps:
+        step = WARM_UP_STEPS.get(name)
+        started = time.perf_counter()
+        if step is None:
+            state.steps.append({"name": name, "ok": False, "seconds": 0.0, "detail": "unknown step"})
+            continue
+        try:
+            detail = await asyncio.wait_for(step(), step_timeout)
+            ok = True
+        except asyncio.TimeoutError:
+            detail, ok = f"timed out after {step_timeout}s", False
+        except Exception as e:
+            detail, ok = f"failed: {e}", False
+        seconds = round(time.perf_counter() - started, 4)
+        state.steps.append({"name": name, "ok": ok, "seconds": seconds, "detail": detail})
+        print(f"Warm-up step '{name}' {'done' if ok else 'FAILED'} in {seconds * 1000:.0f}ms: {detail}")
+
+    state.finished_at = time.monotonic()
+    return state
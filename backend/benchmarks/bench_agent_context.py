@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: per-request CPU spent building and rendering agent context,
+uncached (rebuilt on every request) vs. precomputed per profile version.
+
+Run from the backend directory:
+    python -m benchmarks.bench_agent_context [--iterations 200000] [--rps 1000]
+"""
+import argparse
+import time
+
+from app.agents.base_agent import render_context_block
+from app.orchestration.orchestrator import AgentContextCache, build_agent_context
+
+FULL_CONTEXT = {
+    "user_profile": {"user_id": "user123", "role": "Manager", "department": "Sales", "version": 3},
+    "company_profile": {
+        "company_id": "comp456",
+        "sector": "Technology",
+        "stage": "Growth",
+        "strategic_goals": ["Expand market share", "Improve customer retention", "Enter LATAM"],
+        "version": 7,
+    },
+    "module_accessed": "strategy_dashboard",
+    "current_interaction_data": {},
+    "interaction_history": [],
+}
+
+
+def _uncached() -> str:
+    return render_context_block(build_agent_context(FULL_CONTEXT))
+
+
+def _cached(cache: AgentContextCache) -> str:
+    return cache.get_or_build(FULL_CONTEXT).rendered
+
+
+def _per_call_seconds(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--rps", type=int, default=1000, help="Request rate used to express the saving as CPU time per second")
+    args = parser.parse_args()
+
+    cache = AgentContextCache()
+    assert _cached(cache) == _uncached()
+
+    uncached = _per_call_seconds(_uncached, args.iterations)
+    cached = _per_call_seconds(lambda: _cached(cache), args.iterations)
+    saved = uncached - cached
+
+    print(f"uncached build+render : {uncached * 1e6:8.2f} us/request")
+    print(f"precomputed context   : {cached * 1e6:8.2f} us/request")
+    print(f"saved                 : {saved * 1e6:8.2f} us/request ({saved / uncached:.0%})")
+    rate_label = f"at {args.rps} RPS"
+    print(f"{rate_label:<22}: {saved * args.rps * 1e3:8.2f} ms CPU saved per second")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Records a workload of completion and streaming calls against the local stub LLM server into a cassette, stops the
+server, then replays the same workload offline at several latency scales. Reports throughput and p50/p95 call
+latency of each run, so replayed timings can be compared with the live ones, and the cassette size per call.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cassette_replay [--calls 200] [--concurrency 16] [--scales 1,0.1,0]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import List, Tuple
+
+from benchmarks.llm_stub_server import StubLLMServer
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))]
+
+
+async def run_workload(calls: int, concurrency: int, stream_every: int) -> Tuple[float, List[float], int]:
+    """Runs `calls` distinct prompts, every stream_every-th one streamed. Returns (wall time, call latencies, failures)."""
+    from app.core.openai_client import get_chat_completion, stream_chat_completion
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one_call(i: int):
+        nonlocal failures
+        prompt = f"Benchmark prompt {i}: summarise the quarterly figures."
+        async with semaphore:
+            started = time.perf_counter()
+            if stream_every and i % stream_every == 0:
+                answer = "".join([delta async for delta in stream_chat_completion(prompt, max_tokens=64)])
+            else:
+                answer = await get_chat_completion(prompt)
+            latencies.append(time.perf_counter() - started)
+            if not answer:
+                failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one_call(i) for i in range(calls)))
+    return time.perf_counter() - started, latencies, failures
+
+
+def report(label: str, calls: int, wall: float, latencies: List[float], failures: int):
+    print(
+        f"{label:<18} {calls / wall:>9.1f} {statistics.median(latencies) * 1000:>8.1f} "
+        f"{_percentile(latencies, 95) * 1000:>8.1f} {failures:>8}"
+    )
+
+
+async def main_async(args):
+    server = StubLLMServer(scale=args.scale, alpha=args.alpha, seed=7)
+    await server.start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+
+    from app.core.cassette import Cassette
+    from app.core.openai_client import set_cassette
+
+    path = args.cassette or os.path.join(tempfile.mkdtemp(prefix="nowgo-cassette-"), "bench.jsonl.gz")
+    print(f"{args.calls} calls (1 in {args.stream_every} streamed), concurrency {args.concurrency}, stub latency ~{args.scale * 1000:.0f}ms")
+    print(f"{'run':<18} {'calls/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'failures':>8}")
+
+    recorder = Cassette(path, mode="record")
+    set_cassette(recorder)
+    try:
+        report("live + record", args.calls, *await run_workload(args.calls, args.concurrency, args.stream_every))
+    finally:
+        await server.close()
+    recorder.save()
+    server_requests = server.requests
+
+    # The server is gone and the API key unset: every answer below comes from the cassette
+    del os.environ["OPENAI_API_KEY"]
+    for scale in (float(s) for s in args.scales.split(",")):
+        replay = Cassette(path, mode="replay", latency_scale=scale)
+        set_cassette(replay)
+        report(f"replay x{scale:g}", args.calls, *await run_workload(args.calls, args.concurrency, args.stream_every))
+        assert replay.misses == 0, f"{replay.misses} requests missing from the cassette"
+    set_cassette(None)
+
+    size = os.path.getsize(path)
+    print(f"cassette {path}: {len(recorder)} calls recorded out of {server_requests} served, {size} bytes ({size / max(len(recorder), 1):.0f} bytes/call)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--stream-every", type=int, default=4, help="Stream every n-th call (0 = never)")
+    parser.add_argument("--scales", default="1,0.1,0", help="Latency scales of the replay runs")
+    parser.add_argument("--cassette", help="Cassette file to write (default: a temporary file)")
+    parser.add_argument("--scale", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=1.5)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Wall time of map-reduce document answering vs. document size, one chunk call at a time vs. bounded parallelism,
+against the local stub LLM server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_document_mapreduce [--sizes 12000,60000,240000,960000] [--concurrency 1,4,8]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.llm_stub_server import StubLLMServer
+
+PARAGRAPH = "The supplier shall deliver the goods within thirty days of the purchase order, subject to clause 7.2. "
+
+
+async def main_async(args):
+    server = StubLLMServer(scale=args.scale, alpha=args.alpha, seed=11)
+    await server.start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+
+    from app.agents.base_agent import BaseAgent
+    from app.agents.personas import AgentPersona
+    from app.orchestration.documents import answer_with_documents, chunk_text
+
+    agent = BaseAgent(AgentPersona.LEGAL_EXPERT)
+    await agent.generate_response("warm-up") # Imports the SDK and opens the connection pool outside the timings
+    sizes = [int(s) for s in args.sizes.split(",")]
+    levels = [int(c) for c in args.concurrency.split(",")]
+    print(f"chunk size {args.chunk_chars} chars, stub latency ~{args.scale * 1000:.0f}ms per call")
+    print(f"{'doc chars':>10} {'chunks':>6} " + " ".join(f"{f'c={c}':>10}" for c in levels) + "   calls")
+    try:
+        for size in sizes:
+            document = (PARAGRAPH * (size // len(PARAGRAPH) + 1))[:size]
+            chunks = len(chunk_text(document, args.chunk_chars))
+            timings = []
+            for concurrency in levels:
+                calls_before = server.requests
+                started = time.perf_counter()
+                response = await answer_with_documents(
+                    agent, "List the delivery obligations.", [("contract.txt", document)],
+                    chunk_chars=args.chunk_chars, concurrency=concurrency,
+                )
+                timings.append(time.perf_counter() - started)
+                assert response is not None
+                calls = server.requests - calls_before
+            print(f"{size:>10} {chunks:>6} " + " ".join(f"{t:>9.2f}s" for t in timings) + f"   {calls}")
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="12000,60000,240000,960000")
+    parser.add_argument("--concurrency", default="1,4,8")
+    parser.add_argument("--chunk-chars", type=int, default=12000)
+    parser.add_argument("--scale", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=3.0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tail latency of get_chat_completion with and without hedging, against the local heavy-tailed stub server.
+
+Run from the backend directory:
+    python -m benchmarks.bench_hedging [--requests 400] [--concurrency 16]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.llm_stub_server import StubLLMServer
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100.0 * len(ordered)))]
+
+
+async def _run(requests: int, concurrency: int):
+    from app.core import openai_client
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.monotonic()
+            await openai_client.get_chat_completion(f"Benchmark prompt {i}")
+            latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies
+
+
+async def main_async(args):
+    server = StubLLMServer(scale=args.scale, alpha=args.alpha, seed=7)
+    await server.start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "stub-key"
+
+    from app.core import openai_client
+    try:
+        for label, hedging in (("no hedging", "0"), ("hedging at p95", "1")):
+            os.environ["OPENAI_HEDGING"] = hedging
+            openai_client.hedging_stats.__init__()
+            sent_before = server.requests
+            latencies = await _run(args.requests, args.concurrency)
+            print(
+                f"{label:<15} p50={_percentile(latencies, 50) * 1e3:7.1f}ms "
+                f"p95={_percentile(latencies, 95) * 1e3:7.1f}ms p99={_percentile(latencies, 99) * 1e3:7.1f}ms "
+                f"upstream requests={server.requests - sent_before} {openai_client.hedging_stats.as_dict()}"
+            )
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scale", type=float, default=0.02)
+    parser.add_argument("--alpha", type=float, default=1.3)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
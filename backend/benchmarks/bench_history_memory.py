@@ -0,0 +1,63 @@
+"""
+Memory benchmark: bytes per stored history message with the old {"role": ..., "content": ...} dicts
+vs. the compact Message records, plus the size of the binary serialization.
+
+The message contents are created up front and shared by every representation, so the figures
+are the per-message overhead on top of the text itself.
+
+Run from the backend directory:
+    python -m benchmarks.bench_history_memory [--messages 1000000] [--content-length 120]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, List
+
+from app.orchestration.records import Message, Role, decode_messages, encode_messages
+
+
+def _allocated_bytes(build: Callable[[], object]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del value
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--content-length", type=int, default=120)
+    args = parser.parse_args()
+
+    contents: List[str] = [f"{i:08d} " + "x" * max(args.content_length - 9, 0) for i in range(args.messages)]
+    roles = [Role.USER if i % 2 == 0 else Role.ASSISTANT for i in range(args.messages)]
+
+    dict_bytes = _allocated_bytes(lambda: [{"role": role.name.lower(), "content": content} for role, content in zip(roles, contents)])
+    record_bytes = _allocated_bytes(lambda: [Message(role, content) for role, content in zip(roles, contents)])
+
+    messages = [Message(role, content) for role, content in zip(roles, contents)]
+    started = time.perf_counter()
+    encoded = encode_messages(messages)
+    encode_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    decoded = decode_messages(encoded)
+    decode_seconds = time.perf_counter() - started
+    assert len(decoded) == args.messages
+
+    text_bytes = sum(len(content.encode("utf-8")) for content in contents)
+    n = args.messages
+    print(f"{n} messages, {args.content_length} chars of content each")
+    print(f"  dict entries:     {dict_bytes / n:7.1f} bytes/message overhead")
+    print(f"  Message records:  {record_bytes / n:7.1f} bytes/message overhead ({(1 - record_bytes / dict_bytes) * 100:.0f}% less)")
+    print(f"  binary encoding:  {(len(encoded) - text_bytes) / n:7.1f} bytes/message overhead, {len(encoded) / 1e6:.1f}MB total")
+    print(f"  encode {encode_seconds * 1000:.0f}ms, decode {decode_seconds * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Startup-time benchmark based on `python -X importtime`.
+Imports the app in a fresh interpreter several times, reports the cumulative import time of the target module
+(median of the runs) and its heaviest dependencies, and exits with status 1 above the regression threshold.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup [--module app.main] [--runs 5] [--max-ms 800]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("openai",) # Must not be imported by the app at startup, see app/core/lazy.py
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Parses `-X importtime` output into (module, self_us, cumulative_us) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure_once(module: str) -> Dict[str, int]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    return {name: cumulative for name, _, cumulative in parse_importtime(result.stderr)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", 800)),
+                        help="Regression threshold for the median cumulative import time (STARTUP_IMPORT_BUDGET_MS)")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.runs)]
+    target_ms = statistics.median(run[args.module] for run in runs) / 1000.0
+
+    print(f"{args.module}: median cumulative import time {target_ms:.1f}ms over {args.runs} runs (budget {args.max_ms:.0f}ms)")
+    heaviest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)
+    print("Heaviest top-level imports (last run):")
+    for name, cumulative in [item for item in heaviest if "." not in item[0] or item[0].startswith("app.")][: args.top]:
+        print(f"  {cumulative / 1000.0:8.1f}ms  {name}")
+
+    lazily_loaded = [name for name in LAZY_MODULES if name in runs[-1]]
+    failed = False
+    if lazily_loaded:
+        print(f"FAIL: lazily loaded modules were imported at startup: {', '.join(lazily_loaded)}")
+        failed = True
+    if target_ms > args.max_ms:
+        print(f"FAIL: startup import time regressed above {args.max_ms:.0f}ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Golden-set replay harness: runs the versioned golden prompt set through `handle_user_request` against LLM responses
+recorded in a cassette (see app/core/cassette.py) and records, per case, the persona chosen, prompt/completion tokens,
+LLM calls and stage latencies (median of --repeat runs). `diff` compares two result files and exits with status 1
+when persona choice, token usage or latency regressed beyond the thresholds.
+
+Record the cassette once against the configured LLM (OPENAI_API_KEY, OPENAI_BASE_URL), then replay it offline:
+    python -m benchmarks.golden_replay run --record [--cassette benchmarks/golden/golden_set_v1.cassette.jsonl.gz]
+    python -m benchmarks.golden_replay run [--golden benchmarks/golden/golden_set_v1.json] [--out results.json]
+    python -m benchmarks.golden_replay diff baseline.json results.json [--max-token-increase 10] [--max-latency-increase 50]
+A prompt that changed since the recording has no answer in the cassette: re-record when changing prompts on purpose.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from app.core.cassette import Cassette
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GOLDEN_SET = os.path.join(BACKEND_DIR, "benchmarks", "golden", "golden_set_v1.json")
+DEFAULT_CASSETTE = os.path.join(BACKEND_DIR, "benchmarks", "golden", "golden_set_v1.cassette.jsonl.gz")
+
+
+def _tokens(text: str) -> int:
+    from app.core.usage import estimate_tokens
+    return estimate_tokens(text)
+
+
+class CallLog:
+    """
+    Wraps the LLM client the app would use (replaying or recording a cassette), installed with set_client_override,
+    and logs every call with its token counts. Prompt tokens are estimated from the messages, so they only move when
+    the prompts change; completion tokens come from the recorded usage when there is one.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.calls: List[Dict[str, Any]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
+        call = {"model": model, "prompt_tokens": sum(_tokens(m.get("content") or "") for m in messages), "completion_tokens": 0, "stream": stream}
+        self.calls.append(call)
+        response = await self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if stream:
+            return _CountedStream(response, call)
+        usage = getattr(response, "usage", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        call["completion_tokens"] = completion_tokens if isinstance(completion_tokens, int) else _tokens(response.choices[0].message.content or "")
+        return response
+
+
+class _CountedStream:
+    """Passes a stream through, counting the completion tokens of its deltas into the call's log entry."""
+
+    def __init__(self, stream: Any, call: Dict[str, Any]):
+        self._stream = stream
+        self._call = call
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        async for chunk in self._stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                self._call["completion_tokens"] += _tokens(chunk.choices[0].delta.content)
+            yield chunk
+
+    async def close(self):
+        await self._stream.close()
+
+
+def load_golden_set(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        golden = json.load(f)
+    ids = [case["id"] for case in golden["cases"]]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"Duplicate case ids in {path}")
+    return golden
+
+
+async def run_case(case: Dict[str, Any], llm: CallLog) -> Dict[str, Any]:
+    """One run of a case from a clean state: no history but the case's own, no precomputed agent context."""
+    from app.core.openai_client import llm_circuit_breaker
+    from app.core.tracing import trace_scope
+    from app.orchestration.context_manager import context_manager
+    from app.orchestration.orchestrator import agent_context_cache, handle_user_request
+
+    await context_manager.clear_history(case["user_id"], case["company_id"])
+    agent_context_cache.clear()
+    llm_circuit_breaker.reset() # A cassette miss in an earlier case must not fail this one
+    history = case.get("history") or []
+    for user_message, assistant_message in zip(history[::2], history[1::2]):
+        await context_manager.add_interaction_to_history(case["user_id"], case["company_id"], user_message["content"], assistant_message["content"])
+
+    calls_before = len(llm.calls)
+    with trace_scope() as trace:
+        started = time.perf_counter()
+        response = await handle_user_request(
+            user_id=case["user_id"],
+            company_id=case["company_id"],
+            user_prompt=case["prompt"],
+            module_accessed=case.get("module_accessed"),
+            current_interaction_data=case.get("current_interaction_data"),
+        )
+        total_ms = (time.perf_counter() - started) * 1000.0
+    calls = llm.calls[calls_before:]
+    return {
+        "persona": trace.annotations.get("persona"),
+        "ok": response is not None,
+        "llm_calls": len(calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+        "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        "stages_ms": dict(trace.stages_ms),
+        "total_ms": total_ms,
+    }
+
+
+def _median_runs(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """First run for the deterministic fields, median of the runs for the timings."""
+    result = dict(runs[0])
+    result["total_ms"] = round(statistics.median(r["total_ms"] for r in runs), 3)
+    stages = {name for r in runs for name in r["stages_ms"]}
+    result["stages_ms"] = {name: round(statistics.median(r["stages_ms"].get(name, 0.0) for r in runs), 3) for name in sorted(stages)}
+    return result
+
+
+async def run_golden_set(golden: Dict[str, Any], cassette: "Cassette", repeat: int = 5) -> Dict[str, Any]:
+    """
+    Runs every case `repeat` times with the LLM answering from `cassette`, or, for a cassette in record mode,
+    with the configured LLM answering and every call recorded (the cassette is saved at the end).
+    """
+    from app.core.openai_client import get_openai_client, set_cassette, set_client_override
+
+    previous_cassette = set_cassette(cassette)
+    try:
+        client = get_openai_client() # A ReplayClient, or the real client wrapped in a RecordingClient
+        if client is None:
+            raise RuntimeError("Recording a cassette needs OPENAI_API_KEY (and OPENAI_BASE_URL for a compatible server)")
+        llm = CallLog(client)
+        previous_override = set_client_override(llm)
+        try:
+            cases = {}
+            for case in golden["cases"]:
+                misses_before = cassette.misses
+                runs = [await run_case(case, llm) for _ in range(repeat)]
+                result = _median_runs(runs)
+                result["expected_persona"] = case.get("expected_persona")
+                result["cassette_misses"] = cassette.misses - misses_before
+                cases[case["id"]] = result
+        finally:
+            set_client_override(previous_override)
+    finally:
+        set_cassette(previous_cassette)
+    if cassette.mode == "record":
+        cassette.save()
+    return {
+        "golden_version": golden.get("version"),
+        "repeat": repeat,
+        "llm": {"cassette": os.path.basename(cassette.path), "mode": cassette.mode, "latency_scale": cassette.latency_scale},
+        "cases": cases,
+    }
+
+
+def diff_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    max_token_increase: float = 10.0,
+    max_latency_increase: float = 50.0,
+    min_latency_ms: float = 2.0,
+) -> List[str]:
+    """
+    Regressions of `current` against `baseline`, one line each: persona changed, prompt tokens or LLM calls up by more
+    than max_token_increase %, total latency up by more than max_latency_increase % and by at least min_latency_ms
+    (sub-millisecond stages are mostly noise). Cases missing from either side are reported as well.
+    """
+    problems = []
+    if baseline.get("golden_version") != current.get("golden_version"):
+        problems.append(f"golden set version changed: {baseline.get('golden_version')} -> {current.get('golden_version')}")
+    for case_id, before in baseline["cases"].items():
+        after = current["cases"].get(case_id)
+        if after is None:
+            problems.append(f"{case_id}: missing from current results")
+            continue
+        if after["persona"] != before["persona"]:
+            problems.append(f"{case_id}: persona {before['persona']} -> {after['persona']}")
+        if after["ok"] != before["ok"]:
+            problems.append(f"{case_id}: response ok {before['ok']} -> {after['ok']}")
+        for field in ("prompt_tokens", "llm_calls"):
+            if after[field] > before[field] * (1 + max_token_increase / 100.0):
+                problems.append(f"{case_id}: {field} {before[field]} -> {after[field]}")
+        added_ms = after["total_ms"] - before["total_ms"]
+        if added_ms >= min_latency_ms and after["total_ms"] > before["total_ms"] * (1 + max_latency_increase / 100.0):
+            problems.append(f"{case_id}: total latency {before['total_ms']:.1f}ms -> {after['total_ms']:.1f}ms")
+    for case_id in current["cases"].keys() - baseline["cases"].keys():
+        problems.append(f"{case_id}: new case, no baseline")
+    return problems
+
+
+def print_results(results: Dict[str, Any]):
+    print(f"golden set v{results['golden_version']}, median of {results['repeat']} runs")
+    print(f"{'case':<24} {'persona':<20} {'calls':>5} {'prompt tok':>10} {'total ms':>9}  stages")
+    for case_id, r in results["cases"].items():
+        persona = r["persona"] or "-"
+        if r["expected_persona"] and r["expected_persona"] != r["persona"]:
+            persona += " (!)"
+        stages = " ".join(f"{name}={ms:.2f}" for name, ms in r["stages_ms"].items())
+        print(f"{case_id:<24} {persona:<20} {r['llm_calls']:>5} {r['prompt_tokens']:>10} {r['total_ms']:>9.2f}  {stages}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="Run the golden set and write the results")
+    run.add_argument("--golden", default=DEFAULT_GOLDEN_SET)
+    run.add_argument("--out", default="golden_results.json")
+    run.add_argument("--repeat", type=int, default=5)
+    run.add_argument("--cassette", default=DEFAULT_CASSETTE, help="Recorded LLM responses to replay (or to record with --record)")
+    run.add_argument("--record", action="store_true", help="Call the configured LLM once per case and record the cassette")
+    run.add_argument("--latency-scale", type=float, default=0.0, help="Replay the recorded LLM latencies times this (0 = no waiting)")
+    diff = commands.add_parser("diff", help="Compare two result files, exit 1 on regression")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--max-token-increase", type=float, default=10.0, help="Percent")
+    diff.add_argument("--max-latency-increase", type=float, default=50.0, help="Percent")
+    diff.add_argument("--min-latency-ms", type=float, default=2.0, help="Latency increases below this are ignored")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        sys.path.insert(0, BACKEND_DIR)
+        from app.core.cassette import Cassette
+        if args.record:
+            if os.path.exists(args.cassette):
+                os.remove(args.cassette) # Start over: answers recorded for older prompts would never be replayed
+            cassette = Cassette(args.cassette, mode="record")
+            repeat = 1 # Every repeat would be recorded again; replay runs take the medians
+        elif not os.path.exists(args.cassette):
+            print(f"No cassette at {args.cassette}: record one first with `run --record`")
+            return 2
+        else:
+            cassette = Cassette(args.cassette, mode="replay", latency_scale=args.latency_scale)
+            repeat = args.repeat
+        results = asyncio.run(run_golden_set(load_golden_set(args.golden), cassette, repeat))
+        print_results(results)
+        if args.record:
+            print(f"Recorded {len(cassette)} LLM calls to {args.cassette}")
+        missed = [case_id for case_id, r in results["cases"].items() if r["cassette_misses"]]
+        if missed:
+            print(f"WARNING no recorded answer for some LLM calls of {', '.join(missed)}: re-record the cassette if the prompts changed on purpose")
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.out}")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    problems = diff_results(baseline, current, args.max_token_increase, args.max_latency_increase, args.min_latency_ms)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if not problems:
+        print(f"No regression over {len(baseline['cases'])} cases")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Local stand-in for the OpenAI chat completions API with a heavy-tailed latency distribution.
+Point the client at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+
+Run from the backend directory:
+    python -m benchmarks.llm_stub_server [--port 8765] [--scale 0.05] [--alpha 1.5]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Optional
+
+
+class StubLLMServer:
+    """
+    Minimal HTTP/1.1 server answering POST /v1/chat/completions (streaming and non-streaming).
+    Latency is Pareto distributed: most calls take about `scale` seconds, a few take many times longer.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, scale: float = 0.05, alpha: float = 1.5,
+                 max_latency: float = 10.0, seed: Optional[int] = None, failure_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.scale = scale
+        self.alpha = alpha
+        self.max_latency = max_latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.cancelled = 0 # Requests whose client went away before the answer was sent
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def sample_latency(self) -> float:
+        return min(self.scale * self.random.paretovariate(self.alpha), self.max_latency)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._respond(writer, request_line.decode("latin-1"), body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.cancelled += 1
+        except asyncio.CancelledError:
+            pass # Server shutting down
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, request_line: str, body: bytes):
+        self.requests += 1
+        if "/chat/completions" not in request_line:
+            self._write(writer, 404, b'{"error": {"message": "not found"}}')
+            return
+        payload = json.loads(body or b"{}")
+        await asyncio.sleep(self.sample_latency())
+        if self.random.random() < self.failure_rate:
+            self._write(writer, 500, b'{"error": {"message": "stub failure", "type": "server_error"}}')
+            return
+
+        content = "Stub answer: " + " ".join(m.get("content", "")[:40] for m in payload.get("messages", [])[-1:])
+        if payload.get("stream"):
+            await self._stream(writer, payload, content)
+            return
+        response = {
+            "id": f"chatcmpl-stub-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4, "total_tokens": (len(body) + len(content)) // 4},
+        }
+        self._write(writer, 200, json.dumps(response).encode("utf-8"))
+        await writer.drain()
+
+    async def _stream(self, writer: asyncio.StreamWriter, payload: dict, content: str):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        for word in content.split(" "):
+            chunk = {
+                "id": f"chatcmpl-stub-{self.requests}", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}],
+            }
+            writer.write(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+            await writer.drain()
+            await asyncio.sleep(self.scale / 10)
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def _write(writer: asyncio.StreamWriter, status: int, body: bytes):
+        reason = {200: "OK", 404: "Not Found", 500: "Internal Server Error"}[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+
+
+async def _serve(args):
+    server = StubLLMServer(port=args.port, scale=args.scale, alpha=args.alpha, failure_rate=args.failure_rate)
+    await server.start()
+    print(f"Stub LLM listening on {server.base_url}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scale", type=float, default=0.05, help="Minimum (typical) latency in seconds")
+    parser.add_argument("--alpha", type=float, default=1.5, help="Pareto shape; lower means a heavier tail")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    asyncio.run(_serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -136,3 +136,22 @@ async def test_base_agent_generate_response_with_empty_context_and_history(mock_
     assert user_message_content_in_llm_prompt == expected_user_message
     assert called_kwargs["model"] == persona.get_llm_model_name()
 
+
+@pytest.mark.asyncio
+async def test_base_agent_uses_pre_rendered_context(mock_get_chat_completion):
+    from app.agents.base_agent import RenderedAgentContext
+    agent = BaseAgent(persona=AgentPersona.STRATEGY_CONSULTANT)
+    mock_get_chat_completion.return_value = "ok"
+    context_data = RenderedAgentContext({"company_sector": "Healthcare"})
+    context_data.rendered = "\nPre-rendered block" # The agent must not re-format the data
+
+    await agent.generate_response("Is this compliant?", context_data=context_data)
+
+    called_args, called_kwargs = mock_get_chat_completion.call_args
+    assert called_kwargs["prompt"][-1]["content"] == "Relevant context for this interaction:\nPre-rendered block\n\nUser query: Is this compliant?"
+
+def test_rendered_agent_context_matches_plain_formatting():
+    from app.agents.base_agent import RenderedAgentContext, render_context_block
+    data = {"company_sector": "Healthcare", "user_role": "Manager", "empty": None}
+    assert RenderedAgentContext(data).rendered == render_context_block(data) == "\nCompany sector: Healthcare\nUser role: Manager"
+    assert render_context_block({}) == ""
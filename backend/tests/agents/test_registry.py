@@ -0,0 +1,91 @@
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.agents.base_agent import BaseAgent
+from app.agents.personas import AgentPersona, PersonaSpec
+from app.agents.registry import AgentRegistry, import_agent_class
+
+class LegalAgent(BaseAgent):
+    pass
+
+class NotAnAgent:
+    pass
+
+def test_registry_builds_one_shared_agent_per_persona():
+    registry = AgentRegistry()
+    assert registry.build_agents() == len(AgentPersona)
+    agent = registry.get_agent(AgentPersona.DATA_ANALYST)
+    assert isinstance(agent, BaseAgent)
+    assert agent.persona == AgentPersona.DATA_ANALYST
+    assert registry.get_agent(AgentPersona.DATA_ANALYST) is agent
+
+def test_registry_uses_registered_specialized_class():
+    registry = AgentRegistry()
+    generic = registry.get_agent(AgentPersona.LEGAL_EXPERT)
+    registry.register_agent_class("LEGAL_EXPERT", LegalAgent)
+    specialized = registry.get_agent(AgentPersona.LEGAL_EXPERT)
+    assert isinstance(specialized, LegalAgent)
+    assert specialized is not generic
+    assert type(registry.get_agent(AgentPersona.STRATEGY_CONSULTANT)) is BaseAgent
+
+def test_config_persona_replacing_a_builtin_key_is_built_once():
+    registry = AgentRegistry()
+    override = PersonaSpec.from_config({"key": "LEGAL_EXPERT", "name": "Legal Counsel", "system_prompt": "You are in-house counsel."})
+    registry.register_persona(override)
+    agent = registry.get_agent(override)
+    assert agent.persona is override
+    with patch.object(registry, "_build_agent", wraps=registry._build_agent) as build:
+        assert registry.get_agent(override) is agent
+        assert registry.get_agent(AgentPersona.LEGAL_EXPERT) is agent # The enum member resolves to the override
+    build.assert_not_called()
+
+def test_registry_rejects_non_agent_classes():
+    registry = AgentRegistry()
+    with pytest.raises(TypeError):
+        registry.register_agent_class("LEGAL_EXPERT", NotAnAgent)
+    with pytest.raises(TypeError):
+        import_agent_class(f"{__name__}:NotAnAgent")
+
+def test_registry_loads_personas_and_classes_from_config(tmp_path):
+    prompt_file = tmp_path / "hr_prompt.txt"
+    prompt_file.write_text("You are a thoughtful HR Advisor.\n")
+    config_file = tmp_path / "personas.json"
+    config_file.write_text(json.dumps({
+        "personas": [{
+            "key": "HR_ADVISOR",
+            "name": "HR Advisor",
+            "description": "Helps with people management.",
+            "system_prompt_file": str(prompt_file),
+            "module_keywords": ["People", "hr_"],
+            "agent_class": f"{__name__}:LegalAgent",
+        }],
+        "agent_classes": {"LEGAL_EXPERT": f"{__name__}:LegalAgent"},
+    }))
+
+    registry = AgentRegistry()
+    registry.load_config_file(str(config_file))
+
+    persona = registry.get_persona("HR_ADVISOR")
+    assert isinstance(persona, PersonaSpec)
+    assert persona._system_prompt is None # Loaded lazily
+    assert persona.get_system_prompt() == "You are a thoughtful HR Advisor."
+    assert persona.get_name() == "HR Advisor"
+    assert registry.match_module("people_dashboard") is persona
+    assert registry.match_module("finance") is None
+    assert isinstance(registry.get_agent(persona), LegalAgent)
+    assert isinstance(registry.get_agent(AgentPersona.LEGAL_EXPERT), LegalAgent)
+
+def test_persona_spec_requires_a_prompt():
+    with pytest.raises(ValueError):
+        PersonaSpec(key="EMPTY", name="Empty")
+
+@pytest.mark.asyncio
+async def test_agent_with_persona_spec_generates_response():
+    persona = PersonaSpec(key="HR_ADVISOR", name="HR Advisor", system_prompt="You are an HR advisor.", llm_model_name="gpt-4o-mini")
+    agent = AgentRegistry().get_agent(persona)
+    with patch("app.agents.base_agent.get_chat_completion", new_callable=AsyncMock, return_value="ok") as mock_completion:
+        assert await agent.generate_response("Hiring plan?") == "ok"
+    called_args, called_kwargs = mock_completion.call_args
+    assert called_kwargs["prompt"][0] == {"role": "system", "content": "You are an HR advisor."}
+    assert called_kwargs["model"] == "gpt-4o-mini"
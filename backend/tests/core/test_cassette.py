@@ -0,0 +1,140 @@
+import gzip
+import json
+import os
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.cassette import Cassette, CassetteMissError, RecordingClient, ReplayClient, cassette_from_env
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+def _response(content, prompt_tokens=5, completion_tokens=2):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+    )
+
+
+class _Stream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for delta in self.deltas:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))])
+
+    async def close(self):
+        self.closed = True
+
+
+def _real_client(create):
+    client = MagicMock()
+    client.chat.completions.create = create
+    return client
+
+
+@pytest.mark.asyncio
+async def test_recorded_completion_replays_from_saved_file(tmp_path):
+    path = str(tmp_path / "calls.jsonl.gz")
+    recorder = Cassette(path, mode="record")
+    client = RecordingClient(_real_client(AsyncMock(return_value=_response("Hello!"))), recorder)
+    await client.chat.completions.create(model="gpt-4o", messages=MESSAGES, timeout=10)
+    recorder.save()
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())["format"] == "nowgo-llm-cassette"
+
+    replay = ReplayClient(Cassette(path, latency_scale=0))
+    response = await replay.chat.completions.create(model="gpt-4o", messages=MESSAGES, timeout=99)
+    assert response.choices[0].message.content == "Hello!"
+    assert (response.usage.prompt_tokens, response.usage.completion_tokens) == (5, 2)
+
+
+@pytest.mark.asyncio
+async def test_recorded_stream_replays_chunks(tmp_path):
+    cassette = Cassette(str(tmp_path / "calls.jsonl.gz"), mode="record")
+    client = RecordingClient(_real_client(AsyncMock(return_value=_Stream(["Hel", "lo"]))), cassette)
+    stream = await client.chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True, max_tokens=50)
+    assert [chunk.choices[0].delta.content async for chunk in stream] == ["Hel", "lo"]
+
+    replay = ReplayClient(cassette)
+    cassette.latency_scale = 0
+    stream = await replay.chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True, max_tokens=50)
+    assert [chunk.choices[0].delta.content async for chunk in stream] == ["Hel", "lo"]
+    with pytest.raises(CassetteMissError):
+        await replay.chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True, max_tokens=10)
+
+
+@pytest.mark.asyncio
+async def test_stream_closed_early_is_not_recorded(tmp_path):
+    cassette = Cassette(str(tmp_path / "calls.jsonl.gz"), mode="record")
+    real_stream = _Stream(["a", "b", "c"])
+    client = RecordingClient(_real_client(AsyncMock(return_value=real_stream)), cassette)
+    stream = await client.chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True)
+    iterator = stream.__aiter__()
+    await iterator.__anext__()
+    await iterator.aclose()
+    await stream.close()
+    assert real_stream.closed
+    assert len(cassette) == 0
+
+
+@pytest.mark.asyncio
+async def test_repeated_requests_replay_in_recorded_order_then_cycle(tmp_path):
+    cassette = Cassette(str(tmp_path / "calls.jsonl.gz"), latency_scale=0)
+    for content in ("first", "second"):
+        cassette.add({"key": _key(), "model": "gpt-4o", "latency": 0.1, "content": content, "usage": None})
+    replay = ReplayClient(cassette)
+    answers = [(await replay.chat.completions.create(model="gpt-4o", messages=MESSAGES)).choices[0].message.content for _ in range(3)]
+    assert answers == ["first", "second", "first"]
+    assert cassette.stats()["replayed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_replay_waits_scaled_latencies(tmp_path):
+    cassette = Cassette(str(tmp_path / "calls.jsonl.gz"), latency_scale=0.5)
+    cassette.add({"key": _key(stream=True), "model": "gpt-4o", "latency": 0.4, "usage": None, "chunks": [[0.2, "a"], [0.6, "b"]]})
+    with patch("app.core.cassette.asyncio.sleep", AsyncMock()) as sleep:
+        stream = await ReplayClient(cassette).chat.completions.create(model="gpt-4o", messages=MESSAGES, stream=True)
+        [chunk async for chunk in stream]
+    assert [call.args[0] for call in sleep.call_args_list] == pytest.approx([0.2, 0.1, 0.2])
+
+
+def test_cassette_from_env(tmp_path):
+    with patch.dict(os.environ, {}, clear=True):
+        assert cassette_from_env() is None
+    with patch.dict(os.environ, {"LLM_CASSETTE": str(tmp_path / "c.gz"), "LLM_CASSETTE_LATENCY_SCALE": "0"}, clear=True):
+        cassette = cassette_from_env()
+    assert (cassette.mode, cassette.latency_scale) == ("replay", 0.0)
+    with patch.dict(os.environ, {"LLM_CASSETTE": "c.gz", "LLM_CASSETTE_MODE": "rewind"}, clear=True), pytest.raises(ValueError):
+        cassette_from_env()
+
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_replays_offline(tmp_path):
+    from app.core import openai_client
+    cassette = Cassette(str(tmp_path / "calls.jsonl.gz"), latency_scale=0)
+    messages = openai_client._build_messages("Hello")
+    cassette.add({"key": _key(messages=messages, model="gpt-4-turbo"), "model": "gpt-4-turbo", "latency": 0.3, "content": "Replayed", "usage": [3, 1]})
+
+    previous = openai_client.set_cassette(cassette)
+    try:
+        with patch.dict(os.environ, {"LLM_FALLBACK_MODEL": "gpt-4o-mini"}, clear=True):
+            assert await openai_client.get_chat_completion("Hello") == "Replayed"
+            assert openai_client.get_fallback_client() == (None, None) # Misses never reach the network
+            assert await openai_client.get_chat_completion("Not recorded") is None
+    finally:
+        openai_client.set_cassette(previous)
+        openai_client.llm_circuit_breaker.reset()
+    assert cassette.stats()["misses"] == 1
+
+
+def _key(messages=MESSAGES, model="gpt-4o", stream=False):
+    from app.core.cassette import request_key
+    return request_key(model, messages, stream)
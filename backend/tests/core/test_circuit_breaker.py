@@ -0,0 +1,87 @@
+import os
+import pytest
+from unittest.mock import patch
+
+from app.core.circuit_breaker import CircuitBreaker, CircuitState, circuit_breaker_from_env
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def make_breaker(clock, **kwargs):
+    defaults = dict(name="test", window=10, min_calls=4, error_rate_threshold=0.5, open_seconds=30.0, clock=clock)
+    defaults.update(kwargs)
+    return CircuitBreaker(**defaults)
+
+def test_breaker_stays_closed_below_min_calls(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.allow_request()
+
+def test_breaker_opens_on_error_rate_and_fails_fast(clock):
+    breaker = make_breaker(clock)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitState.CLOSED
+    breaker.record_failure() # 2 of 4 failed
+    assert breaker.state == CircuitState.OPEN
+    assert not breaker.allow_request()
+    assert breaker.snapshot()["rejected_calls"] == 1
+    assert breaker.snapshot()["times_opened"] == 1
+
+def test_breaker_opens_on_slow_calls(clock):
+    breaker = make_breaker(clock, slow_call_seconds=2.0, slow_call_rate_threshold=0.75)
+    for latency in (0.1, 3.0, 3.0, 3.0):
+        breaker.record_success(latency)
+    assert breaker.state == CircuitState.OPEN
+
+def test_breaker_half_open_probe_success_closes(clock):
+    breaker = make_breaker(clock, half_open_max_calls=1)
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now = 31.0
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request() # The probe
+    assert not breaker.allow_request() # Only one probe at a time
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.snapshot()["recent_calls"] == 0
+
+def test_breaker_half_open_probe_failure_reopens(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now = 31.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    clock.now = 40.0
+    assert breaker.state == CircuitState.OPEN # Cool-down restarts from the failed probe
+    clock.now = 62.0
+    assert breaker.state == CircuitState.HALF_OPEN
+
+def test_breaker_released_probe_frees_the_slot(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_failure()
+    clock.now = 31.0
+    assert breaker.allow_request()
+    breaker.release() # Probe cancelled, no outcome
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow_request()
+
+def test_breaker_from_env():
+    with patch.dict(os.environ, {"LLM_CIRCUIT_ERROR_RATE": "0.25", "LLM_CIRCUIT_SLOW_CALL_SECONDS": "8", "LLM_CIRCUIT_OPEN_SECONDS": "5"}):
+        breaker = circuit_breaker_from_env("openai")
+    assert breaker.error_rate_threshold == 0.25
+    assert breaker.slow_call_seconds == 8.0
+    assert breaker.open_seconds == 5.0
@@ -0,0 +1,44 @@
+import asyncio
+import os
+import pytest
+from unittest.mock import patch
+
+from app.core.deadline import budget_for_call, deadline_exceeded, deadline_scope, default_request_timeout, remaining_time
+
+def test_no_deadline_by_default():
+    assert remaining_time() is None
+    assert not deadline_exceeded()
+    assert budget_for_call(30.0) == 30.0
+
+def test_deadline_scope_sets_and_resets():
+    with deadline_scope(5.0):
+        remaining = remaining_time()
+        assert 4.5 < remaining <= 5.0
+        assert budget_for_call(30.0) <= 5.0
+        assert budget_for_call(1.0) == 1.0
+        assert budget_for_call(None) <= 5.0
+    assert remaining_time() is None
+
+def test_nested_scope_cannot_extend_outer_deadline():
+    with deadline_scope(1.0):
+        with deadline_scope(100.0):
+            assert remaining_time() <= 1.0
+        with deadline_scope(0.5):
+            assert remaining_time() <= 0.5
+
+def test_deadline_exceeded():
+    with deadline_scope(0.0):
+        assert deadline_exceeded()
+        assert budget_for_call(30.0) <= 0
+
+@pytest.mark.asyncio
+async def test_deadline_propagates_to_tasks():
+    async def child():
+        return remaining_time()
+    with deadline_scope(2.0):
+        remaining = await asyncio.create_task(child())
+    assert remaining is not None and remaining <= 2.0
+
+def test_default_request_timeout_from_env():
+    with patch.dict(os.environ, {"REQUEST_TIMEOUT": "12.5"}):
+        assert default_request_timeout() == 12.5
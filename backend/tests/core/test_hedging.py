@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+
+from app.core.hedging import HedgingStats, LatencyTracker, hedged_call
+
+def test_latency_tracker_percentile_needs_enough_samples():
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for i in range(9):
+        tracker.record(float(i))
+    assert tracker.percentile(95) is None
+    tracker.record(9.0)
+    assert tracker.percentile(50) == 4.0
+    assert tracker.percentile(95) == 9.0
+
+def test_latency_tracker_keeps_a_rolling_window():
+    tracker = LatencyTracker(window=5, min_samples=1)
+    for value in [100.0, 1.0, 1.0, 1.0, 1.0, 1.0]:
+        tracker.record(value)
+    assert len(tracker) == 5
+    assert tracker.percentile(100) == 1.0
+
+def make_calls(latencies, results=None, cancelled=None):
+    """Each call to the returned factory sleeps for the next latency in the list."""
+    state = {"n": 0}
+    async def make_call():
+        n = state["n"]
+        state["n"] += 1
+        try:
+            await asyncio.sleep(latencies[n])
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(n)
+            raise
+        result = (results or {}).get(n, f"call-{n}")
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return make_call, state
+
+@pytest.mark.asyncio
+async def test_hedged_call_without_delay_does_not_hedge():
+    make_call, state = make_calls([0.01])
+    stats = HedgingStats()
+    assert await hedged_call(make_call, None, stats) == "call-0"
+    assert state["n"] == 1
+    assert stats.as_dict() == {"calls": 1, "hedges_sent": 0, "hedge_wins": 0}
+
+@pytest.mark.asyncio
+async def test_hedged_call_fast_primary_sends_no_hedge():
+    make_call, state = make_calls([0.0, 0.0])
+    stats = HedgingStats()
+    assert await hedged_call(make_call, 0.5, stats) == "call-0"
+    assert state["n"] == 1
+    assert stats.hedges_sent == 0
+
+@pytest.mark.asyncio
+async def test_hedged_call_backup_wins_and_primary_is_cancelled():
+    cancelled = []
+    make_call, state = make_calls([5.0, 0.01], cancelled=cancelled)
+    stats = HedgingStats()
+    assert await hedged_call(make_call, 0.01, stats) == "call-1"
+    await asyncio.sleep(0)
+    assert cancelled == [0]
+    assert stats.hedges_sent == 1
+    assert stats.hedge_wins == 1
+
+@pytest.mark.asyncio
+async def test_hedged_call_uses_other_result_when_first_fails():
+    make_call, _ = make_calls([0.05, 0.0], results={1: RuntimeError("backup failed")})
+    assert await hedged_call(make_call, 0.01) == "call-0"
+
+@pytest.mark.asyncio
+async def test_hedged_call_raises_when_both_fail():
+    make_call, _ = make_calls([0.02, 0.0], results={0: RuntimeError("a"), 1: RuntimeError("b")})
+    with pytest.raises(RuntimeError):
+        await hedged_call(make_call, 0.01)
+
+@pytest.mark.asyncio
+async def test_hedged_call_cancels_both_on_outer_timeout():
+    cancelled = []
+    make_call, _ = make_calls([5.0, 5.0], cancelled=cancelled)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(hedged_call(make_call, 0.01), 0.05)
+    await asyncio.sleep(0)
+    assert sorted(cancelled) == [0, 1]
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import patch
+
+from app.core import lazy
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def test_importing_the_app_does_not_import_the_llm_sdk():
+    code = "import sys, app.main, app.agents.base_agent; print('openai' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+def test_importing_the_client_does_not_read_env_file():
+    code = "import sys, app.core.openai_client; print('dotenv' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+def test_load_env_runs_once():
+    with patch.object(lazy, "_env_loaded", False), patch("dotenv.load_dotenv") as mock_load:
+        lazy.load_env()
+        lazy.load_env()
+    mock_load.assert_called_once_with(dotenv_path=lazy.project_env_path())
+
+def test_warm_up_imports_reports_timings_and_skips_missing_modules(capsys):
+    with patch.object(lazy, "WARM_UP_MODULES", ["json", "module_that_does_not_exist_nowgo"]):
+        timings = lazy.warm_up_imports()
+    assert set(timings) == {"json"}
+    assert "module_that_does_not_exist_nowgo" in capsys.readouterr().out
+
+def test_register_warm_up_module():
+    with patch.object(lazy, "WARM_UP_MODULES", ["openai"]):
+        lazy.register_warm_up_module("tiktoken")
+        lazy.register_warm_up_module("tiktoken")
+        assert lazy.WARM_UP_MODULES == ["openai", "tiktoken"]
@@ -7,6 +7,18 @@ import os
 # Assuming tests are run from the 'backend' directory or that 'app' is in PYTHONPATH
 from app.core.openai_client import get_chat_completion, test_openai_connection
 
+@pytest.fixture(autouse=True)
+def reset_llm_backend_state():
+    """Circuit breakers and the response cache are module-level, so reset them around every test."""
+    from app.core import openai_client
+    def reset():
+        openai_client.llm_circuit_breaker.reset()
+        openai_client.fallback_circuit_breaker.reset()
+        openai_client.response_cache.clear()
+    reset()
+    yield
+    reset()
+
 @pytest_asyncio.fixture
 def mock_openai_chat_completions_create():
     """Mocks the OpenAI client's chat.completions.create method."""
@@ -104,3 +116,186 @@ async def test_test_openai_connection_failure(mock_openai_chat_completions_creat
     captured = capsys.readouterr()
     assert "Failed to get response from OpenAI during connection test." in captured.out
 
+
+@pytest.mark.asyncio
+async def test_stream_chat_completion_yields_deltas_and_closes_stream(mock_openai_chat_completions_create):
+    from app.core.openai_client import stream_chat_completion
+
+    def chunk(content):
+        c = MagicMock()
+        c.choices = [MagicMock()]
+        c.choices[0].delta.content = content
+        return c
+
+    class FakeStream:
+        def __init__(self, chunks):
+            self._chunks = iter(chunks)
+            self.close = AsyncMock()
+        def __aiter__(self):
+            return self
+        async def __anext__(self):
+            try:
+                return next(self._chunks)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    fake_stream = FakeStream([chunk("Hel"), chunk(None), chunk("lo")])
+    mock_openai_chat_completions_create.return_value = fake_stream
+
+    deltas = [d async for d in stream_chat_completion("Hi", max_tokens=5)]
+
+    assert deltas == ["Hel", "lo"]
+    fake_stream.close.assert_awaited_once()
+    called_kwargs = mock_openai_chat_completions_create.call_args.kwargs
+    assert called_kwargs["stream"] is True
+    assert called_kwargs["max_tokens"] == 5
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_times_out_within_deadline(mock_openai_chat_completions_create, capsys):
+    import asyncio
+    from app.core.deadline import deadline_scope
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(5)
+    mock_openai_chat_completions_create.side_effect = slow_create
+
+    with deadline_scope(0.05):
+        completion = await get_chat_completion("Slow prompt")
+
+    assert completion is None
+    assert "call timed out" in capsys.readouterr().out
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_skips_call_when_deadline_already_passed(mock_openai_chat_completions_create, capsys):
+    from app.core.deadline import deadline_scope
+
+    with deadline_scope(0.0):
+        completion = await get_chat_completion("Too late")
+
+    assert completion is None
+    mock_openai_chat_completions_create.assert_not_called()
+    assert "deadline exceeded" in capsys.readouterr().out
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_hedges_slow_call(mock_openai_chat_completions_create):
+    import asyncio
+    from app.core import openai_client
+
+    fast_response = MagicMock()
+    fast_response.choices[0].message.content = "from backup"
+    calls = []
+    async def create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            await asyncio.sleep(5)
+        return fast_response
+    mock_openai_chat_completions_create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_HEDGING": "1", "OPENAI_HEDGE_DELAY": "0.01"}):
+        completion = await get_chat_completion("Hedge me")
+
+    assert completion == "from backup"
+    assert len(calls) == 2
+
+def _completion_response(content):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    return response
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_fails_fast_when_circuit_open(mock_openai_chat_completions_create, capsys):
+    from app.core import openai_client
+    mock_openai_chat_completions_create.side_effect = Exception("upstream down")
+    for _ in range(openai_client.llm_circuit_breaker.min_calls):
+        assert await get_chat_completion("Failing prompt") is None
+    assert openai_client.llm_circuit_breaker.state.value == "open"
+    assert not openai_client.llm_backend_available()
+
+    mock_openai_chat_completions_create.reset_mock()
+    assert await get_chat_completion("Failing prompt") is None
+    mock_openai_chat_completions_create.assert_not_called()
+    assert "circuit is open" in capsys.readouterr().out
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_serves_cached_answer_while_circuit_open(mock_openai_chat_completions_create):
+    from app.core import openai_client
+    mock_openai_chat_completions_create.return_value = _completion_response("Cached answer")
+    assert await get_chat_completion("Popular question") == "Cached answer"
+
+    for _ in range(openai_client.llm_circuit_breaker.min_calls):
+        openai_client.llm_circuit_breaker.record_failure()
+    mock_openai_chat_completions_create.reset_mock()
+
+    assert await get_chat_completion("Popular question") == "Cached answer"
+    mock_openai_chat_completions_create.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_routes_to_fallback_backend(mock_openai_chat_completions_create):
+    fallback_create = AsyncMock(return_value=_completion_response("From fallback"))
+    fallback_client = MagicMock()
+    fallback_client.chat.completions.create = fallback_create
+    mock_openai_chat_completions_create.side_effect = Exception("upstream down")
+
+    with patch("app.core.openai_client.get_fallback_client", return_value=(fallback_client, "gpt-4o-mini")):
+        assert await get_chat_completion("Needs an answer") == "From fallback"
+
+    assert fallback_create.call_args.kwargs["model"] == "gpt-4o-mini"
+
+def test_llm_backend_status_reports_circuit_state():
+    from app.core.openai_client import llm_backend_status
+    with patch.dict(os.environ, {}, clear=True):
+        status = llm_backend_status()
+    assert status["circuit"]["state"] == "closed"
+    assert status["fallback_configured"] is False
+
+@pytest.mark.asyncio
+async def test_get_chat_completion_records_usage(mock_openai_chat_completions_create):
+    from app.core.usage import usage_scope
+    mock_response = MagicMock()
+    mock_response.choices[0].message.content = "Answer"
+    mock_response.usage.prompt_tokens = 42
+    mock_response.usage.completion_tokens = 7
+    mock_openai_chat_completions_create.return_value = mock_response
+
+    with patch("app.core.openai_client.usage_accountant") as mock_accountant, usage_scope(company_id="comp456"):
+        assert await get_chat_completion("Hi", model="gpt-4o") == "Answer"
+    mock_accountant.record.assert_called_once()
+    assert mock_accountant.record.call_args.args[:3] == ("gpt-4o", 42, 7)
+
+@pytest.mark.asyncio
+async def test_client_override_takes_precedence():
+    from app.core.openai_client import get_openai_client, set_client_override
+    fake_client = MagicMock()
+    fake_client.chat.completions.create = AsyncMock(return_value=_completion_response("From fake"))
+
+    previous = set_client_override(fake_client)
+    try:
+        with patch.dict(os.environ, {}, clear=True):
+            assert get_openai_client() is fake_client
+            assert await get_chat_completion("Hi") == "From fake"
+    finally:
+        assert set_client_override(previous) is fake_client
+    fake_client.chat.completions.create.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_probe_gives_back_its_slot(mock_openai_chat_completions_create):
+    import asyncio
+    from app.core import openai_client
+    breaker = openai_client.llm_circuit_breaker
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    breaker._opened_at -= breaker.open_seconds # Cool-down over: the next call is the half-open probe
+    started = asyncio.Event()
+    async def hang(**kwargs):
+        started.set()
+        await asyncio.sleep(60)
+    mock_openai_chat_completions_create.side_effect = hang
+
+    probe = asyncio.create_task(get_chat_completion("Probe"))
+    await started.wait()
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state.value == "half_open"
+    assert breaker.allow_request() # Not stuck rejecting every call
@@ -0,0 +1,36 @@
+import time
+
+from app.core.tracing import annotate, trace_scope, trace_stage
+
+def test_stages_outside_a_trace_are_not_recorded():
+    with trace_stage("llm"):
+        annotate("persona", "LEGAL_EXPERT")
+    with trace_scope() as trace:
+        pass
+    assert trace.stages_ms == {}
+    assert trace.annotations == {}
+
+def test_trace_scope_records_stages_and_annotations():
+    with trace_scope() as trace:
+        with trace_stage("llm"):
+            time.sleep(0.01)
+        annotate("persona", "LEGAL_EXPERT")
+    assert trace.stages_ms["llm"] >= 10.0
+    assert trace.as_dict() == {"stages_ms": trace.stages_ms, "persona": "LEGAL_EXPERT"}
+
+def test_repeated_stage_time_adds_up():
+    with trace_scope() as trace:
+        for _ in range(2):
+            with trace_stage("llm"):
+                time.sleep(0.005)
+    assert trace.stages_ms["llm"] >= 10.0
+    assert list(trace.stages_ms) == ["llm"]
+
+def test_stage_is_recorded_when_it_raises():
+    with trace_scope() as trace:
+        try:
+            with trace_stage("llm"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+    assert "llm" in trace.stages_ms
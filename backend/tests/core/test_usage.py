@@ -0,0 +1,153 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from app.core.usage import (
+    QuotaExceededError, UsageAccountant, current_usage_attribution, parse_quotas, usage_scope,
+)
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def accountant(tmp_path):
+    return UsageAccountant(db_path=str(tmp_path / "usage.sqlite3"), quotas={"comp456": 100, "*": 1000})
+
+
+def test_usage_scope_nests_and_keeps_outer_values():
+    with usage_scope(company_id="c1", user_id="u1"):
+        with usage_scope(persona="LEGAL_EXPERT"):
+            assert current_usage_attribution() == ("c1", "u1", "LEGAL_EXPERT")
+        assert current_usage_attribution() == ("c1", "u1", "-")
+    assert current_usage_attribution() == ("-", "-", "-")
+
+
+def test_parse_quotas():
+    assert parse_quotas("comp456=200000, *=1000000,") == {"comp456": 200000, "*": 1000000}
+    assert parse_quotas("") == {}
+
+
+def test_record_flush_and_report(accountant):
+    with usage_scope(company_id="comp456", user_id="u1", persona="LEGAL_EXPERT"):
+        accountant.record("gpt-4-turbo", 30, 10, 0.5, now=NOW)
+        accountant.record("gpt-4-turbo", 20, 10, 1.5, now=NOW)
+    with usage_scope(company_id="comp456", user_id="u2", persona="DATA_ANALYST"):
+        accountant.record("gpt-4o", 5, 5, 1.0, now=NOW)
+    with usage_scope(company_id="other"):
+        accountant.record("gpt-4o", 500, 500, 1.0, now=NOW)
+
+    assert accountant.flush() == 3
+    assert accountant.flush() == 0
+
+    report = accountant.report("comp456", now=NOW)
+    assert report["requests"] == 3
+    assert report["total_tokens"] == 80
+    assert report["by_user"]["u1"]["prompt_tokens"] == 50
+    assert report["by_user"]["u1"]["avg_latency_seconds"] == 1.0
+    assert report["by_persona"]["DATA_ANALYST"]["total_tokens"] == 10
+    assert report["by_model"]["gpt-4-turbo"]["requests"] == 2
+    assert report["quota"] == {"limit": 100, "used": 80, "remaining": 20, "period": "day"}
+
+
+def test_usage_survives_restart_and_is_grouped_by_month(tmp_path):
+    db_path = str(tmp_path / "usage.sqlite3")
+    first = UsageAccountant(db_path=db_path)
+    with usage_scope(company_id="c1"):
+        first.record("m", 10, 5, 0.1, now=NOW)
+        first.record("m", 10, 5, 0.1, now=NOW.replace(day=1))
+    first.flush()
+
+    second = UsageAccountant(db_path=db_path, quota_period="month")
+    assert second.report("c1", period="day", now=NOW)["total_tokens"] == 15
+    assert second.report("c1", now=NOW)["total_tokens"] == 30
+
+
+def test_check_quota(accountant):
+    accountant.check_quota("comp456", now=NOW)
+    with usage_scope(company_id="comp456"):
+        accountant.record("m", 60, 40, 0.1, now=NOW)
+    with pytest.raises(QuotaExceededError) as excinfo:
+        accountant.check_quota("comp456", now=NOW)
+    assert excinfo.value.limit == 100
+    assert excinfo.value.retry_after == 12 * 3600
+    accountant.check_quota("comp456", now=NOW.replace(day=11)) # New day, new quota
+    accountant.check_quota("someone_else", now=NOW) # Falls under the "*" quota
+
+    unlimited = UsageAccountant(db_path=accountant.db_path)
+    unlimited.check_quota("comp456", now=NOW)
+
+
+def test_quota_counts_usage_recorded_after_first_check(accountant):
+    accountant.check_quota("comp456", now=NOW) # Loads the period total
+    with usage_scope(company_id="comp456"):
+        accountant.record("m", 100, 0, 0.1, now=NOW)
+    accountant.flush()
+    with pytest.raises(QuotaExceededError):
+        accountant.check_quota("comp456", now=NOW)
+
+
+@pytest.mark.asyncio
+async def test_async_quota_check_loads_the_period_off_the_event_loop(accountant):
+    with usage_scope(company_id="comp456"):
+        accountant.record("m", 60, 40, 0.1, now=NOW)
+    accountant.flush()
+    with patch("app.core.usage.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+        with pytest.raises(QuotaExceededError):
+            await accountant.check_quota_async("comp456", now=NOW) # Cold period: read from the store in a thread
+        assert to_thread.call_count == 1
+        with pytest.raises(QuotaExceededError):
+            await accountant.check_quota_async("comp456", now=NOW)
+        await accountant.check_quota_async("comp456", now=NOW.replace(day=11))
+        assert to_thread.call_count == 2 # Only cold periods leave the event loop
+
+
+@pytest.mark.asyncio
+async def test_periodic_flush_writes_remaining_usage_when_cancelled(accountant):
+    task = asyncio.create_task(accountant.run_periodic_flush(interval=60))
+    await asyncio.sleep(0)
+    with usage_scope(company_id="c1"):
+        accountant.record("m", 1, 1, 0.1, now=NOW)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert accountant._pending == {}
+    assert UsageAccountant(db_path=accountant.db_path).report("c1", now=NOW)["requests"] == 1
+
+
+def test_record_does_not_wait_for_a_slow_flush(accountant):
+    import threading
+    from unittest.mock import patch
+    with usage_scope(company_id="c1"):
+        accountant.record("m", 1, 1, 0.1, now=NOW)
+    writing, release = threading.Event(), threading.Event()
+    connect = accountant._connect
+    def slow_connect():
+        writing.set()
+        release.wait(5)
+        return connect()
+    with patch.object(accountant, "_connect", slow_connect):
+        flusher = threading.Thread(target=accountant.flush)
+        flusher.start()
+        assert writing.wait(5)
+        started = time.monotonic()
+        with usage_scope(company_id="c1"):
+            accountant.record("m", 2, 2, 0.1, now=NOW)
+        assert time.monotonic() - started < 1.0 # Not blocked until the write gives up waiting
+        release.set()
+        flusher.join(5)
+    assert accountant.flush() == 1
+    assert accountant.report("c1", now=NOW)["total_tokens"] == 6
+
+
+def test_failed_flush_keeps_the_counters(accountant):
+    import sqlite3
+    from unittest.mock import patch
+    with usage_scope(company_id="c1"):
+        accountant.record("m", 1, 1, 0.1, now=NOW)
+    with patch.object(accountant, "_connect", side_effect=sqlite3.OperationalError("database is locked")):
+        assert accountant.flush() == 0
+    with usage_scope(company_id="c1"):
+        accountant.record("m", 1, 1, 0.1, now=NOW)
+    assert accountant.flush() == 1
+    assert accountant.report("c1", now=NOW)["requests"] == 2
@@ -128,3 +128,33 @@ async def test_global_context_manager_instance():
     # Simple check, assuming it's a ContextManager instance
     assert hasattr(global_context_manager, "collect_full_context")
 
+
+@pytest.mark.asyncio
+async def test_update_profiles_bumps_version(fresh_context_manager: ContextManager):
+    updated = await fresh_context_manager.update_company_profile("comp456", {"sector": "Fintech", "stage": "Growth", "strategic_goals": []})
+    assert updated["version"] == 1
+    assert updated["company_id"] == "comp456"
+    updated = await fresh_context_manager.update_company_profile("comp456", {"sector": "Fintech", "stage": "Mature", "strategic_goals": []})
+    assert updated["version"] == 2
+    assert (await fresh_context_manager.get_company_profile("comp456"))["stage"] == "Mature"
+
+    user = await fresh_context_manager.update_user_profile("new_user", {"role": "Analyst", "department": "Finance"})
+    assert user["version"] == 1
+    assert (await fresh_context_manager.get_user_profile("new_user"))["role"] == "Analyst"
+
+
+@pytest.mark.asyncio
+async def test_export_and_import_history(fresh_context_manager: ContextManager):
+    await fresh_context_manager.add_interaction_to_history("u1", "c1", "Olá", "Resposta")
+    data = await fresh_context_manager.export_history("u1", "c1")
+    assert isinstance(data, bytes)
+
+    other = ContextManager()
+    await other.import_history("u1", "c1", data)
+    assert await other.get_interaction_history("u1", "c1") == [
+        {"role": "user", "content": "Olá"},
+        {"role": "assistant", "content": "Resposta"},
+    ]
+
+    await other.clear_history("u1", "c1")
+    assert await other.get_interaction_history("u1", "c1") == []
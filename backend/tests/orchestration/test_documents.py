@@ -0,0 +1,143 @@
+import asyncio
+import re
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.agents.base_agent import BaseAgent
+from app.agents.personas import AgentPersona
+from app.core.usage import QuotaExceededError
+from app.orchestration.documents import NOTHING_RELEVANT, answer_with_documents, chunk_text, extract_documents
+from app.orchestration.orchestrator import handle_user_request
+
+
+def test_extract_documents_accepts_both_shapes():
+    data = {
+        "document": "Main text",
+        "document_name": "contract.pdf",
+        "documents": [{"name": "annex.txt", "content": "Annex"}, "Plain", {"name": "empty", "content": "  "}, 42],
+    }
+    assert extract_documents(data) == [("contract.pdf", "Main text"), ("annex.txt", "Annex"), ("document 2", "Plain")]
+    assert extract_documents(None) == []
+    assert extract_documents({"other": "value"}) == []
+
+
+def test_chunk_text_respects_size_and_prefers_boundaries():
+    text = "\n\n".join(f"Paragraph {i} " + "x" * 80 for i in range(50))
+    chunks = chunk_text(text, chunk_chars=500, overlap=50)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.endswith("\n\n") for chunk in chunks[:-1])
+    assert "Paragraph 49" in chunks[-1]
+    # Every character is covered
+    assert "".join(chunks).count("Paragraph") >= 50
+    assert chunk_text("short", chunk_chars=500) == ["short"]
+    assert chunk_text("", chunk_chars=500) == []
+
+
+def _agent(responder) -> BaseAgent:
+    agent = BaseAgent(AgentPersona.LEGAL_EXPERT)
+    agent.generate_response = AsyncMock(side_effect=responder)
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_small_document_is_answered_in_one_call():
+    agent = _agent(lambda prompt, history, context: "Direct answer")
+    events = []
+    response = await answer_with_documents(agent, "What is the term?", [("c.txt", "Term: 2 years")], chunk_chars=1000, on_progress=events.append)
+    assert response == "Direct answer"
+    prompt = agent.generate_response.call_args.args[0]
+    assert "Term: 2 years" in prompt and prompt.endswith("What is the term?")
+    assert events[0]["chunks"] == 1
+
+
+@pytest.mark.asyncio
+async def test_large_document_is_mapped_with_bounded_concurrency_and_reduced():
+    in_flight = 0
+    peak = 0
+    prompts = []
+
+    async def responder(prompt, history, context):
+        nonlocal in_flight, peak
+        prompts.append(prompt)
+        if prompt.startswith("The attached documents were analysed"):
+            return "Final answer"
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return NOTHING_RELEVANT if "part 2 of" in prompt else "notes"
+
+    agent = _agent(responder)
+    events = []
+    history = [{"role": "user", "content": "earlier"}]
+    response = await answer_with_documents(agent, "Summarise", [("big.txt", "word " * 2000)], conversation_history=history,
+                                           chunk_chars=1000, overlap=0, concurrency=3, on_progress=events.append)
+    assert response == "Final answer"
+    assert peak == 3
+    map_events = [e for e in events if e["event"] == "chunk_done"]
+    assert len(map_events) == 10
+    assert map_events[-1]["completed"] == 10
+    reduce_prompt = prompts[-1]
+    assert len(re.findall(r"^Notes \d+:", reduce_prompt, re.M)) == 9 # The irrelevant part was dropped
+    assert agent.generate_response.call_args.args[1] == history # Only the final call sees the history
+
+
+@pytest.mark.asyncio
+async def test_reduce_runs_in_rounds_when_notes_do_not_fit():
+    async def responder(prompt, history, context):
+        if "Merge these notes" in prompt:
+            return "merged"
+        if "Combine these notes" in prompt:
+            return "final"
+        return "n" * 300
+
+    agent = _agent(responder)
+    events = []
+    response = await answer_with_documents(agent, "Q", [("d", "word " * 2000)], chunk_chars=1000, overlap=0, on_progress=events.append)
+    assert response == "final"
+    rounds = [e for e in events if e["stage"] == "reduce"]
+    assert rounds[0]["calls"] > 1
+    assert rounds[-1]["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_all_chunk_failures_return_none():
+    agent = _agent(lambda prompt, history, context: None)
+    assert await answer_with_documents(agent, "Q", [("d", "word " * 1000)], chunk_chars=1000) is None
+
+
+@pytest.mark.asyncio
+async def test_failing_chunk_call_cancels_the_calls_in_flight():
+    started = 0
+    cancelled = 0
+
+    async def responder(prompt, history, context):
+        nonlocal started, cancelled
+        started += 1
+        if "part 1 of" in prompt:
+            await asyncio.sleep(0.01)
+            raise QuotaExceededError("comp456", used=100, limit=100, period="day", retry_after=60)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled += 1
+            raise
+        return "notes"
+
+    agent = _agent(responder)
+    with pytest.raises(QuotaExceededError): # Not wrapped in an ExceptionGroup
+        await answer_with_documents(agent, "Q", [("d", "word " * 2000)], chunk_chars=1000, overlap=0, concurrency=3)
+    assert started < 10 # The chunks still waiting for the semaphore never start
+    assert cancelled == started - 1
+
+
+@pytest.mark.asyncio
+async def test_handle_user_request_uses_map_reduce_for_attached_documents():
+    events = []
+    with patch("app.orchestration.orchestrator.answer_with_documents", AsyncMock(return_value="Doc answer")) as mock_answer, \
+         patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", AsyncMock()) as mock_add:
+        response = await handle_user_request("user123", "comp456", "Summarise", current_interaction_data={"document": "text"}, on_progress=events.append)
+    assert response == "Doc answer"
+    assert mock_answer.call_args.kwargs["documents"] == [("document", "text")]
+    assert mock_answer.call_args.kwargs["on_progress"] == events.append
+    mock_add.assert_called_once_with(user_id="user123", company_id="comp456", user_message="Summarise", assistant_message="Doc answer")
@@ -0,0 +1,191 @@
+import asyncio
+import sqlite3
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.core.usage import QuotaExceededError
+from app.orchestration.jobs import MAX_ATTEMPTS_LIMIT, MAX_RETRY_DELAY, JobQueue, JobStatus, JobStore, PermanentJobError, run_chat_job
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(db_path=str(tmp_path / "jobs.sqlite3"), result_ttl=60)
+
+PAYLOAD = {"user_id": "user123", "company_id": "comp456", "prompt": "Summarise this contract."}
+
+
+def test_store_enqueue_claim_and_complete(store):
+    job = store.enqueue(PAYLOAD)
+    assert job["status"] == JobStatus.QUEUED
+    assert job["payload"] == PAYLOAD
+
+    claimed = store.claim_next()
+    assert claimed["job_id"] == job["job_id"]
+    assert claimed["status"] == JobStatus.RUNNING
+    assert claimed["attempts"] == 1
+    assert store.claim_next() is None # Nothing else is due
+
+    store.complete(job["job_id"], "Summary")
+    done = store.get(job["job_id"])
+    assert done["status"] == JobStatus.SUCCEEDED
+    assert done["result"] == "Summary"
+    assert done["expires_at"] > time.time()
+
+
+def test_store_claims_oldest_first(store):
+    first = store.enqueue(PAYLOAD)
+    store.enqueue(PAYLOAD)
+    assert store.claim_next()["job_id"] == first["job_id"]
+
+
+def test_store_retries_until_attempts_run_out(store):
+    job = store.enqueue(PAYLOAD, max_attempts=2)
+    store.claim_next()
+    assert store.fail(job["job_id"], "boom", retry_delay=0) == JobStatus.QUEUED
+    assert store.claim_next()["attempts"] == 2
+    assert store.fail(job["job_id"], "boom again", retry_delay=0) == JobStatus.FAILED
+    assert store.get(job["job_id"])["error"] == "boom again"
+
+
+def test_store_delays_retries(store):
+    job = store.enqueue(PAYLOAD)
+    store.claim_next()
+    store.fail(job["job_id"], "boom", retry_delay=60)
+    assert store.claim_next() is None
+
+
+def test_store_expires_finished_jobs(tmp_path):
+    store = JobStore(db_path=str(tmp_path / "jobs.sqlite3"), result_ttl=0)
+    job = store.enqueue(PAYLOAD)
+    store.claim_next()
+    store.complete(job["job_id"], "Done")
+    assert store.get(job["job_id"]) is None
+    assert store.purge_expired() == 1
+
+
+def test_store_requeues_abandoned_jobs(store):
+    job = store.enqueue(PAYLOAD)
+    store.claim_next()
+    assert store.requeue_stale(older_than=60) == (0, 0)
+    assert store.requeue_stale(older_than=0) == (1, 0)
+    assert store.get(job["job_id"])["status"] == JobStatus.QUEUED
+
+
+def test_store_fails_abandoned_jobs_without_attempts_left(store):
+    job = store.enqueue(PAYLOAD, max_attempts=1)
+    store.claim_next()
+    assert store.requeue_stale(older_than=0) == (0, 1)
+    failed = store.get(job["job_id"])
+    assert failed["status"] == JobStatus.FAILED
+    assert "abandoned" in failed["error"]
+    assert store.claim_next() is None
+
+
+def test_store_survives_reopening(store):
+    job = store.enqueue(PAYLOAD)
+    assert JobStore(db_path=store.db_path).get(job["job_id"])["status"] == JobStatus.QUEUED
+
+
+async def _wait_for_status(queue: JobQueue, job_id: str, status: JobStatus, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job did not reach {status}")
+
+
+@pytest.mark.asyncio
+async def test_queue_runs_jobs_and_retries_failures(store):
+    handler = AsyncMock(side_effect=[None, "Report"])
+    queue = JobQueue(store, handler=handler, workers=1, retry_delay=0, poll_interval=0.01)
+    await queue.start()
+    try:
+        job = await queue.submit(PAYLOAD)
+        done = await _wait_for_status(queue, job["job_id"], JobStatus.SUCCEEDED)
+    finally:
+        await queue.stop()
+    assert done["result"] == "Report"
+    assert done["attempts"] == 2
+    handler.assert_called_with(PAYLOAD)
+
+
+@pytest.mark.asyncio
+async def test_queue_limits_concurrency(store):
+    running = 0
+    peak = 0
+    async def handler(payload):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return "ok"
+    queue = JobQueue(store, handler=handler, workers=2, poll_interval=0.01)
+    await queue.start()
+    try:
+        jobs = [await queue.submit(PAYLOAD) for _ in range(5)]
+        for job in jobs:
+            await _wait_for_status(queue, job["job_id"], JobStatus.SUCCEEDED)
+    finally:
+        await queue.stop()
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_worker_survives_job_store_errors(store):
+    real_claim_next = store.claim_next
+    errors = [sqlite3.OperationalError("database is locked")]
+    def flaky_claim_next():
+        if errors:
+            raise errors.pop()
+        return real_claim_next()
+    queue = JobQueue(store, handler=AsyncMock(return_value="ok"), workers=1, poll_interval=0.01, error_backoff=0.01)
+    with patch.object(store, "claim_next", side_effect=flaky_claim_next), \
+         patch.object(store, "purge_expired", side_effect=sqlite3.OperationalError("disk full")):
+        await queue.start()
+        try:
+            job = await queue.submit(PAYLOAD)
+            await _wait_for_status(queue, job["job_id"], JobStatus.SUCCEEDED)
+        finally:
+            await queue.stop()
+
+
+@pytest.mark.asyncio
+async def test_retry_delay_is_capped(store):
+    queue = JobQueue(store, handler=AsyncMock(return_value=None), retry_delay=5)
+    store.enqueue(PAYLOAD, max_attempts=MAX_ATTEMPTS_LIMIT)
+    job = store.claim_next()
+    job["attempts"] = MAX_ATTEMPTS_LIMIT - 1 # 5s doubled 8 times would be over 20 minutes
+    with patch.object(store, "fail", wraps=store.fail) as fail:
+        await queue.run_job(job)
+    assert fail.call_args.args[2] == MAX_RETRY_DELAY
+
+
+@pytest.mark.asyncio
+async def test_queue_times_out_and_does_not_retry_permanent_errors(store):
+    async def slow(payload):
+        await asyncio.sleep(1)
+    queue = JobQueue(store, handler=slow, job_timeout=0.01, retry_delay=60)
+    job = store.enqueue(PAYLOAD)
+    await queue.run_job(store.claim_next())
+    assert store.get(job["job_id"])["status"] == JobStatus.QUEUED
+    assert "timed out" in store.get(job["job_id"])["error"]
+
+    queue.handler = AsyncMock(side_effect=PermanentJobError("over quota"))
+    job = store.enqueue(PAYLOAD)
+    await queue.run_job(store.claim_next())
+    assert store.get(job["job_id"])["status"] == JobStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_run_chat_job_uses_handle_user_request():
+    with patch("app.orchestration.jobs.handle_user_request", AsyncMock(return_value="Answer")) as mock_handle:
+        assert await run_chat_job({**PAYLOAD, "module_accessed": "legal"}) == "Answer"
+    mock_handle.assert_called_once_with(user_id="user123", company_id="comp456", user_prompt=PAYLOAD["prompt"], module_accessed="legal", current_interaction_data=None)
+
+    with patch("app.orchestration.jobs.handle_user_request", AsyncMock(side_effect=QuotaExceededError("comp456", 1, 1, "day", 60))):
+        with pytest.raises(PermanentJobError):
+            await run_chat_job(PAYLOAD)
@@ -9,7 +9,7 @@ from app.orchestration.orchestrator import (
     handle_user_request
 )
 from app.agents.personas import AgentPersona
-from app.agents.base_agent import BaseAgent # Needed for mocking its instantiation and methods
+from app.agents.base_agent import BaseAgent # Needed for mocking its methods
 
 # Mock data for context
 @pytest.fixture
@@ -81,11 +81,11 @@ async def test_prepare_context_for_agent(sample_full_context):
 @patch("app.orchestration.orchestrator.context_manager.collect_full_context", new_callable=AsyncMock)
 @patch("app.orchestration.orchestrator.select_persona_from_context", new_callable=AsyncMock)
 @patch("app.orchestration.orchestrator.prepare_context_for_agent", new_callable=AsyncMock)
-@patch("app.orchestration.orchestrator.BaseAgent", new_callable=MagicMock) # Mock the BaseAgent class
+@patch("app.orchestration.orchestrator.agent_registry.get_agent") # Mock the registry lookup
 @patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", new_callable=AsyncMock)
 async def test_handle_user_request_success(
     mock_add_history,
-    MockBaseAgent,
+    mock_get_agent,
     mock_prepare_context,
     mock_select_persona,
     mock_collect_context,
@@ -103,7 +103,7 @@ async def test_handle_user_request_success(
     
     mock_agent_instance = AsyncMock(spec=BaseAgent) # Create an AsyncMock instance based on BaseAgent spec
     mock_agent_instance.generate_response = AsyncMock(return_value="Market expansion is key.")
-    MockBaseAgent.return_value = mock_agent_instance # When BaseAgent is called, return our mock_agent_instance
+    mock_get_agent.return_value = mock_agent_instance # The registry hands out our mock_agent_instance
 
     response = await handle_user_request(user_id, company_id, user_prompt, module_accessed)
 
@@ -111,7 +111,7 @@ async def test_handle_user_request_success(
     mock_collect_context.assert_called_once_with(user_id=user_id, company_id=company_id, module_accessed=module_accessed, current_interaction_data=None)
     mock_select_persona.assert_called_once_with(sample_full_context)
     mock_prepare_context.assert_called_once_with(sample_full_context)
-    MockBaseAgent.assert_called_once_with(persona=AgentPersona.STRATEGY_CONSULTANT)
+    mock_get_agent.assert_called_once_with(AgentPersona.STRATEGY_CONSULTANT)
     mock_agent_instance.generate_response.assert_called_once_with(
         user_prompt=user_prompt,
         conversation_history=sample_full_context.get("interaction_history"),
@@ -121,9 +121,9 @@ async def test_handle_user_request_success(
 
 @pytest.mark.asyncio
 @patch("app.orchestration.orchestrator.context_manager.collect_full_context", new_callable=AsyncMock)
-@patch("app.orchestration.orchestrator.BaseAgent", new_callable=MagicMock)
+@patch("app.orchestration.orchestrator.agent_registry.get_agent")
 async def test_handle_user_request_agent_fails(
-    MockBaseAgent, 
+    mock_get_agent, 
     mock_collect_context, 
     sample_full_context
 ):
@@ -136,11 +136,87 @@ async def test_handle_user_request_agent_fails(
     # Simulate agent failing to generate a response
     mock_agent_instance = AsyncMock(spec=BaseAgent)
     mock_agent_instance.generate_response = AsyncMock(return_value=None)
-    MockBaseAgent.return_value = mock_agent_instance
+    mock_get_agent.return_value = mock_agent_instance
 
-    # We also need to mock select_persona and prepare_context for the flow to reach agent instantiation
+    # We also need to mock select_persona and prepare_context for the flow to reach the agent lookup
     with patch("app.orchestration.orchestrator.select_persona_from_context", AsyncMock(return_value=AgentPersona.STRATEGY_CONSULTANT)), \
          patch("app.orchestration.orchestrator.prepare_context_for_agent", AsyncMock(return_value={})):
         response = await handle_user_request(user_id, company_id, user_prompt)
         assert response is None
 
+
+@pytest.mark.asyncio
+async def test_prepare_context_for_agent_is_reused_until_profile_version_changes(sample_full_context):
+    from app.orchestration.orchestrator import agent_context_cache
+    agent_context_cache.clear()
+    sample_full_context["user_profile"]["version"] = 1
+    sample_full_context["company_profile"]["version"] = 1
+
+    first = await prepare_context_for_agent(sample_full_context)
+    second = await prepare_context_for_agent(dict(sample_full_context))
+    assert second is first
+    assert "Company sector: Technology" in first.rendered
+
+    sample_full_context["company_profile"] = {**sample_full_context["company_profile"], "sector": "Fintech", "version": 2}
+    third = await prepare_context_for_agent(sample_full_context)
+    assert third is not first
+    assert third["company_sector"] == "Fintech"
+    assert "Company sector: Fintech" in third.rendered
+    assert agent_context_cache.hits == 1
+    assert agent_context_cache.misses == 2
+
+@pytest.mark.asyncio
+async def test_prepare_context_for_agent_unversioned_profiles_are_not_reused_across_objects(sample_full_context):
+    first = await prepare_context_for_agent(sample_full_context)
+    changed = {**sample_full_context, "user_profile": {**sample_full_context["user_profile"], "role": "Intern"}}
+    second = await prepare_context_for_agent(changed)
+    assert first["user_role"] == "Manager"
+    assert second["user_role"] == "Intern"
+
+@pytest.mark.asyncio
+async def test_select_persona_from_context_configured_persona(sample_full_context):
+    from app.agents.personas import PersonaSpec
+    from app.orchestration.orchestrator import agent_registry
+    hr_persona = PersonaSpec(key="HR_ADVISOR", name="HR Advisor", system_prompt="You are an HR advisor.", module_keywords=["people"])
+    agent_registry.register_persona(hr_persona)
+    try:
+        sample_full_context["module_accessed"] = "people_ops"
+        assert await select_persona_from_context(sample_full_context) is hr_persona
+        # Built-in routing still takes precedence
+        sample_full_context["module_accessed"] = "legal_people"
+        assert await select_persona_from_context(sample_full_context) == AgentPersona.LEGAL_EXPERT
+    finally:
+        agent_registry._personas.pop("HR_ADVISOR", None)
+
+@pytest.mark.asyncio
+async def test_handle_user_request_enforces_quota_before_llm_call():
+    from app.core.usage import QuotaExceededError
+    with patch("app.orchestration.orchestrator.usage_accountant.check_quota_async", AsyncMock(side_effect=QuotaExceededError("comp456", 100, 100, "day", 60))), \
+         patch("app.orchestration.orchestrator.agent_registry.get_agent") as mock_get_agent:
+        with pytest.raises(QuotaExceededError):
+            await handle_user_request("user123", "comp456", "Hello")
+    mock_get_agent.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_handle_user_request_attributes_usage_to_company_user_and_persona(sample_full_context):
+    from app.core.usage import current_usage_attribution
+    seen = []
+    async def fake_completion(prompt, model):
+        seen.append(current_usage_attribution())
+        return "ok"
+    with patch("app.orchestration.orchestrator.context_manager.collect_full_context", AsyncMock(return_value=sample_full_context)), \
+         patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", AsyncMock()), \
+         patch("app.agents.base_agent.get_chat_completion", side_effect=fake_completion):
+        assert await handle_user_request("user123", "comp456", "Hello") == "ok"
+    assert seen == [("comp456", "user123", "STRATEGY_CONSULTANT")]
+
+@pytest.mark.asyncio
+async def test_handle_user_request_traces_stages_and_persona(sample_full_context):
+    from app.core.tracing import trace_scope
+    with patch("app.orchestration.orchestrator.context_manager.collect_full_context", AsyncMock(return_value=sample_full_context)), \
+         patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", AsyncMock()), \
+         patch("app.agents.base_agent.get_chat_completion", AsyncMock(return_value="ok")), \
+         trace_scope() as trace:
+        assert await handle_user_request("user123", "comp456", "Hello") == "ok"
+    assert set(trace.stages_ms) == {"collect_context", "select_persona", "prepare_context", "llm", "post_process"}
+    assert trace.annotations["persona"] == "STRATEGY_CONSULTANT"
@@ -0,0 +1,41 @@
+import pytest
+
+from app.orchestration.records import CompanyProfile, Message, Role, UserProfile, decode_messages, encode_messages
+
+
+def test_message_round_trips_through_dict():
+    message = Message.from_dict({"role": "assistant", "content": "Hi"})
+    assert message.role is Role.ASSISTANT
+    assert message["content"] == "Hi"
+    assert message.to_dict() == {"role": "assistant", "content": "Hi"}
+    assert not hasattr(message, "__dict__")
+
+def test_role_names_are_shared():
+    a = Message(Role.USER, "a").to_dict()
+    b = Message(Role.USER, "b").to_dict()
+    assert a["role"] is b["role"]
+
+def test_encode_decode_messages():
+    messages = [Message(Role.SYSTEM, ""), Message(Role.USER, "ação ✓"), Message(Role.ASSISTANT, "x" * 1000)]
+    assert decode_messages(encode_messages(messages)) == messages
+    assert decode_messages(encode_messages([])) == []
+
+def test_decode_rejects_bad_input():
+    with pytest.raises(ValueError):
+        decode_messages(b"nope")
+    with pytest.raises(ValueError):
+        decode_messages(encode_messages([Message(Role.USER, "hi")]) + b"extra")
+
+def test_profiles_behave_like_read_only_dicts():
+    profile = CompanyProfile(company_id="c1", sector="Tech", strategic_goals=["Grow"], region="LATAM")
+    assert profile == {"company_id": "c1", "sector": "Tech", "strategic_goals": ["Grow"], "region": "LATAM"}
+    assert profile.get("stage") is None
+    assert profile.get("version", 0) == 0
+    assert {**profile, "version": 2}["region"] == "LATAM"
+    with pytest.raises(TypeError):
+        profile["sector"] = "Retail"
+
+    user = UserProfile(user_id="u1", role="Manager", version=3)
+    assert user["version"] == 3
+    assert user.to_dict() == {"user_id": "u1", "role": "Manager", "version": 3}
+    assert UserProfile(user_id="u2", role="Manager").role is user.role
@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.orchestration.orchestrator import handle_user_request
+from app.orchestration.sessions import ConversationSession, SessionStore
+
+
+def test_session_appends_turns_and_keeps_token_budget():
+    session = ConversationSession("s1", "u1", "c1", max_history_messages=100, max_history_tokens=50)
+    session.add_turn("a" * 80, "b" * 80) # 20 + 20 tokens
+    assert session.token_count == 40
+    assert [m["role"] for m in session.history] == ["user", "assistant"]
+
+    history = session.history
+    session.add_turn("c" * 40, "d" * 40) # +20 tokens, the first turn no longer fits
+    assert session.history is history # Updated in place, not rebuilt
+    assert [m["content"][0] for m in session.history] == ["b", "c", "d"]
+    assert session.token_count == 40
+    assert session.turns == 2
+
+    session.add_turn("e", "f" * 1000) # A single oversized message is still kept
+    assert session.history[-1]["content"].startswith("f")
+    assert len(session.history) == 1
+
+
+@pytest.mark.asyncio
+async def test_store_seeds_once_and_resumes():
+    store = SessionStore(max_history_messages=10)
+    seed = [{"role": "user", "content": "earlier"}, {"role": "assistant", "content": "reply"}]
+    with patch("app.orchestration.sessions.context_manager.get_interaction_history", AsyncMock(return_value=seed)) as mock_history:
+        session = await store.get_or_create("u1", "c1")
+        assert session.history == seed
+        assert await store.get_or_create("u1", "c1", session.session_id) is session
+        assert await store.get_or_create("u1", "c1") is session # Found by conversation too
+    mock_history.assert_called_once_with("u1", "c1", limit=10)
+    assert store.stats() == {"active": 1, "created": 1, "resumed": 2}
+
+
+def test_session_keeps_the_default_three_message_window():
+    session = ConversationSession("s1", "u1", "c1")
+    session.add_turn("a" * 4000, "b")
+    session.add_turn("c", "d")
+    assert [m["content"][0] for m in session.history] == ["b", "c", "d"] # No token budget unless configured
+    assert session.token_count == 3
+
+
+@pytest.mark.asyncio
+async def test_store_with_shared_history_reseeds_resumed_sessions():
+    store = SessionStore(shared_history=True)
+    stored = [{"role": "user", "content": "from another worker"}]
+    with patch("app.orchestration.sessions.context_manager.get_interaction_history", AsyncMock(return_value=[])):
+        session = await store.get_or_create("u1", "c1", "new")
+    session.add_turn("stale", "local copy")
+    with patch("app.orchestration.sessions.context_manager.get_interaction_history", AsyncMock(return_value=stored)) as mock_history:
+        assert await store.get_or_create("u1", "c1", session.session_id) is session
+    mock_history.assert_called_once_with("u1", "c1", limit=3)
+    assert session.history == stored
+
+
+def test_session_store_from_env_detects_sharded_history():
+    from app.orchestration.sessions import build_session_store_from_env
+    with patch.dict("os.environ", {"CONTEXT_SHARD_SOCKETS": "/tmp/s0.sock"}, clear=True):
+        store = build_session_store_from_env()
+    assert store.shared_history
+    assert (store.max_history_messages, store.max_history_tokens) == (3, None)
+
+
+@pytest.mark.asyncio
+async def test_store_does_not_share_sessions_across_conversations():
+    store = SessionStore()
+    with patch("app.orchestration.sessions.context_manager.get_interaction_history", AsyncMock(return_value=[])):
+        session = await store.get_or_create("u1", "c1")
+        other = await store.get_or_create("u2", "c1", session.session_id)
+    assert other is not session
+    assert other.user_id == "u2"
+
+
+@pytest.mark.asyncio
+async def test_store_expires_idle_sessions_and_caps_size():
+    store = SessionStore(ttl=60, max_sessions=2)
+    with patch("app.orchestration.sessions.context_manager.get_interaction_history", AsyncMock(return_value=[])):
+        first = await store.get_or_create("u1", "c1")
+        first.last_used -= 120
+        assert store.get(first.session_id) is None
+        resumed = await store.get_or_create("u1", "c1", first.session_id)
+        assert resumed.session_id != first.session_id
+
+        await store.get_or_create("u2", "c1")
+        await store.get_or_create("u3", "c1")
+    assert len(store) == 2
+    assert store.get(resumed.session_id) is None # Least recently used was dropped
+    assert store.end(resumed.session_id) is False
+
+
+@pytest.mark.asyncio
+async def test_handle_user_request_uses_session_history():
+    session = ConversationSession("s1", "user123", "comp456", max_history_messages=10)
+    session.add_turn("Hi", "Hello!")
+    agent = AsyncMock()
+    agent.generate_response = AsyncMock(return_value="Answer")
+    with patch("app.orchestration.orchestrator.context_manager.get_interaction_history", AsyncMock()) as mock_history, \
+         patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", AsyncMock()) as mock_add, \
+         patch("app.orchestration.orchestrator.agent_registry.get_agent", return_value=agent):
+        assert await handle_user_request("user123", "comp456", "Next question", session=session) == "Answer"
+    mock_history.assert_not_called()
+    assert agent.generate_response.call_args.kwargs["conversation_history"][0] == {"role": "user", "content": "Hi"}
+    assert session.history[-1] == {"role": "assistant", "content": "Answer"}
+    assert session.turns == 2
+    mock_add.assert_called_once() # The ContextManager stays the durable record
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import tempfile
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+
+from app.orchestration.context_manager import ContextManager
+from app.orchestration.sharding import (
+    ConsistentHashRing,
+    ContextShardServer,
+    RemoteContextShard,
+    ShardedContextManager,
+    build_context_manager_from_env,
+    conversation_shard_key,
+)
+
+@pytest.fixture
+def socket_dir():
+    # Unix socket paths are limited to ~100 characters, so keep them short instead of using tmp_path
+    with tempfile.TemporaryDirectory(prefix="nowgo") as d:
+        yield d
+
+@pytest_asyncio.fixture
+async def local_sharded_manager():
+    shards = {f"shard{i}": ContextManager() for i in range(4)}
+    return ShardedContextManager(shards)
+
+def test_hash_ring_is_deterministic():
+    ring_a = ConsistentHashRing(["a", "b", "c"])
+    ring_b = ConsistentHashRing(["c", "b", "a"])
+    for i in range(200):
+        key = conversation_shard_key(f"user{i}", "comp1")
+        assert ring_a.get_shard(key) == ring_b.get_shard(key)
+
+def test_hash_ring_spreads_keys_over_all_shards():
+    ring = ConsistentHashRing(["a", "b", "c", "d"])
+    counts = {"a": 0, "b": 0, "c": 0, "d": 0}
+    for i in range(4000):
+        counts[ring.get_shard(conversation_shard_key(f"user{i}", f"comp{i % 7}"))] += 1
+    assert all(count > 500 for count in counts.values())
+
+def test_hash_ring_adding_shard_moves_only_some_keys():
+    ring = ConsistentHashRing(["a", "b", "c"])
+    keys = [f"key{i}" for i in range(2000)]
+    before = {k: ring.get_shard(k) for k in keys}
+    ring.add_shard("d")
+    moved = [k for k in keys if ring.get_shard(k) != before[k]]
+    assert all(ring.get_shard(k) == "d" for k in moved)
+    assert len(moved) < len(keys) / 2
+
+def test_hash_ring_requires_shards():
+    with pytest.raises(ValueError):
+        ConsistentHashRing([])
+
+@pytest.mark.asyncio
+async def test_sharded_history_stays_on_one_shard(local_sharded_manager: ShardedContextManager):
+    await local_sharded_manager.add_interaction_to_history("u1", "c1", "Hello", "Hi")
+    await local_sharded_manager.add_interaction_to_history("u1", "c1", "Again", "Sure")
+
+    history = await local_sharded_manager.get_interaction_history("u1", "c1", limit=4)
+    assert [m["content"] for m in history] == ["Hello", "Hi", "Again", "Sure"]
+
+    owner = local_sharded_manager.shard_for_conversation("u1", "c1")
+    others = [s for s in local_sharded_manager.shards.values() if s is not owner]
+    assert all(s.user_interaction_history == {} for s in others)
+
+@pytest.mark.asyncio
+async def test_sharded_collect_full_context(local_sharded_manager: ShardedContextManager):
+    await local_sharded_manager.add_interaction_to_history("user123", "comp456", "Q1", "A1")
+    full_context = await local_sharded_manager.collect_full_context("user123", "comp456", module_accessed="strategy")
+    assert full_context["user_profile"]["role"] == "Manager"
+    assert full_context["company_profile"]["sector"] == "Technology"
+    assert len(full_context["interaction_history"]) == 2
+
+@pytest.mark.asyncio
+async def test_remote_shard_round_trip(socket_dir):
+    path = os.path.join(socket_dir, "s0.sock")
+    server = ContextShardServer(path)
+    await server.start()
+    client = RemoteContextShard(path)
+    try:
+        await client.add_interaction_to_history("u1", "c1", "Hello", "Hi")
+        history = await client.get_interaction_history("u1", "c1", limit=2)
+        assert history == [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi"}]
+        assert (await client.get_user_profile("user789"))["role"] == "Legal Counsel"
+        assert await client.get_company_profile("missing") is None
+        # The history is held by the server-side manager, not the client
+        assert server.manager.user_interaction_history["u1_c1"][0].content == "Hello"
+    finally:
+        await client.close()
+        await server.close()
+
+class _SlowProfiles(ContextManager):
+    async def get_user_profile(self, user_id: str):
+        if user_id == "slow":
+            await asyncio.sleep(0.2)
+        return await super().get_user_profile(user_id)
+
+@pytest.mark.asyncio
+async def test_cancelled_call_does_not_leave_its_reply_for_the_next_one(socket_dir):
+    path = os.path.join(socket_dir, "s0.sock")
+    server = ContextShardServer(path, manager=_SlowProfiles())
+    await server.start()
+    client = RemoteContextShard(path)
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(client.get_user_profile("slow"), timeout=0.05)
+        assert (await client.get_company_profile("comp456"))["company_id"] == "comp456"
+        assert (await client.get_user_profile("user789"))["role"] == "Legal Counsel"
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_remote_shard_sends_history_in_binary_record_format(socket_dir):
+    path = os.path.join(socket_dir, "s0.sock")
+    server = ContextShardServer(path)
+    await server.start()
+    client = RemoteContextShard(path)
+    try:
+        await client.add_interaction_to_history("u1", "c1", "Olá", "Oi")
+        result, payload = await client._call("get_interaction_history", user_id="u1", company_id="c1", limit=2)
+        assert result is None
+        assert payload.startswith(b"NGH1")
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_sharded_export_and_import_history(socket_dir, local_sharded_manager: ShardedContextManager):
+    await local_sharded_manager.add_interaction_to_history("u1", "c1", "Hello", "Hi")
+    data = await local_sharded_manager.export_history("u1", "c1")
+
+    path = os.path.join(socket_dir, "s0.sock")
+    server = ContextShardServer(path)
+    await server.start()
+    remote = ShardedContextManager({path: RemoteContextShard(path)})
+    try:
+        await remote.import_history("u2", "c1", data)
+        assert [m["content"] for m in await remote.get_interaction_history("u2", "c1")] == ["Hello", "Hi"]
+        assert await remote.export_history("u2", "c1") == data
+        await remote.clear_history("u2", "c1")
+        assert await remote.get_interaction_history("u2", "c1") == []
+    finally:
+        await remote.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_remote_shard_rejects_unknown_operation(socket_dir):
+    path = os.path.join(socket_dir, "s0.sock")
+    server = ContextShardServer(path)
+    await server.start()
+    client = RemoteContextShard(path)
+    try:
+        with pytest.raises(RuntimeError):
+            await client._call("collect_full_context", user_id="u1", company_id="c1")
+    finally:
+        await client.close()
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_two_clients_share_history_through_shard_servers(socket_dir):
+    paths = [os.path.join(socket_dir, f"s{i}.sock") for i in range(2)]
+    servers = [ContextShardServer(p) for p in paths]
+    for server in servers:
+        await server.start()
+    # Two managers stand in for two worker processes
+    worker_a = ShardedContextManager({p: RemoteContextShard(p) for p in paths})
+    worker_b = ShardedContextManager({p: RemoteContextShard(p) for p in paths})
+    try:
+        await worker_a.add_interaction_to_history("u1", "c1", "From A", "Ack A")
+        await worker_b.add_interaction_to_history("u1", "c1", "From B", "Ack B")
+        history = await worker_a.get_interaction_history("u1", "c1", limit=4)
+        assert [m["content"] for m in history] == ["From A", "Ack A", "From B", "Ack B"]
+    finally:
+        await worker_a.close()
+        await worker_b.close()
+        for server in servers:
+            await server.close()
+
+def test_build_context_manager_from_env():
+    with patch.dict(os.environ, {}, clear=True):
+        manager = build_context_manager_from_env()
+        assert type(manager) is ContextManager
+    with patch.dict(os.environ, {"CONTEXT_SHARD_SOCKETS": "/tmp/a.sock, /tmp/b.sock"}):
+        manager = build_context_manager_from_env()
+        assert isinstance(manager, ShardedContextManager)
+        assert set(manager.shards) == {"/tmp/a.sock", "/tmp/b.sock"}
+
+@pytest.mark.parametrize("shard_sockets", ["", "/tmp/nowgo-unused.sock"])
+def test_sharding_module_imports_on_its_own(shard_sockets):
+    import subprocess
+    import sys
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run(
+        [sys.executable, "-c", "import app.orchestration.sharding"],
+        cwd=backend_dir, env={**os.environ, "CONTEXT_SHARD_SOCKETS": shard_sockets}, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.agents.personas import AgentPersona
+from app.orchestration.speculative import (
+    SpeculationMetrics,
+    rank_candidate_personas,
+    run_speculative_personas,
+    score_probe,
+    speculative_personas_enabled,
+)
+
+RESPONSES = {
+    AgentPersona.STRATEGY_CONSULTANT: "I cannot help with that, it is outside my expertise. " * 4,
+    AgentPersona.LEGAL_EXPERT: "The contract termination clause requires notice under the governing contract law. " * 4,
+    AgentPersona.DATA_ANALYST: "Looking at data trends, nothing here relates to it. " * 4,
+}
+
+def fake_stream_factory(closed: list):
+    """Patches BaseAgent.stream_response with a word-per-chunk stream that records cancellation."""
+    def stream_response(self, user_prompt, conversation_history=None, context_data=None, max_tokens=None):
+        async def gen():
+            try:
+                for word in RESPONSES[self.persona].split(" "):
+                    await asyncio.sleep(0)
+                    yield word + " "
+            finally:
+                closed.append(self.persona)
+        return gen()
+    return stream_response
+
+def test_speculative_personas_enabled_flag():
+    with patch.dict(os.environ, {"NOWGO_SPECULATIVE_PERSONAS": "1"}):
+        assert speculative_personas_enabled()
+    with patch.dict(os.environ, {}, clear=True):
+        assert not speculative_personas_enabled()
+
+def test_rank_candidate_personas_prefers_prompt_overlap():
+    ranked = rank_candidate_personas("Please review compliance for this legal document", list(AgentPersona), k=2)
+    assert ranked[0] == AgentPersona.LEGAL_EXPERT
+    assert len(ranked) == 2
+    # Without any overlap the registry order is kept, so the default persona comes first
+    assert rank_candidate_personas("xyz", list(AgentPersona), k=1) == [AgentPersona.STRATEGY_CONSULTANT]
+
+def test_score_probe_penalizes_refusals_and_empty_drafts():
+    prompt = "How do I terminate this contract?"
+    on_topic = score_probe(AgentPersona.LEGAL_EXPERT, prompt, "To terminate the contract you must give notice.")
+    refusal = score_probe(AgentPersona.LEGAL_EXPERT, prompt, "I cannot help with this contract.")
+    assert on_topic > refusal
+    assert score_probe(AgentPersona.LEGAL_EXPERT, prompt, "  ") == float("-inf")
+
+@pytest.mark.asyncio
+async def test_run_speculative_personas_picks_winner_and_cancels_losers():
+    closed = []
+    metrics = SpeculationMetrics()
+    with patch("app.agents.base_agent.BaseAgent.stream_response", fake_stream_factory(closed)):
+        persona, response = await run_speculative_personas(
+            list(RESPONSES),
+            user_prompt="Can we end the contract early? What does the termination clause say?",
+            probe_tokens=8,
+            metrics=metrics,
+        )
+    assert persona == AgentPersona.LEGAL_EXPERT
+    assert response == RESPONSES[AgentPersona.LEGAL_EXPERT] + " "
+    assert set(closed) == set(RESPONSES) # Every stream was closed, losers mid-stream
+    assert metrics.runs == 1
+    assert metrics.probes_started == 3
+    assert metrics.probes_cancelled == 2
+    assert metrics.probe_tokens_discarded == 16
+    winner_chunks = len(RESPONSES[AgentPersona.LEGAL_EXPERT].split(" "))
+    assert metrics.estimated_tokens_saved == 2 * (winner_chunks - 8)
+    assert metrics.wins_by_persona == {"LEGAL_EXPERT": 1}
+
+@pytest.mark.asyncio
+async def test_run_speculative_personas_returns_none_when_nothing_generated():
+    async def empty():
+        return
+        yield
+
+    with patch("app.agents.base_agent.BaseAgent.stream_response", lambda self, *a, **kw: empty()):
+        persona, response = await run_speculative_personas(list(RESPONSES), "hello", metrics=SpeculationMetrics())
+    assert persona is None
+    assert response is None
+
+@pytest.mark.asyncio
+async def test_handle_user_request_uses_speculation_only_on_fallback():
+    from app.orchestration.orchestrator import handle_user_request
+    fallback_context = {
+        "user_profile": {"user_id": "u1", "role": "Intern"},
+        "company_profile": {"company_id": "c1", "sector": "Technology"},
+        "module_accessed": "unknown_module",
+        "current_interaction_data": {},
+        "interaction_history": [],
+    }
+    with patch.dict(os.environ, {"NOWGO_SPECULATIVE_PERSONAS": "1"}), \
+         patch("app.orchestration.orchestrator.context_manager.collect_full_context", AsyncMock(return_value=fallback_context)), \
+         patch("app.orchestration.orchestrator.context_manager.add_interaction_to_history", AsyncMock()), \
+         patch("app.orchestration.orchestrator.run_speculative_personas", AsyncMock(return_value=(AgentPersona.LEGAL_EXPERT, "speculated"))) as mock_speculate, \
+         patch("app.orchestration.orchestrator.agent_registry.get_agent") as mock_get_agent:
+        assert await handle_user_request("u1", "c1", "Is this contract valid?") == "speculated"
+        mock_speculate.assert_called_once()
+        mock_get_agent.assert_not_called()
+
+        # A module match means routing has a real signal, so no speculation
+        mock_speculate.reset_mock()
+        mock_get_agent.return_value.generate_response = AsyncMock(return_value="routed")
+        fallback_context["module_accessed"] = "legal_documents"
+        assert await handle_user_request("u1", "c1", "Is this contract valid?") == "routed"
+        mock_speculate.assert_not_called()
+        mock_get_agent.assert_called_once_with(AgentPersona.LEGAL_EXPERT)
+
+@pytest.mark.asyncio
+async def test_run_speculative_personas_probe_timeout_keeps_the_full_winner_answer():
+    def stream_response(self, user_prompt, conversation_history=None, context_data=None, max_tokens=None):
+        async def gen():
+            for i in range(10):
+                await asyncio.sleep(0.02)
+                yield f"tok{i} "
+        return gen()
+    with patch("app.agents.base_agent.BaseAgent.stream_response", stream_response):
+        persona, response = await run_speculative_personas(
+            [AgentPersona.STRATEGY_CONSULTANT], "hello", probe_timeout=0.05, metrics=SpeculationMetrics()
+        )
+    assert persona == AgentPersona.STRATEGY_CONSULTANT
+    assert response == "".join(f"tok{i} " for i in range(10)) # Not the partial draft read before the timeout
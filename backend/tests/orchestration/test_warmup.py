@@ -0,0 +1,78 @@
+import asyncio
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.orchestration import warmup
+from app.orchestration.warmup import WarmUpState, configured_steps, run_warm_up
+
+def test_configured_steps_default_and_env():
+    with patch.dict(os.environ, {}, clear=True):
+        assert configured_steps() == list(warmup.DEFAULT_STEPS)
+    with patch.dict(os.environ, {"NOWGO_WARMUP_STEPS": "agents, company_profiles"}):
+        assert configured_steps() == ["agents", "company_profiles"]
+    with patch.dict(os.environ, {"NOWGO_WARMUP_STEPS": ""}):
+        assert configured_steps() == []
+
+@pytest.mark.asyncio
+async def test_warm_up_not_ready_until_finished():
+    state = WarmUpState()
+    assert not state.ready
+    gate = asyncio.Event()
+
+    async def slow_step():
+        await gate.wait()
+        return "done"
+
+    with patch.dict(warmup.WARM_UP_STEPS, {"slow": slow_step}):
+        task = asyncio.create_task(run_warm_up(["slow"], state=state))
+        await asyncio.sleep(0)
+        assert not state.ready
+        gate.set()
+        await task
+    assert state.ready
+    assert state.steps[0]["name"] == "slow"
+    assert state.steps[0]["ok"] is True
+    assert state.as_dict()["total_seconds"] is not None
+
+@pytest.mark.asyncio
+async def test_warm_up_records_failures_and_timeouts_but_becomes_ready():
+    async def failing():
+        raise RuntimeError("boom")
+
+    async def hanging():
+        await asyncio.sleep(10)
+
+    state = WarmUpState()
+    with patch.dict(warmup.WARM_UP_STEPS, {"failing": failing, "hanging": hanging}):
+        await run_warm_up(["failing", "hanging", "missing"], state=state, step_timeout=0.01)
+    assert state.ready
+    assert [step["ok"] for step in state.steps] == [False, False, False]
+    assert "boom" in state.steps[0]["detail"]
+    assert "timed out" in state.steps[1]["detail"]
+    assert state.steps[2]["detail"] == "unknown step"
+
+@pytest.mark.asyncio
+async def test_warm_up_company_profiles_and_agents():
+    state = WarmUpState()
+    with patch.dict(os.environ, {"NOWGO_WARMUP_COMPANIES": "comp456,unknown"}):
+        await run_warm_up(["agents", "company_profiles"], state=state)
+    assert state.steps[0]["ok"] and "agents" in state.steps[0]["detail"]
+    assert state.steps[1]["detail"] == "1/2 company profiles loaded"
+
+@pytest.mark.asyncio
+async def test_warm_up_llm_connection_opens_pool():
+    client = MagicMock()
+    client.models.list = AsyncMock(return_value=[])
+    state = WarmUpState()
+    with patch("app.orchestration.warmup.get_openai_client", return_value=client):
+        await run_warm_up(["llm_connection"], state=state)
+    client.models.list.assert_awaited_once()
+    assert state.steps[0]["ok"]
+
+@pytest.mark.asyncio
+async def test_warm_up_llm_connection_skipped_without_key():
+    state = WarmUpState()
+    with patch("app.orchestration.warmup.get_openai_client", return_value=None):
+        await run_warm_up(["llm_connection"], state=state)
+    assert state.steps[0]["detail"] == "skipped, no API key"